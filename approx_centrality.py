@@ -0,0 +1,265 @@
+"""
+Approximate centrality metrics based on sampled sources.
+
+Instead of visiting the graph from every vertex, the metrics are estimated
+from the shortest paths starting from a random sample of source vertices.
+The sample is split in batches, each batch gives an independent estimate of
+the metric and the spread of the batch estimates gives its standard error.
+Batches are processed in parallel by a pool of worker processes, each worker
+builds its own copy of the graph once from an array of edges.
+"""
+
+import math
+import multiprocessing
+import igraph as ig
+import numpy as np
+
+
+# minimum number of batches the sample is split into, to have an estimate of
+# the error
+MIN_BATCHES = 8
+
+# probability that the error bound of sample_size() does not hold
+ERROR_PROBABILITY = 0.1
+
+
+# graph of the worker process, see init_worker()
+_graph = None
+
+
+def init_worker(vcount, edges, directed):
+    global _graph
+    _graph = ig.Graph(n=vcount, edges=edges.tolist(), directed=directed)
+
+
+def graph_edges(g):
+    return np.array(g.get_edgelist(), dtype=np.int32).reshape(-1, 2)
+
+
+# Number of sources needed to estimate the normalized betweenness (i.e.
+# divided by (n-1)(n-2)) of all the vertices within error with probability
+# 1 - ERROR_PROBABILITY, by Hoeffding's inequality and the union bound over
+# the vertices.
+def sample_size(vcount, error):
+    if vcount == 0:
+        return 0
+    samples = math.log(2.0 * vcount / ERROR_PROBABILITY) / (2.0 * error**2)
+    return min(vcount, int(math.ceil(samples)))
+
+
+def sample_sources(vcount, samples, seed):
+    rng = np.random.RandomState(seed)
+    return rng.choice(vcount, size=min(samples, vcount), replace=False)
+
+
+# Run func on each task (a batch of sources and the parameters of the
+# metric), in a pool of worker processes if jobs > 1. Each result is a vector
+# with one value per vertex (or width values, if given).
+def map_batches(g, func, tasks, jobs, width=None):
+    global _graph
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, initializer=init_worker,
+                                    initargs=(g.vcount(), graph_edges(g),
+                                              g.is_directed()))
+        try:
+            results = pool.map(func, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _graph = g
+        try:
+            results = [func(task) for task in tasks]
+        finally:
+            _graph = None
+
+    if width is None:
+        width = g.vcount()
+
+    return np.array(results, dtype=float).reshape(len(tasks), width)
+
+
+# Combine the sums over each batch of sources into the estimate of the
+# metric, i.e. the sum over all the vertices, and its standard error. The
+# sample is drawn without replacement, hence the finite population
+# correction (the error is 0 when all the vertices are sources).
+def combine_batches(sums, batch_sizes, vcount):
+    batch_sizes = np.asarray(batch_sizes, dtype=float)
+    nsamples = batch_sizes.sum()
+
+    estimate = sums.sum(axis=0) * vcount / nsamples
+
+    batch_estimates = sums * (vcount / batch_sizes)[:, np.newaxis]
+    error = batch_error(batch_estimates, nsamples, vcount)
+
+    return estimate, error
+
+
+# Standard error of the mean of the estimates of the batches (one row per
+# batch), with the finite population correction
+def batch_error(batch_estimates, nsamples, vcount):
+    nbatches = np.sum(~np.isnan(batch_estimates), axis=0)
+    if batch_estimates.shape[0] < 2:
+        return np.full(batch_estimates.shape[1:], np.nan)
+
+    fpc = (vcount - nsamples) / max(vcount - 1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.nanstd(batch_estimates, axis=0, ddof=1) /
+                np.sqrt(nbatches) * math.sqrt(max(fpc, 0.0)))
+
+
+# Combine the sums over each batch of the numerator and the denominator of a
+# ratio (e.g. number of reachable vertices over the sum of their distances)
+# into the estimate of the ratio and its standard error. Vertices with a
+# denominator of 0 have estimate NaN.
+def combine_ratio(numerators, denominators, batch_sizes, vcount):
+    nsamples = float(np.sum(batch_sizes))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimate = numerators.sum(axis=0) / denominators.sum(axis=0)
+        batch_estimates = numerators / denominators
+
+    estimate[~np.isfinite(estimate)] = np.nan
+    batch_estimates[~np.isfinite(batch_estimates)] = np.nan
+    error = batch_error(batch_estimates, nsamples, vcount)
+
+    return estimate, error
+
+
+def split_batches(sources, jobs):
+    nbatches = max(1, min(len(sources), max(MIN_BATCHES, 4*jobs)))
+    return [batch for batch in np.array_split(sources, nbatches)
+            if len(batch) > 0]
+
+
+def _betweenness_batch(task):
+    sources, directed, cutoff = task
+    if cutoff is None:
+        return _graph.betweenness(directed=directed, sources=sources.tolist())
+
+    return _cutoff_betweenness(_graph, sources.tolist(), directed, cutoff)
+
+
+# Betweenness from the paths starting from sources only, and at most cutoff
+# hops long. igraph can not restrict the sources and cut the paths at the
+# same time, so this is Brandes' algorithm with the breadth-first search from
+# each source stopped at distance cutoff: the dependencies of the source are
+# accumulated only along these paths. As in Graph.betweenness(), paths of an
+# undirected graph are counted once for each pair of vertices.
+def _cutoff_betweenness(g, sources, directed, cutoff):
+    directed = directed and g.is_directed()
+    adjlist = g.get_adjlist(mode='out' if directed else 'all')
+
+    total = np.zeros(g.vcount())
+    for source in sources:
+        distance = {source: 0}
+        npaths = {source: 1}
+        preds = {source: []}
+        order = [source]
+        for v in order:
+            if distance[v] == cutoff:
+                continue
+            for w in adjlist[v]:
+                if w not in distance:
+                    distance[w] = distance[v] + 1
+                    npaths[w] = 0
+                    preds[w] = []
+                    order.append(w)
+                if distance[w] == distance[v] + 1:
+                    npaths[w] += npaths[v]
+                    preds[w].append(v)
+
+        dependency = dict.fromkeys(order, 0.0)
+        for w in reversed(order):
+            for v in preds[w]:
+                dependency[v] += npaths[v] / npaths[w] * (1.0 + dependency[w])
+            if w != source:
+                total[w] += dependency[w]
+
+    if not directed:
+        total /= 2.0
+
+    return total
+
+
+def approximate_betweenness(g, samples, directed=True, cutoff=None, jobs=1,
+                            seed=0):
+    """Estimate the betweenness of all the vertices of g.
+
+    Only the shortest paths starting from samples random sources are
+    considered (paths longer than cutoff are ignored, if given). Returns the
+    estimate and its standard error, both as arrays.
+    """
+    sources = sample_sources(g.vcount(), samples, seed)
+    if len(sources) == 0:
+        # empty graph (sample_size() is 0)
+        return np.zeros(g.vcount()), np.zeros(g.vcount())
+    batches = split_batches(sources, jobs)
+
+    sums = map_batches(g, _betweenness_batch,
+                       [(batch, directed, cutoff) for batch in batches], jobs)
+
+    return combine_batches(sums, [len(batch) for batch in batches],
+                           g.vcount())
+
+
+# closeness of a vertex in mode is computed from the paths starting from it
+# (OUT), ending in it (IN) or both (ALL), the sampled sources need the paths
+# in the opposite direction
+def reverse_mode(mode):
+    return {'IN': 'OUT', 'OUT': 'IN'}.get(mode, 'ALL')
+
+
+def _closeness_batch(task):
+    sources, mode, harmonic = task
+
+    vcount = _graph.vcount()
+    reached = np.zeros(vcount)
+    total = np.zeros(vcount)
+    for source in sources.tolist():
+        distances = np.array(_graph.distances(source=source, mode=mode)[0],
+                             dtype=float)
+        distances[source] = np.inf
+        finite = np.isfinite(distances)
+
+        if harmonic:
+            total[finite] += 1.0 / distances[finite]
+        else:
+            reached[finite] += 1
+            total[finite] += distances[finite]
+
+    return np.concatenate((reached, total))
+
+
+def approximate_closeness(g, samples, mode='ALL', harmonic=False, jobs=1,
+                          seed=0):
+    """Estimate the closeness (or harmonic centrality) of all the vertices.
+
+    Only the distances between each vertex and samples random sources are
+    considered. mode is the same as in Graph.closeness(), the estimates are
+    normalized like the ones of Graph.closeness() and
+    Graph.harmonic_centrality(). Returns the estimate and its standard error,
+    both as arrays.
+    """
+    vcount = g.vcount()
+    sources = sample_sources(vcount, samples, seed)
+    if len(sources) == 0:
+        return np.zeros(vcount), np.zeros(vcount)
+    batches = split_batches(sources, jobs)
+    batch_sizes = [len(batch) for batch in batches]
+
+    sums = map_batches(g, _closeness_batch,
+                       [(batch, reverse_mode(mode), harmonic)
+                        for batch in batches],
+                       jobs, width=2*vcount)
+    reached, total = sums[:, :vcount], sums[:, vcount:]
+
+    if harmonic:
+        estimate, error = combine_batches(total, batch_sizes, vcount)
+        norm = max(vcount - 1, 1)
+        return estimate / norm, error / norm
+
+    # closeness is the inverse of the mean distance from the reachable
+    # vertices, i.e. their number over the sum of their distances
+    return combine_ratio(reached, total, batch_sizes, vcount)
@@ -0,0 +1,13 @@
+"""
+Benchmarks of the scripts of the repository on synthetic temporal graphs.
+
+  * generator.py: writes a series of monthly edge lists with evolving
+    communities, in the format of the wikilink graph snapshots;
+  * run.py: runs each stage of the scripts (loading, partitioning, cluster
+    matching, centrality metrics, output writing) on generated graphs of
+    different sizes and reports wall time, CPU time and peak RSS.
+
+Run them from the root of the repository, e.g.:
+
+    python -m benchmarks.run --vertices 1000,10000
+"""
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+usage: python -m benchmarks.generator [-h] [--output-dir OUTPUT_DIR]
+                                      [--vertices VERTICES]
+                                      [--months MONTHS]
+                                      [--start-date START_DATE]
+                                      [--communities COMMUNITIES]
+                                      [--degree DEGREE] [--mixing MIXING]
+                                      [--growth GROWTH] [--churn CHURN]
+                                      [--drift DRIFT] [--rewire REWIRE]
+                                      [--seed SEED]
+
+Generate a series of monthly edge lists with evolving communities
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --output-dir OUTPUT_DIR
+                        Directory where the edge lists are written
+                        [default: data/synthetic]
+  --vertices VERTICES   Number of pages in the first snapshot
+                        [default: 1000]
+  --months MONTHS       Number of snapshots [default: 12]
+  --start-date START_DATE
+                        Date of the first snapshot (YYYY-MM-DD)
+                        [default: 2010-01-01]
+  --communities COMMUNITIES
+                        Number of planted communities [default: 20]
+  --degree DEGREE       Mean number of links of a page [default: 10.0]
+  --mixing MIXING       Probability that a link goes to a random page
+                        instead of a page of the same community
+                        [default: 0.1]
+  --growth GROWTH       Fraction of new pages each month [default: 0.02]
+  --churn CHURN         Fraction of pages removed each month
+                        [default: 0.01]
+  --drift DRIFT         Fraction of pages that move to another community
+                        each month [default: 0.02]
+  --rewire REWIRE       Fraction of the links of the previous snapshot that
+                        are replaced each month [default: 0.1]
+  --seed SEED           Seed of the random number generator [default: 0]
+
+The graphs follow a planted partition model that evolves over time. Each
+page belongs to a community and links to pages of the same community, or
+with probability --mixing to any page. Every month new pages join (in a
+random community), some pages are removed with their links, some pages move
+to another community and a fraction of the links is drawn again, so that
+communities drift slowly. Links that are not redrawn are kept from one
+snapshot to the next, as in the real wikilink graph.
+
+The edge lists are written as enwiki.wikilink_graph.<date>.csv, with the
+same header as the snapshots of the wikilink graph, without self-loops and
+duplicate links. The same seed always produces the same series.
+"""
+
+import os
+import csv
+import argparse
+import logging
+import arrow
+import numpy as np
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+OUTPUT_DIR = os.path.join('data', 'synthetic')
+START_DATE = '2010-01-01'
+
+HEADER = ('page_title_from', 'page_title_to')
+
+DEFAULTS = {'vertices': 1000,
+            'months': 12,
+            'communities': 20,
+            'degree': 10.0,
+            'mixing': 0.1,
+            'growth': 0.02,
+            'churn': 0.01,
+            'drift': 0.02,
+            'rewire': 0.1,
+            }
+
+
+def get_args():
+    description=('Generate a series of monthly edge lists with evolving '
+                 'communities')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='Directory where the edge lists are written '
+                             '[default: {}]'.format(OUTPUT_DIR))
+    parser.add_argument('--vertices', type=int, default=DEFAULTS['vertices'],
+                        help='Number of pages in the first snapshot '
+                             '[default: {}]'.format(DEFAULTS['vertices']))
+    parser.add_argument('--months', type=int, default=DEFAULTS['months'],
+                        help='Number of snapshots '
+                             '[default: {}]'.format(DEFAULTS['months']))
+    parser.add_argument('--start-date', default=START_DATE,
+                        help='Date of the first snapshot (YYYY-MM-DD) '
+                             '[default: {}]'.format(START_DATE))
+    parser.add_argument('--communities', type=int,
+                        default=DEFAULTS['communities'],
+                        help='Number of planted communities '
+                             '[default: {}]'.format(DEFAULTS['communities']))
+    parser.add_argument('--degree', type=float, default=DEFAULTS['degree'],
+                        help='Mean number of links of a page '
+                             '[default: {}]'.format(DEFAULTS['degree']))
+    parser.add_argument('--mixing', type=float, default=DEFAULTS['mixing'],
+                        help='Probability that a link goes to a random page '
+                             'instead of a page of the same community '
+                             '[default: {}]'.format(DEFAULTS['mixing']))
+    parser.add_argument('--growth', type=float, default=DEFAULTS['growth'],
+                        help='Fraction of new pages each month '
+                             '[default: {}]'.format(DEFAULTS['growth']))
+    parser.add_argument('--churn', type=float, default=DEFAULTS['churn'],
+                        help='Fraction of pages removed each month '
+                             '[default: {}]'.format(DEFAULTS['churn']))
+    parser.add_argument('--drift', type=float, default=DEFAULTS['drift'],
+                        help='Fraction of pages that move to another '
+                             'community each month '
+                             '[default: {}]'.format(DEFAULTS['drift']))
+    parser.add_argument('--rewire', type=float, default=DEFAULTS['rewire'],
+                        help='Fraction of the links of the previous snapshot '
+                             'that are replaced each month '
+                             '[default: {}]'.format(DEFAULTS['rewire']))
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random number generator '
+                             '[default: 0]')
+
+    args = parser.parse_args()
+    return args
+
+
+def page_title(vid):
+    return 'Page_{:07}'.format(vid)
+
+
+def snapshot_path(output_dir, graph_date):
+    return os.path.join(output_dir,
+                        'enwiki.wikilink_graph.{}.csv'.format(graph_date))
+
+
+# Draw the target of a link from each source: a page of the same community
+# (pages are grouped by community in by_community, community c being
+# by_community[offsets[c]:offsets[c+1]]) or, with probability mixing or if
+# the community is empty, any alive page.
+def draw_targets(rng, sources, community, alive, by_community, offsets,
+                 mixing):
+    nedges = len(sources)
+    targets = alive[rng.integers(0, len(alive), size=nedges)]
+
+    src_comm = community[sources]
+    sizes = (offsets[1:] - offsets[:-1])[src_comm]
+    local = (rng.random(nedges) >= mixing) & (sizes > 0)
+
+    pos = (offsets[src_comm[local]] +
+           (rng.random(local.sum()) * sizes[local]).astype(np.int64))
+    targets[local] = by_community[pos]
+
+    return targets
+
+
+# edges as an (n, 2) array, without self-loops and duplicates
+def simple_edges(edges):
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return np.unique(edges, axis=0)
+
+
+def generate(vertices=DEFAULTS['vertices'], months=DEFAULTS['months'],
+             communities=DEFAULTS['communities'], degree=DEFAULTS['degree'],
+             mixing=DEFAULTS['mixing'], growth=DEFAULTS['growth'],
+             churn=DEFAULTS['churn'], drift=DEFAULTS['drift'],
+             rewire=DEFAULTS['rewire'], start_date=START_DATE, seed=0):
+    """Yield the date and the edges (an (n, 2) array of page ids) of each
+    snapshot. Page i is called page_title(i).
+    """
+    rng = np.random.default_rng(seed)
+
+    # community of every page ever created, -1 once it is removed
+    community = rng.integers(0, communities, size=vertices)
+    edges = np.zeros((0, 2), dtype=np.int64)
+
+    graph_date = arrow.get(start_date)
+    for month in range(months):
+        if month > 0:
+            alive = np.nonzero(community >= 0)[0]
+
+            removed = alive[rng.random(len(alive)) < churn]
+            community[removed] = -1
+
+            moved = alive[rng.random(len(alive)) < drift]
+            moved = moved[community[moved] >= 0]
+            community[moved] = ((community[moved] +
+                                 rng.integers(1, communities,
+                                              size=len(moved)))
+                                % communities)
+
+            nnew = rng.binomial(len(alive), growth)
+            community = np.concatenate(
+                (community, rng.integers(0, communities, size=nnew)))
+
+            # keep the links between pages that are still there, except for
+            # the rewired ones
+            keep = ((community[edges[:, 0]] >= 0) &
+                    (community[edges[:, 1]] >= 0) &
+                    (rng.random(len(edges)) >= rewire))
+            edges = edges[keep]
+
+        alive = np.nonzero(community >= 0)[0]
+        order = np.argsort(community[alive], kind='stable')
+        by_community = alive[order]
+        offsets = np.searchsorted(community[by_community],
+                                  np.arange(communities+1))
+
+        nnew = max(0, int(round(degree*len(alive))) - len(edges))
+        sources = alive[rng.integers(0, len(alive), size=nnew)]
+        targets = draw_targets(rng, sources, community, alive, by_community,
+                               offsets, mixing)
+
+        edges = simple_edges(np.concatenate(
+            (edges, np.column_stack((sources, targets)))))
+
+        yield graph_date.format('YYYY-MM-DD'), edges
+
+        graph_date = graph_date.replace(months=+1)
+
+
+def write_snapshot(path, edges):
+    with open(path, 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(HEADER)
+        writer.writerows((page_title(src), page_title(dst))
+                         for src, dst in edges.tolist())
+
+
+def write_series(output_dir, **params):
+    """Generate a series of snapshots (see generate()) and write them in
+    output_dir, returns the paths of the edge lists.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = []
+    for graph_date, edges in generate(**params):
+        path = snapshot_path(output_dir, graph_date)
+        write_snapshot(path, edges)
+        paths.append(path)
+
+        logger.debug('Snapshot {}: {} edges'.format(graph_date, len(edges)))
+
+    return paths
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    paths = write_series(args.output_dir, vertices=args.vertices,
+                         months=args.months, communities=args.communities,
+                         degree=args.degree, mixing=args.mixing,
+                         growth=args.growth, churn=args.churn,
+                         drift=args.drift, rewire=args.rewire,
+                         start_date=args.start_date, seed=args.seed)
+
+    logger.info('{} snapshots written to {}'
+                .format(len(paths), args.output_dir))
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+"""
+usage: python -m benchmarks.run [-h] [--vertices VERTICES] [--months MONTHS]
+                                [--communities COMMUNITIES]
+                                [--degree DEGREE] [--growth GROWTH]
+                                [--churn CHURN] [--drift DRIFT]
+                                [--benchmarks BENCHMARKS]
+                                [--work-dir WORK_DIR] [--output OUTPUT]
+                                [--seed SEED]
+
+Measure the time and memory of each stage of the scripts on synthetic graphs
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --vertices VERTICES   Comma-separated sizes (pages in the first snapshot)
+                        of the generated graphs [default: 1000,4000,16000]
+  --months MONTHS       Number of snapshots of each series [default: 12]
+  --communities COMMUNITIES
+                        Number of planted communities [default: 20]
+  --degree DEGREE       Mean number of links of a page [default: 10.0]
+  --growth GROWTH       Fraction of new pages each month [default: 0.02]
+  --churn CHURN         Fraction of pages removed each month
+                        [default: 0.01]
+  --drift DRIFT         Fraction of pages that move to another community
+                        each month [default: 0.02]
+  --benchmarks BENCHMARKS
+                        Comma-separated benchmarks to run [default: all]
+  --work-dir WORK_DIR   Directory for the generated graphs and the outputs
+                        of the benchmarks, kept at the end [default: a
+                        temporary directory]
+  --output OUTPUT       Output file [default: data/benchmarks.csv]
+  --seed SEED           Seed of the generator and of Louvain [default: 0]
+
+The benchmarks are:
+  * load: read the edge lists into igraph graphs (louvain_clusters.py);
+  * partition: Louvain partition of each snapshot (louvain_clusters.py),
+    partition_<backend> with the other community detection backends
+    (community_detection.py);
+  * consensus: consensus of 5 partitions of each snapshot (consensus.py),
+    the partitions themselves are computed in the setup;
+  * matching: match the clusters of consecutive snapshots
+    (cluster_matching.py), matching_<method> with the other matching
+    methods;
+  * write_clusters: write the partition files of each snapshot
+    (louvain_clusters.py);
+  * write_matrix: write the node x date membership matrix
+    (membership_matrix.py);
+  * node_files: write the node_evolution_<page>.csv files
+    (membership_matrix.py);
+  * timeline: statistics of the clusters of each node from the membership
+    matrix (node_timeline.py);
+  * metric_<m>: metric m of centrality_metrics.py (one of 'mdrbckl') on the
+    last snapshot, with the default options.
+
+Each benchmark runs in a new process, so that its peak RSS is not affected
+by the other ones. The report has one row for each size and benchmark, with
+the growth, churn and drift of the generated series, the number of
+snapshots and of edges, the wall time and CPU time of the
+benchmark, the peak RSS after its setup (e.g. loading the graphs that are
+partitioned) and the peak RSS at the end.
+"""
+
+import os
+import csv
+import time
+import shutil
+import argparse
+import logging
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+
+from benchmarks.generator import DEFAULTS, write_series
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+OUTPUT_FILE = os.path.join('data', 'benchmarks.csv')
+SIZES = '1000,4000,16000'
+METRIC_LETTERS = 'mdrbckl'
+
+HEADER = ('vertices', 'growth', 'churn', 'drift', 'benchmark', 'snapshots', 'edges', 'wall_seconds',
+          'cpu_seconds', 'setup_rss_mb', 'peak_rss_mb')
+
+
+def get_args():
+    description=('Measure the time and memory of each stage of the scripts '
+                 'on synthetic graphs')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--vertices', default=SIZES,
+                        help='Comma-separated sizes (pages in the first '
+                             'snapshot) of the generated graphs '
+                             '[default: {}]'.format(SIZES))
+    parser.add_argument('--months', type=int, default=DEFAULTS['months'],
+                        help='Number of snapshots of each series '
+                             '[default: {}]'.format(DEFAULTS['months']))
+    parser.add_argument('--communities', type=int,
+                        default=DEFAULTS['communities'],
+                        help='Number of planted communities '
+                             '[default: {}]'.format(DEFAULTS['communities']))
+    parser.add_argument('--degree', type=float, default=DEFAULTS['degree'],
+                        help='Mean number of links of a page '
+                             '[default: {}]'.format(DEFAULTS['degree']))
+    parser.add_argument('--growth', type=float, default=DEFAULTS['growth'],
+                        help='Fraction of new pages each month '
+                             '[default: {}]'.format(DEFAULTS['growth']))
+    parser.add_argument('--churn', type=float, default=DEFAULTS['churn'],
+                        help='Fraction of pages removed each month '
+                             '[default: {}]'.format(DEFAULTS['churn']))
+    parser.add_argument('--drift', type=float, default=DEFAULTS['drift'],
+                        help='Fraction of pages that move to another '
+                             'community each month '
+                             '[default: {}]'.format(DEFAULTS['drift']))
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                        help='Comma-separated benchmarks to run '
+                             '[default: all]')
+    parser.add_argument('--work-dir',
+                        help='Directory for the generated graphs and the '
+                             'outputs of the benchmarks, kept at the end '
+                             '[default: a temporary directory]')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='Output file [default: {}]'.format(OUTPUT_FILE))
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generator and of Louvain '
+                             '[default: 0]')
+
+    args = parser.parse_args()
+    args.vertices = [int(size) for size in args.vertices.split(',')]
+    args.benchmarks = args.benchmarks.split(',')
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: {}'.format(name))
+
+    return args
+
+
+# peak resident set size of this process, in MB (ru_maxrss is in KB on
+# Linux)
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+########## setup shared by the benchmarks
+# The scripts are imported here, in the process of each benchmark, so that
+# their imports are not counted in the memory of the parent.
+
+def load_graphs(paths):
+    from louvain_clusters import read_graph
+    from snapshot_store import snapshot_date
+
+    return [(snapshot_date(path), read_graph(path)) for path in paths]
+
+
+# global index of the vertices and membership of each snapshot over it
+def load_memberships(paths, seed):
+    from louvain_clusters import (partition_task, partition_snapshot,
+                                  snapshot_membership)
+
+    graphs = load_graphs(paths)
+
+    global_vlist = sorted(set(vname for _, G in graphs
+                              for vname in G.vs['name']))
+    global_vtoid = dict((vname, vid)
+                        for vid, vname in enumerate(global_vlist))
+
+    memberships = []
+    for graph_date, G in graphs:
+        _, membership = partition_snapshot(partition_task(graph_date, G,
+                                                          seed))
+        memberships.append((graph_date,
+                            snapshot_membership(G, membership,
+                                                global_vtoid)))
+
+    return global_vlist, memberships
+
+
+# node x date matrix of the cluster of each vertex (clusters are not matched
+# across snapshots, which does not change the cost of writing the matrix)
+def load_matrix(paths, seed):
+    global_vlist, memberships = load_memberships(paths, seed)
+
+    matrix = np.full((len(global_vlist), len(memberships)), -1,
+                     dtype=np.int32)
+    for didx, (_, (vids, membership)) in enumerate(memberships):
+        matrix[vids, didx] = membership
+
+    dates = [graph_date for graph_date, _ in memberships]
+    return global_vlist, dates, matrix
+
+
+########## benchmarks
+# Each benchmark does its setup and returns the function that is measured.
+
+def bench_load(paths, seed):
+    # import the scripts before the measure
+    import louvain_clusters
+    import snapshot_store
+
+    def run():
+        load_graphs(paths)
+    return run
+
+
+def bench_partition(backend):
+    def bench(paths, seed):
+        from louvain_clusters import partition_task, partition_snapshot
+
+        graphs = load_graphs(paths)
+        community = {'backend': backend}
+
+        def run():
+            for graph_date, G in graphs:
+                partition_snapshot(partition_task(graph_date, G, seed,
+                                                  community=community))
+        return run
+
+    return bench
+
+
+def bench_consensus(paths, seed):
+    from louvain_clusters import partition_task, partition_snapshot
+    from consensus import consensus_partition
+
+    runs = 5
+    snapshots = []
+    for graph_date, G in load_graphs(paths):
+        memberships = [partition_snapshot(partition_task(graph_date, G,
+                                                         seed + run))[1]
+                       for run in range(runs)]
+        edges = np.array(G.get_edgelist(), dtype=np.int32)
+        snapshots.append((G.vcount(), edges, memberships))
+
+    def run():
+        for vcount, edges, memberships in snapshots:
+            consensus_partition(vcount, edges, memberships, seed=seed)
+    return run
+
+
+def bench_matching(method):
+    def bench(paths, seed):
+        from cluster_matching import match_clusters
+
+        _, memberships = load_memberships(paths, seed)
+
+        def run():
+            for (_, (vids1, membership1)), (_, (vids2, membership2)) in \
+                    zip(memberships, memberships[1:]):
+                match_clusters(vids1, membership1, vids2, membership2,
+                               method=method)
+        return run
+
+    return bench
+
+
+def bench_write_clusters(paths, seed):
+    from louvain_clusters import write_snapshot_clusters
+
+    global_vlist, memberships = load_memberships(paths, seed)
+    os.makedirs(os.path.join('data', 'partitions'), exist_ok=True)
+    os.makedirs(os.path.join('data', 'partitions-evolution'), exist_ok=True)
+
+    def run():
+        for graph_date, (vids, membership) in memberships:
+            write_snapshot_clusters(graph_date, vids, membership,
+                                    global_vlist)
+    return run
+
+
+def bench_write_matrix(paths, seed):
+    from membership_matrix import save_matrix
+
+    _, dates, matrix = load_matrix(paths, seed)
+    os.makedirs('data', exist_ok=True)
+
+    def run():
+        save_matrix(os.path.join('data', 'nodes-evolution.npy'), matrix,
+                    dates)
+    return run
+
+
+def bench_node_files(paths, seed):
+    from membership_matrix import export_node_files
+
+    global_vlist, dates, matrix = load_matrix(paths, seed)
+    nodes_dir = os.path.join('data', 'nodes-evolution')
+    os.makedirs(nodes_dir, exist_ok=True)
+
+    def run():
+        export_node_files(matrix, dates, global_vlist, nodes_dir)
+    return run
+
+
+def bench_timeline(paths, seed):
+    from membership_matrix import SHARD_SIZE
+    from node_timeline import STABLE_WINDOW, shard_timeline
+
+    _, _, matrix = load_matrix(paths, seed)
+
+    def run():
+        for start in range(0, matrix.shape[0], SHARD_SIZE):
+            shard_timeline(matrix[start:start+SHARD_SIZE], [STABLE_WINDOW])
+    return run
+
+
+def bench_metric(metric):
+    def bench(paths, seed):
+        from centrality_metrics import (read_network, metric_vectors,
+                                        add_metric_args)
+        from temporal_metrics import metric_params, snapshot_params
+
+        parser = argparse.ArgumentParser()
+        add_metric_args(parser)
+        params = metric_params(parser.parse_args([]))
+
+        g = read_network(paths[-1], params['directed'])
+        params = snapshot_params(params, g)
+
+        def run():
+            metric_vectors(g, metric, params)
+        return run
+
+    return bench
+
+
+BENCHMARKS = {'load': bench_load,
+              'partition': bench_partition('louvain'),
+              'partition_multilevel': bench_partition('multilevel'),
+              'partition_leiden': bench_partition('leiden'),
+              'consensus': bench_consensus,
+              'matching': bench_matching('hungarian'),
+              'matching_sparse': bench_matching('sparse'),
+              'matching_components': bench_matching('components'),
+              'matching_greedy': bench_matching('greedy'),
+              'write_clusters': bench_write_clusters,
+              'write_matrix': bench_write_matrix,
+              'node_files': bench_node_files,
+              'timeline': bench_timeline,
+              }
+for metric in METRIC_LETTERS:
+    BENCHMARKS['metric_{}'.format(metric)] = bench_metric(metric)
+
+
+# Run a benchmark in work_dir, returns wall time, CPU time, the peak RSS
+# after the setup and at the end
+def run_benchmark(task):
+    name, paths, work_dir, seed = task
+
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+
+    run = BENCHMARKS[name](paths, seed)
+    setup_rss = peak_rss()
+
+    start_wall, start_cpu = time.time(), time.process_time()
+    run()
+    wall = time.time() - start_wall
+    cpu = time.process_time() - start_cpu
+
+    return wall, cpu, setup_rss, peak_rss()
+
+
+def count_edges(path):
+    with open(path, 'r') as infile:
+        # skip header
+        return sum(1 for _ in infile) - 1
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix='benchmarks-')
+    work_dir = os.path.abspath(work_dir)
+
+    # every benchmark gets a fresh interpreter
+    context = multiprocessing.get_context('spawn')
+
+    with open(args.output, 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(HEADER)
+
+        for size in args.vertices:
+            graphs_dir = os.path.join(work_dir, 'graphs-{}'.format(size))
+            paths = write_series(graphs_dir, vertices=size,
+                                 months=args.months,
+                                 communities=args.communities,
+                                 degree=args.degree, growth=args.growth,
+                                 churn=args.churn, drift=args.drift,
+                                 seed=args.seed)
+            edges = [count_edges(path) for path in paths]
+            logger.info('Generated {} snapshots with {} pages, {} edges'
+                        .format(len(paths), size, sum(edges)))
+
+            for name in args.benchmarks:
+                task = (name, paths,
+                        os.path.join(work_dir, '{}-{}'.format(name, size)),
+                        args.seed)
+
+                with context.Pool(1) as pool:
+                    wall, cpu, setup_rss, rss = pool.apply(run_benchmark,
+                                                           (task,))
+
+                # the metrics are computed on the last snapshot only
+                nsnapshots, nedges = len(paths), sum(edges)
+                if name.startswith('metric_'):
+                    nsnapshots, nedges = 1, edges[-1]
+
+                writer.writerow((size, args.growth, args.churn, args.drift,
+                                 name, nsnapshots, nedges,
+                                 '{:.3f}'.format(wall), '{:.3f}'.format(cpu),
+                                 '{:.1f}'.format(setup_rss),
+                                 '{:.1f}'.format(rss)))
+                outfile.flush()
+                logger.info('{} on {} pages: {:.3f}s, peak RSS {:.1f}MB'
+                            .format(name, size, wall, rss))
+
+    if args.work_dir is None:
+        shutil.rmtree(work_dir)
+
+    logger.info('Report written to {}'.format(args.output))
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,36 @@ import igraph
 import logging
 import argparse
 import itertools
+import numpy as np
+import multiprocessing
 import igraph as ig
 from math import sqrt
 from operator import itemgetter, attrgetter
 
+from snapshot_store import SnapshotStore
+from rankings import rank, METHODS as RANK_METHODS
+from metric_cache import MetricCache, MAX_SIZE, graph_digest, metric_key
+from approx_centrality import (approximate_betweenness,
+                               approximate_closeness, sample_size,
+                               graph_edges)
+from instrumentation import Instrumentation, Timed, add_instrumentation_args
+from community_detection import (add_community_args, check_community_args,
+                                 find_partition)
+
 
 METRICS='mdrbckl'
 
+# name of the ranking column of each vector
+RANK_COLUMNS = {'indegree': 'indegree_rank',
+                'outdegree': 'outdegree_ranking',
+                'degree': 'degree_rank',
+                'relevance': 'relevance_rank',
+                'betweenness': 'betweenness_rank',
+                'closeness': 'closeness_rank',
+                'harmonic_closeness': 'harmonic_closeness_rank',
+                'coreness': 'coreness_rank',
+                }
+
 ########## logging
 # create logger with 'spam_application'
 logger = logging.getLogger(__file__)
@@ -41,26 +64,25 @@ logger.addHandler(ch)
 #set to False to avoid displaying messages about the execution in the shell
 verbose = True
 
-# calculate the ranking of nodes according to a given metric
-# (the input vector contains the value of the metric for each node)
-def ranking(vector):
-    nodes = {}  
-    for i in range(len(vector)):
-        value = vector[i]
-        if value not in nodes:
-            nodes[value] = []                       
-        nodes[value].append(i+1)    
-    ranking = {}        
-    j = 1
-    for k in reversed(sorted(nodes.keys())):
-        for u in nodes[k]:
-            ranking[u] = j
-        j += len(nodes[k])  
-    return ranking
+
+# network is either a file or, if store is given, the date of a snapshot in
+# the store
+def read_network(network, directed, store=None):
+    # g = G.Read(network_folder_path + network, 'ncol', directed = directed)
+    if store is not None:
+        return SnapshotStore(store).graph(network, directed=directed)
+
+    return ig.Graph.Read(network, 'ncol', directed = directed)
 
 
 def main(network, output, directed, metrics, betweenness_directed,
-         closeness_mode, coreness_mode, base_node):
+         closeness_mode, coreness_mode, base_node, store=None,
+         betweenness_samples=None, betweenness_error=None,
+         betweenness_cutoff=None, jobs=1, seed=0, rank_method='min',
+         rank_top_k=None, rank_tolerance=0.0, closeness_samples=None,
+         harmonic_closeness=False, cache=None, cache_size=MAX_SIZE,
+         report=None, profile=None, community_backend='multilevel',
+         resolution=1.0, community_iterations=None):
 
     # PARAMETERS - DEFAULT VALUES
     #
@@ -89,8 +111,86 @@ def main(network, output, directed, metrics, betweenness_directed,
     #
     # base_node = 0
     # node for which the distances from all other nodes will be computed (in
-    # case "l" is included in parameter "metrics"). Can be node label or id.
+    # case "l" is included in parameter "metrics"). Can be node id or label,
+    # or a list of them to compute the distances from each one: integers are
+    # ids, other values are labels, "id:<id>" and "name:<label>" force one
+    # of the two (e.g. "name:0" for a node labelled 0).
     # By default it is the first node appearing in the network file (node 0)
+    #
+    # store = None
+    # path of a snapshot store (see snapshot_store.py). If given, network is
+    # the date of the snapshot to be read from the store.
+    #
+    # betweenness_samples = None
+    # if given, betweenness is estimated from the shortest paths starting
+    # from this number of randomly sampled sources, and its standard error
+    # is written next to its ranking
+    #
+    # betweenness_error = None
+    # if given, the number of sampled sources is chosen so that the error on
+    # the normalized betweenness is below this value (with probability 0.9)
+    #
+    # betweenness_cutoff = None
+    # if given, paths longer than this are ignored when computing betweenness
+    #
+    # jobs = 1
+    # number of worker processes used to compute the metrics concurrently
+    # and for the approximate metrics
+    #
+    # seed = 0
+    # seed of the random sampling of the approximate metrics and of the
+    # community detection
+    #
+    # rank_method = 'min'
+    # how tied nodes are ranked: 'min' (1, 2, 2, 4), 'dense' (1, 2, 2, 3)
+    # or 'fractional' (1, 2.5, 2.5, 4)
+    #
+    # rank_top_k = None
+    # if given, only the nodes with the top rank_top_k values of each metric
+    # (and the ones tied with the last of them) are ranked, the other ones
+    # get rank 0
+    #
+    # rank_tolerance = 0.0
+    # values of a metric that differ by less than this fraction are
+    # considered tied when ranking
+    #
+    # closeness_samples = None
+    # if given, closeness is estimated from the distances from (or to,
+    # according to closeness_mode) this number of randomly sampled sources,
+    # and its standard error is written next to its ranking
+    #
+    # harmonic_closeness = False
+    # set to True to compute the harmonic centrality (the mean of the
+    # inverse distances) instead of closeness
+    #
+    # cache = None
+    # directory of a cache of the computed metrics (see metric_cache.py).
+    # Metrics of the same network with the same parameters are read from the
+    # cache instead of being computed again
+    #
+    # cache_size = 1GB
+    # size limit of the cache in bytes, the least recently used metrics are
+    # removed from the cache when it is exceeded
+    #
+    # report = None
+    # if given, the time, memory and item counts of each stage (load,
+    # metric_<m> for each metric, write) are written to this file, as JSON
+    # or CSV according to its extension (see instrumentation.py)
+    #
+    # profile = None
+    # names of the stages to run under cProfile, or ['all']
+    #
+    # community_backend = 'multilevel'
+    # algorithm used to compute the clusters: 'multilevel' (igraph),
+    # 'louvain' or 'leiden' (see community_detection.py)
+    #
+    # resolution = 1.0
+    # resolution of the community detection, higher values give more and
+    # smaller clusters
+    #
+    # community_iterations = None
+    # number of iterations of the community detection, by default the one
+    # of the backend (see community_detection.py)
     
     #overwrite parameter values, when specified in the query
     directed_values = ['directed', 'dir', 'd', 'true', 'yes', 'y']
@@ -104,212 +204,429 @@ def main(network, output, directed, metrics, betweenness_directed,
     logger.info('closeness_mode (c_mode): {}'.format(closeness_mode))
     logger.info('coreness_mode (k_mode): {}'.format(coreness_mode))
     logger.info('base node: {}'.format(base_node))
+    logger.info('store: {}'.format(store))
+    logger.info('betweenness_samples: {}'.format(betweenness_samples))
+    logger.info('betweenness_error: {}'.format(betweenness_error))
+    logger.info('betweenness_cutoff: {}'.format(betweenness_cutoff))
+    logger.info('jobs: {}'.format(jobs))
+    logger.info('seed: {}'.format(seed))
+    logger.info('rank_method: {}'.format(rank_method))
+    logger.info('rank_top_k: {}'.format(rank_top_k))
+    logger.info('rank_tolerance: {}'.format(rank_tolerance))
+    logger.info('closeness_samples: {}'.format(closeness_samples))
+    logger.info('harmonic_closeness: {}'.format(harmonic_closeness))
+    logger.info('cache: {}'.format(cache))
+    logger.info('community_backend: {}'.format(community_backend))
+    logger.info('resolution: {}'.format(resolution))
+    logger.info('community_iterations: {}'.format(community_iterations))
     logger.info('')
-    
-    # g = G.Read(network_folder_path + network, 'ncol', directed = directed)
-    g = ig.Graph.Read(network, 'ncol', directed = directed)
+
+    instr = Instrumentation('centrality_metrics', report=report,
+                            profile=profile or (), logger=logger)
+
+    with instr.stage('load') as stage:
+        g = read_network(network, directed, store=store)
+        stage.count(vertices=g.vcount(), edges=g.ecount())
 
     logger.info('network read. {} nodes and {} edges'.format(g.vcount(), 
                                                              g.ecount()))
 
+    if betweenness_error is not None:
+        betweenness_samples = sample_size(g.vcount(), betweenness_error)
+
+    params = {'directed': directed,
+              'betweenness_directed': betweenness_directed,
+              'closeness_mode': closeness_mode,
+              'coreness_mode': coreness_mode,
+              'base_node': base_node,
+              'betweenness_samples': betweenness_samples,
+              'betweenness_cutoff': betweenness_cutoff,
+              'jobs': jobs,
+              'seed': seed,
+              'rank_method': rank_method,
+              'rank_top_k': rank_top_k,
+              'rank_tolerance': rank_tolerance,
+              'closeness_samples': closeness_samples,
+              'harmonic_closeness': harmonic_closeness,
+              'community_backend': community_backend,
+              'resolution': resolution,
+              'community_iterations': community_iterations,
+              }
+
+    # metrics are always written in the order of METRICS
+    selected = [metric for metric in METRICS if metric in metrics]
+    metric_cache = None
+    if cache is not None:
+        metric_cache = MetricCache(cache, max_size=cache_size)
+
+    results = compute_metrics(g, selected, params, jobs, cache=metric_cache,
+                              instr=instr)
+
+    if metric_cache is not None:
+        logger.info('metric cache: {} hits, {} misses, {} bytes'
+                    .format(metric_cache.hits, metric_cache.misses,
+                            metric_cache.size()))
+
     header = []
     header.append('node')
-    # output = 'node'
-    
-    if metrics.find('m') >= 0:  
-        if directed: 
-            #create an undirected copy of the graph for computing the
-            # Louvain method    
-            g_und = g.copy()        
-            g_und.to_undirected(mode="collapse")    
-        else: g_und = g
-        clustering = g_und.community_multilevel()
-        node_clusters = {}
-        for i in range(len(clustering)):
-            for n in clustering[i]:
-                node_clusters[n] = i+1
+    columns = []
+    for metric in selected:
+        for name, values in results[metric]:
+            header.append(name)
+            columns.append(values)
 
-        # output += ',' +     'cluster'
-        header.append('cluster')
+    with instr.stage('write', files=1, rows=g.vcount()):
+        csvfile = open(output, 'w+')
+        writer = csv.writer(csvfile, delimiter='\t')
 
-    if metrics.find('d') >= 0:
-        if directed:
-            indegree = g.indegree()
-            indegree_ranking = ranking(indegree)
+        logger.info('Writing results to {}'.format(output))
 
-            # output += ',' +     'indegree' + ',' + 'indegree_rank'
-            header.append('indegree')
-            header.append('indegree_rank')
+        writer.writerow(header)
 
-            outdegree = g.outdegree()
-            outdegree_ranking = ranking(outdegree)
+        names = g.vs['name']
+        for v in range(g.vcount()):
+            data = []
 
-            # output += ',' +     'outdegree' + ',' + 'outdegree_ranking'
-            header.append('outdegree')
-            header.append('outdegree_ranking')
+            data.append(names[v])
+            for values in columns:
+                data.append(values[v])
 
-        else:   
-            degree = g.degree()     
-            degree_ranking = ranking(degree)
+            writer.writerow(data)
 
-            # output += ',' +     'degree' + ',' + 'degree_rank'
-            header.append('degree')
-            header.append('degree_rank')
+        csvfile.close()
 
-    if metrics.find('r') >= 0:  
-        # output += ',' +     'relevance' + ',' + 'relevance_rank'
-        header.append('relevance')
-        header.append('relevance_rank')
+    instr.write()
 
-        if directed:
-            pagerank = g.pagerank()
-            pagerank_ranking = ranking(pagerank)
 
-            #replaced by more general name "relevance"
-            #~ output += ',' +  'pagerank' + ',' + 'pagerank_rank'
-        else:   
-            eigenvector = g.eigenvector_centrality()        
-            eigenvector_ranking = ranking(eigenvector)
+# calculate the ranking of nodes according to a given metric
+# (the input vector contains the value of the metric for each node)
+def ranking_column(vector, params):
+    return rank(vector, method=params['rank_method'],
+                top_k=params['rank_top_k'], rtol=params['rank_tolerance'])
 
-            #replaced by more general name "relevance"
-            #~ output += ',' +  'eigenvector' + ',' + 'eigenvector_rank'
 
-    if metrics.find('b') >= 0:
-        betweenness = g.betweenness(directed=directed and betweenness_directed)     
-        betweenness_ranking = ranking(betweenness)  
+# A base node as ('id', <id>) or ('name', <name>). The node is given by id
+# (an integer or "id:<id>") or by name ("name:<name>" or any other string).
+def parse_base_node(node):
+    node = str(node)
 
-        # output += ',' +     'betweenness' + ',' + 'betweenness_rank'
-        header.append('betweenness')
-        header.append('betweenness_rank')
+    if node.startswith('name:'):
+        return 'name', node[len('name:'):]
 
-    if metrics.find('c') >= 0:
-        closeness = g.closeness(mode=closeness_mode)        
-        closeness_ranking = ranking(closeness)
+    if node.startswith('id:'):
+        node = node[len('id:'):]
+    try:
+        return 'id', int(node)
+    except ValueError:
+        return 'name', node
 
-        # output += ',' +     'closeness' + ',' + 'closeness_rank'
-        header.append('closeness')
-        header.append('closeness_rank')
 
-    if metrics.find('k') >= 0:
-        coreness = g.coreness(mode=coreness_mode)       
-        coreness_ranking = ranking(coreness)
+# The id of a base node, or None if it is not in g
+def base_node_id(g, node):
+    kind, value = parse_base_node(node)
 
-        # output += ',' +     'coreness' + ',' + 'coreness_rank'
-        header.append('coreness')
-        header.append('coreness_rank')
+    if kind == 'id':
+        return value if 0 <= value < g.vcount() else None
 
-    if metrics.find('l') >= 0:
-        shortest_paths = g.get_shortest_paths(base_node, to=None, weights=None,
-                                              mode='ALL', output="vpath")
+    if 'name' not in g.vertex_attributes():
+        return None
+    try:
+        return g.vs.find(name=value).index
+    except ValueError:
+        return None
 
-        # output += ',' +     'distance_from_node'
-        header.append('distance_from_node')
 
-    csvfile = open(output, 'w+')
-    writer = csv.writer(csvfile, delimiter='\t')
+# Label of a base node in the name of its distance column: the name of the
+# vertex with id vid (as found by base_node_id()), or the node as given,
+# without "id:" or "name:", if it is not in g or g has no names
+def base_node_label(g, node, vid):
+    if vid is not None and 'name' in g.vertex_attributes():
+        return g.vs[vid]['name']
 
-    logger.info('Writing results to {}'.format(output))
+    return str(parse_base_node(node)[1])
 
-    writer.writerow(header)
 
-    for v in range(g.vcount()):
-        data = []
+# Compute one of the METRICS on g. Returns the raw vectors of the metric,
+# without the rankings, as a list of (column name, values) pairs.
+def metric_vectors(g, metric, params):
+    directed = params['directed']
+    columns = []
 
-        # output += '"' + g.vs[v]['name'] + '"'
-        data.append(g.vs[v]['name'])
+    if metric == 'm':
+        if directed:
+            #create an undirected copy of the graph for computing the
+            # Louvain method
+            g_und = g.copy()
+            g_und.to_undirected(mode="collapse")
+        else: g_und = g
+        membership = find_partition(
+            g_und, backend=params['community_backend'],
+            resolution=params['resolution'],
+            iterations=params['community_iterations'], seed=params['seed'])
 
-        if 'm' in metrics: 
-            # output += ',' + str(node_clusters[v])
-            data.append(node_clusters[v])
+        columns.append(('cluster', [c+1 for c in membership]))
 
-        if 'd' in metrics: 
+    elif metric == 'd':
+        if directed:
+            indegree = g.indegree()
+            columns.append(('indegree', indegree))
 
-            if directed:
-                # output += ',' + str(indegree[v]) + ',' + str(indegree_ranking[v+1])
-                # output += ',' + str(outdegree[v]) + ',' + str(outdegree_ranking[v+1])
-                data.append(indegree[v])
-                data.append(indegree_ranking[v+1])
-                data.append(outdegree[v])
-                data.append(outdegree_ranking[v+1])
+            outdegree = g.outdegree()
+            columns.append(('outdegree', outdegree))
 
-            else:
-                # output += ',' + str(degree[v]) + ',' + str(degree_ranking[v+1])
-                data.append(degree[v])
-                data.append(degree_ranking[v+1])
+        else:
+            degree = g.degree()
+            columns.append(('degree', degree))
 
-        if 'r' in metrics: 
-            if directed:
-                # output += ',' + str(pagerank[v]) + ',' + str(pagerank_ranking[v+1])
-                data.append(pagerank[v])
-                data.append(pagerank_ranking[v+1])
+    elif metric == 'r':
+        # pagerank for directed networks and eigenvector centrality for
+        # undirected ones, with the more general name "relevance"
+        if directed:
+            relevance = g.pagerank()
+        else:
+            relevance = g.eigenvector_centrality()
+
+        columns.append(('relevance', relevance))
+
+    elif metric == 'b':
+        b_directed = directed and params['betweenness_directed']
+        samples = params['betweenness_samples']
+
+        if samples is not None:
+            logger.info('Approximating betweenness from {} sources'
+                        .format(samples))
+            betweenness, betweenness_stderr = approximate_betweenness(
+                g, samples, directed=b_directed,
+                cutoff=params['betweenness_cutoff'], jobs=params['jobs'],
+                seed=params['seed'])
+            betweenness = betweenness.tolist()
+            betweenness_stderr = betweenness_stderr.tolist()
+            logger.info('betweenness: max standard error {}'
+                        .format(max(betweenness_stderr, default=0)))
+        else:
+            betweenness = g.betweenness(directed=b_directed,
+                                        cutoff=params['betweenness_cutoff'])
+
+        columns.append(('betweenness', betweenness))
+        if samples is not None:
+            columns.append(('betweenness_error', betweenness_stderr))
+
+    elif metric == 'c':
+        samples = params['closeness_samples']
+        harmonic = params['harmonic_closeness']
+        name = 'harmonic_closeness' if harmonic else 'closeness'
+
+        if samples is not None:
+            logger.info('Approximating {} from {} sources'
+                        .format(name, samples))
+            closeness, closeness_stderr = approximate_closeness(
+                g, samples, mode=params['closeness_mode'], harmonic=harmonic,
+                jobs=params['jobs'], seed=params['seed'])
+            closeness = closeness.tolist()
+            closeness_stderr = closeness_stderr.tolist()
+        elif harmonic:
+            closeness = g.harmonic_centrality(mode=params['closeness_mode'])
+        else:
+            closeness = g.closeness(mode=params['closeness_mode'])
+
+        columns.append((name, closeness))
+        if samples is not None:
+            columns.append(('{}_error'.format(name), closeness_stderr))
+
+    elif metric == 'k':
+        coreness = g.coreness(mode=params['coreness_mode'])
+        columns.append(('coreness', coreness))
+
+    elif metric == 'l':
+        base_nodes = params['base_node']
+        if not isinstance(base_nodes, (list, tuple)):
+            base_nodes = [base_nodes]
+
+        # hop counts from all the base nodes in a single call, unreachable
+        # nodes (and missing base nodes) have distance -1
+        base_ids = [base_node_id(g, node) for node in base_nodes]
+        found = [vid for vid in base_ids if vid is not None]
+        distances = iter(g.distances(source=found, mode='ALL'))
+
+        for node, vid in zip(base_nodes, base_ids):
+            if vid is None:
+                logger.warning('base node {} not found'.format(node))
+                distance = np.full(g.vcount(), -1, dtype=np.int64)
+            else:
+                distance = np.array(next(distances), dtype=float)
+                distance[np.isinf(distance)] = -1
+                distance = distance.astype(np.int64)
 
+            if len(base_nodes) == 1:
+                name = 'distance_from_node'
             else:
-                # output += ',' + str(eigenvector[v]) + ',' + str(eigenvector_ranking[v+1])
-                data.append(eigenvector[v])
-                data.append(eigenvector_ranking[v+1])
+                name = 'distance_from_{}'.format(
+                    base_node_label(g, node, vid))
+            columns.append((name, distance))
+
+    return columns
+
+
+# Add the rankings to the vectors of a metric, each ranking is written right
+# after its vector
+def metric_columns(vectors, params):
+    columns = []
+    for name, values in vectors:
+        columns.append((name, values))
+        if name in RANK_COLUMNS:
+            columns.append((RANK_COLUMNS[name],
+                            ranking_column(values, params)))
+
+    return columns
+
+
+# Compute one of the METRICS on g. Returns the columns of the output for the
+# metric, as a list of (column name, values) pairs.
+def compute_metric(g, metric, params):
+    return metric_columns(metric_vectors(g, metric, params), params)
+
+
+def is_approximate(metric, params):
+    return ((metric == 'b' and params['betweenness_samples'] is not None) or
+            (metric == 'c' and params['closeness_samples'] is not None))
+
 
-        if 'b' in metrics: 
-            # output += ',' + str(betweenness[v]) + ',' + str(betweenness_ranking[v+1])
-            data.append(betweenness[v])
-            data.append(betweenness_ranking[v+1])
+# graph of the worker process, see init_worker()
+_graph = None
 
-        if 'c' in metrics: 
-            # output += ',' + str(closeness[v]) + ',' + str(closeness_ranking[v+1])
-            data.append(closeness[v])
-            data.append(closeness_ranking[v+1])
 
-        if 'k' in metrics: 
-            # output += ',' + str(coreness[v]) + ',' + str(coreness_ranking[v+1])
-            data.append(coreness[v])
-            data.append(coreness_ranking[v+1])
+def init_worker(vcount, edges, directed, names):
+    global _graph
+    _graph = ig.Graph(n=vcount, edges=edges.tolist(), directed=directed)
+    _graph.vs['name'] = names
 
-        if 'l' in metrics: 
-            # output += ',' + str(len(shortest_paths[v])-1)
-            data.append(len(shortest_paths[v])-1)
 
-        writer.writerow(data)
+def metric_task(task):
+    metric, params = task
+    return metric_vectors(_graph, metric, params)
 
-    csvfile.close()
 
+# Compute the selected metrics. With jobs > 1 the metrics are computed
+# concurrently by a pool of worker processes, each one with a copy of the
+# graph built from its array of edges. Approximate metrics have their own
+# pool of workers, so they run in this process at the same time.
+# If a cache is given, the metrics found in the cache are not computed again
+# and the computed ones are added to it. Each metric is measured as a
+# metric_<m> stage of instr.
+def compute_metrics(g, selected, params, jobs, cache=None, instr=None):
+    if instr is None:
+        instr = Instrumentation('centrality_metrics')
 
-def cli_args():
+    vectors = dict()
+    keys = dict()
+    if cache is not None:
+        digest = graph_digest(g)
+        for metric in selected:
+            keys[metric] = metric_key(digest, metric, params)
+            cached = cache.get(keys[metric])
+            if cached is not None:
+                logger.info("metric '{}' read from cache".format(metric))
+                vectors[metric] = cached
+                instr.record('metric_{}'.format(metric), cache_hits=1)
 
-    def nonnegative_int(value):
-        errmsg = "Invalid non-negative integer value: {}".format(value)
+    missing = [metric for metric in selected if metric not in vectors]
 
-        try:
-            ivalue = int(value)
-        except ValueError:
-            raise argparse.ArgumentTypeError(errmsg)
+    local_metrics = missing
+    pool_metrics = []
+    if jobs > 1:
+        local_metrics = [metric for metric in missing
+                         if is_approximate(metric, params)]
+        pool_metrics = [metric for metric in missing
+                        if metric not in local_metrics]
 
-        if ivalue < 0:
-            raise argparse.ArgumentTypeError(errmsg)
+    pool = None
+    pending = dict()
+    if pool_metrics:
+        pool = multiprocessing.Pool(min(jobs, len(pool_metrics)),
+                                    initializer=init_worker,
+                                    initargs=(g.vcount(), graph_edges(g),
+                                              g.is_directed(),
+                                              g.vs['name']))
+        for metric in pool_metrics:
+            pending[metric] = pool.apply_async(Timed(metric_task),
+                                               ((metric, params),))
 
-        return ivalue
+    for metric in local_metrics:
+        with instr.stage('metric_{}'.format(metric), vertices=g.vcount(),
+                         edges=g.ecount()) as stage:
+            vectors[metric] = metric_vectors(g, metric, params)
+        logger.info("metric '{}' computed in {:.3f}s"
+                    .format(metric, stage.measures['wall_seconds']))
 
-    def string_choices(astring):
+    for metric in pool_metrics:
+        vectors[metric], measures = pending[metric].get()
+        instr.record('metric_{}'.format(metric), measures=measures,
+                     vertices=g.vcount(), edges=g.ecount())
+        logger.info("metric '{}' computed in {:.3f}s"
+                    .format(metric, measures['wall_seconds']))
 
-        combinations = list()
-        for l in range(1,len(astring)+1):
-            combinations += [''.join(el)
-                             for el in itertools.combinations(astring,l)]
+    if pool is not None:
+        pool.close()
+        pool.join()
 
-        return combinations
+    if cache is not None:
+        for metric in missing:
+            cache.put(keys[metric], vectors[metric])
 
+    return dict((metric, metric_columns(vectors[metric], params))
+                for metric in selected)
 
-    parser = argparse.ArgumentParser()
 
-    parser.add_argument("network",
-                        metavar='<network>',
-                        help="Input file.",
-                        )
-    parser.add_argument("--verbose",
-                        help="Set verbose output.",
-                        action='store_true'
-                        )
-    parser.add_argument("--output",
-                        help="Output filename.",
-                        )
+def nonnegative_int(value):
+    errmsg = "Invalid non-negative integer value: {}".format(value)
+
+    try:
+        ivalue = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(errmsg)
+
+    if ivalue < 0:
+        raise argparse.ArgumentTypeError(errmsg)
+
+    return ivalue
+
+
+def positive_int(value):
+    errmsg = "Invalid positive integer value: {}".format(value)
+
+    ivalue = nonnegative_int(value)
+    if ivalue == 0:
+        raise argparse.ArgumentTypeError(errmsg)
+
+    return ivalue
+
+
+def positive_float(value):
+    errmsg = "Invalid positive value: {}".format(value)
+
+    try:
+        fvalue = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(errmsg)
+
+    if fvalue <= 0:
+        raise argparse.ArgumentTypeError(errmsg)
+
+    return fvalue
+
+
+def string_choices(astring):
+
+    combinations = list()
+    for l in range(1,len(astring)+1):
+        combinations += [''.join(el)
+                         for el in itertools.combinations(astring,l)]
+
+    return combinations
+
+
+# Options of the metrics, shared with temporal_metrics.py
+def add_metric_args(parser):
     parser.add_argument("--directed",
                         help="The input network is directed.",
                         action='store_true'
@@ -344,17 +661,130 @@ def cli_args():
                         default='ALL'
                         )
     parser.add_argument("--base-node",
-                        help="Node for which the distances from all other nodes "
-                             "will be computed (in case 'l' is included in "
-                             " parameter 'metrics'). Can be node label or id. "
-                             "Must be a nonnegative integer. "
+                        help="Nodes for which the distances from all other "
+                             "nodes will be computed (in case 'l' is included "
+                             "in parameter 'metrics'), one column for each. "
+                             "Integers are node ids, other values node "
+                             "labels, use 'id:<id>' or 'name:<label>' to "
+                             "choose (e.g. 'name:0' for a node labelled 0). "
                              "By default it is the first node appearing in the "
                              "network file (node 0)",
+                        nargs='+',
+                        default=[0]
+                        )
+    parser.add_argument("--closeness-samples",
+                        help="Approximate closeness from the distances from "
+                             "(or to, with --closeness-mode) this number of "
+                             "randomly sampled sources. The standard error of "
+                             "the estimate is written in the "
+                             "'closeness_error' column.",
+                        type=positive_int
+                        )
+    parser.add_argument("--harmonic-closeness",
+                        help="Compute the harmonic centrality (the mean of "
+                             "the inverse distances, well defined on "
+                             "disconnected networks) instead of closeness.",
+                        action='store_true'
+                        )
+    betweenness_group = parser.add_mutually_exclusive_group()
+    betweenness_group.add_argument("--betweenness-samples",
+                        help="Approximate betweenness from the shortest paths "
+                             "starting from this number of randomly sampled "
+                             "sources. The standard error of the estimate is "
+                             "written in the 'betweenness_error' column.",
+                        type=positive_int
+                        )
+    betweenness_group.add_argument("--betweenness-error",
+                        help="Approximate betweenness sampling enough sources "
+                             "for the error on the normalized betweenness to "
+                             "be below this value (with probability 0.9).",
+                        type=positive_float
+                        )
+    parser.add_argument("--betweenness-cutoff",
+                        help="Ignore paths longer than this when computing "
+                             "betweenness.",
+                        type=nonnegative_int
+                        )
+    parser.add_argument("--seed",
+                        help="Seed of the random sampling of the approximate "
+                             "metrics and of the community detection "
+                             "[default: 0].",
                         type=nonnegative_int,
                         default=0
                         )
+    add_community_args(parser, 'multilevel')
+    parser.add_argument("--rank-method",
+                        help="How tied nodes are ranked: 'min' (1, 2, 2, 4), "
+                             "'dense' (1, 2, 2, 3) or 'fractional' "
+                             "(1, 2.5, 2.5, 4) [default: min].",
+                        choices=RANK_METHODS,
+                        default='min'
+                        )
+    parser.add_argument("--rank-top-k",
+                        help="Only rank the nodes with the top K values of "
+                             "each metric (and the ones tied with the last "
+                             "of them), the other ones get rank 0.",
+                        metavar='K',
+                        type=positive_int
+                        )
+    parser.add_argument("--rank-tolerance",
+                        help="Values of a metric that differ by less than "
+                             "this fraction are considered tied when "
+                             "ranking [default: 0].",
+                        type=float,
+                        default=0.0
+                        )
+
+
+# Reject the options of add_metric_args() that can not be used together
+def check_metric_args(parser, args):
+    check_community_args(parser, args)
+
+
+def cli_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("network",
+                        metavar='<network>',
+                        help="Input file (or snapshot date, with --store).",
+                        )
+    parser.add_argument("--store",
+                        help="Read the network from a snapshot store (see "
+                             "snapshot_store.py), <network> is the date of "
+                             "the snapshot.",
+                        )
+    parser.add_argument("--verbose",
+                        help="Set verbose output.",
+                        action='store_true'
+                        )
+    parser.add_argument("--output",
+                        help="Output filename.",
+                        )
+    parser.add_argument("--cache",
+                        help="Directory of a cache of the computed metrics, "
+                             "metrics of the same network with the same "
+                             "parameters are read from the cache instead of "
+                             "being computed again.",
+                        )
+    parser.add_argument("--cache-size",
+                        help="Size limit of the cache in MB, the least "
+                             "recently used metrics are removed from the "
+                             "cache when it is exceeded [default: 1024].",
+                        type=positive_int,
+                        default=MAX_SIZE // 1024**2
+                        )
+    parser.add_argument("--jobs",
+                        help="Number of worker processes used to compute the "
+                             "metrics concurrently and for the approximate "
+                             "metrics [default: 1].",
+                        type=positive_int,
+                        default=1
+                        )
+    add_metric_args(parser)
+    add_instrumentation_args(parser)
 
     args = parser.parse_args()
+    check_metric_args(parser, args)
 
     return args
 
@@ -376,4 +806,23 @@ if __name__ == '__main__':
          betweenness_directed=args.betweenness_directed,
          closeness_mode=args.closeness_mode,
          coreness_mode=args.coreness_mode,
-         base_node=args.base_node)
+         base_node=args.base_node,
+         store=args.store,
+         betweenness_samples=args.betweenness_samples,
+         betweenness_error=args.betweenness_error,
+         betweenness_cutoff=args.betweenness_cutoff,
+         jobs=args.jobs,
+         seed=args.seed,
+         rank_method=args.rank_method,
+         rank_top_k=args.rank_top_k,
+         rank_tolerance=args.rank_tolerance,
+         closeness_samples=args.closeness_samples,
+         harmonic_closeness=args.harmonic_closeness,
+         cache=args.cache,
+         cache_size=args.cache_size * 1024**2,
+         report=args.report,
+         profile=(args.profile.split(',') if args.profile is not None
+                  else None),
+         community_backend=args.community_backend,
+         resolution=args.resolution,
+         community_iterations=args.community_iterations)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+usage: closeness_accuracy.py [-h] [--store STORE] [--directed]
+                             [--closeness-mode {IN,OUT,ALL}]
+                             [--harmonic-closeness] [--samples SAMPLES]
+                             [--jobs JOBS] [--seed SEED] [--output OUTPUT]
+                             <network> [<network> ...]
+
+Compare the approximate closeness with the exact one for different numbers
+of sampled sources
+
+positional arguments:
+  <network>             Input file (or snapshot date, with --store)
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --store STORE         Read the networks from a snapshot store (see
+                        snapshot_store.py)
+  --directed            The input networks are directed
+  --closeness-mode {IN,OUT,ALL}
+                        As in centrality_metrics.py [default: ALL]
+  --harmonic-closeness  Compare the harmonic centrality instead of closeness
+  --samples SAMPLES     Comma-separated numbers of sampled sources
+                        [default: 16,64,256,1024]
+  --jobs JOBS           Number of worker processes [default: 1]
+  --seed SEED           Seed of the random sampling [default: 0]
+  --output OUTPUT       Output file [default: data/closeness_accuracy.csv]
+
+The report has one row for each network and number of samples, with the size
+of the network, the time of the exact and of the approximate computation,
+the mean and maximum absolute error of the estimate, the mean standard error
+reported by the approximation and the Spearman correlation between the exact
+and the approximate rankings.
+"""
+
+import os
+import csv
+import time
+import argparse
+import logging
+import numpy as np
+
+from approx_centrality import approximate_closeness
+from centrality_metrics import read_network, positive_int
+from rankings import rank
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+OUTPUT_FILE = os.path.join('data', 'closeness_accuracy.csv')
+SAMPLES = '16,64,256,1024'
+
+HEADER = ('network', 'vertices', 'edges', 'samples', 'exact_seconds',
+          'approximate_seconds', 'mean_abs_error', 'max_abs_error',
+          'mean_stderr', 'rank_correlation')
+
+
+def get_args():
+    description=('Compare the approximate closeness with the exact one for '
+                 'different numbers of sampled sources')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('networks', metavar='<network>', nargs='+',
+                        help='Input file (or snapshot date, with --store)')
+    parser.add_argument('--store',
+                        help='Read the networks from a snapshot store (see '
+                             'snapshot_store.py)')
+    parser.add_argument('--directed', action='store_true',
+                        help='The input networks are directed')
+    parser.add_argument('--closeness-mode', choices=['IN', 'OUT', 'ALL'],
+                        default='ALL',
+                        help='As in centrality_metrics.py [default: ALL]')
+    parser.add_argument('--harmonic-closeness', action='store_true',
+                        help='Compare the harmonic centrality instead of '
+                             'closeness')
+    parser.add_argument('--samples', default=SAMPLES,
+                        help='Comma-separated numbers of sampled sources '
+                             '[default: {}]'.format(SAMPLES))
+    parser.add_argument('--jobs', type=positive_int, default=1,
+                        help='Number of worker processes [default: 1]')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random sampling [default: 0]')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='Output file [default: {}]'.format(OUTPUT_FILE))
+
+    args = parser.parse_args()
+    args.samples = [int(samples) for samples in args.samples.split(',')]
+    return args
+
+
+# Spearman correlation of the rankings of two vectors, ignoring the NaN
+# values of either of them
+def rank_correlation(exact, estimate):
+    valid = ~(np.isnan(exact) | np.isnan(estimate))
+    if valid.sum() < 2:
+        return np.nan
+
+    exact_ranks = rank(exact[valid], method='fractional')
+    estimate_ranks = rank(estimate[valid], method='fractional')
+    if exact_ranks.std() == 0 or estimate_ranks.std() == 0:
+        return np.nan
+
+    return float(np.corrcoef(exact_ranks, estimate_ranks)[0, 1])
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    with open(args.output, 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(HEADER)
+
+        for network in args.networks:
+            g = read_network(network, args.directed, store=args.store)
+            logger.info('Network {}: {} nodes and {} edges'
+                        .format(network, g.vcount(), g.ecount()))
+
+            start = time.time()
+            if args.harmonic_closeness:
+                exact = g.harmonic_centrality(mode=args.closeness_mode)
+            else:
+                exact = g.closeness(mode=args.closeness_mode)
+            exact = np.array(exact, dtype=float)
+            exact_seconds = time.time() - start
+
+            for samples in args.samples:
+                start = time.time()
+                estimate, stderr = approximate_closeness(
+                    g, samples, mode=args.closeness_mode,
+                    harmonic=args.harmonic_closeness, jobs=args.jobs,
+                    seed=args.seed)
+                approximate_seconds = time.time() - start
+
+                abs_error = np.abs(estimate - exact)
+                writer.writerow((network, g.vcount(), g.ecount(), samples,
+                                 '{:.3f}'.format(exact_seconds),
+                                 '{:.3f}'.format(approximate_seconds),
+                                 np.nanmean(abs_error), np.nanmax(abs_error),
+                                 np.nanmean(stderr),
+                                 rank_correlation(exact, estimate)))
+                logger.info('{} samples: mean absolute error {}'
+                            .format(samples, np.nanmean(abs_error)))
+
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+"""
+usage: cluster_index.py [-h] [--index INDEX] {build,page,cluster} ...
+
+Build and query an index of the evolved clusters of each page
+
+commands:
+  build [--matrix MATRIX] [--vertices VERTICES] [--shard-size SHARD_SIZE]
+                        Build the index from the membership matrix written
+                        by louvain_clusters.py (--output-format matrix)
+                        [default: data/nodes-evolution.npy and
+                        data/vertex.json]
+  page <page> [--start-date START_DATE] [--end-date END_DATE] [--members]
+                        The evolved cluster of the page at each date in the
+                        range and, with --members, the other pages in it
+  cluster <date> <cluster>
+                        The pages in an evolved cluster at a date
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --index INDEX         Directory of the index [default: data/cluster-index]
+
+The index is a directory with:
+  * names.bin, names.idx.npy, names.vids.npy: the UTF-8 encoded names of the
+    pages sorted (concatenated together), the offset of each name in the blob
+    and the global vertex id of each name, to find a page by binary search;
+  * vertex_offsets.npy, vertex_dates.npy, vertex_clusters.npy: for each
+    page (by global id), the indices of the dates it is in and its evolved
+    cluster at each of them, sorted by date;
+  * date_offsets.npy, date_clusters.npy, cluster_offsets.npy, members.npy:
+    for each date, the evolved clusters at that date (sorted) and the
+    global ids of the members of each cluster (sorted);
+  * dates.json: the dates.
+All the arrays are memory-mapped, so a query only reads the parts of the
+index it needs.
+
+A query for a page, a date or a cluster that is not in the index prints
+nothing and exits with status 1.
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import argparse
+import logging
+import numpy as np
+
+from membership_matrix import (MATRIX_FILE, VERTEX_FILE, SHARD_SIZE,
+                               load_matrix, load_vertices)
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+INDEX_DIR = os.path.join('data', 'cluster-index')
+
+NAMES_FILE = 'names.bin'
+NAMES_IDX_FILE = 'names.idx.npy'
+NAMES_VIDS_FILE = 'names.vids.npy'
+VERTEX_OFFSETS_FILE = 'vertex_offsets.npy'
+VERTEX_DATES_FILE = 'vertex_dates.npy'
+VERTEX_CLUSTERS_FILE = 'vertex_clusters.npy'
+DATE_OFFSETS_FILE = 'date_offsets.npy'
+DATE_CLUSTERS_FILE = 'date_clusters.npy'
+CLUSTER_OFFSETS_FILE = 'cluster_offsets.npy'
+MEMBERS_FILE = 'members.npy'
+DATES_FILE = 'dates.json'
+
+
+def get_args():
+    description=('Build and query an index of the evolved clusters of each '
+                 'page')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--index', default=INDEX_DIR,
+                        help='Directory of the index [default: {}]'
+                             .format(INDEX_DIR))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    build_parser = subparsers.add_parser('build',
+                                         help='Build the index from the '
+                                              'membership matrix')
+    build_parser.add_argument('--matrix', default=MATRIX_FILE,
+                              help='The membership matrix written by '
+                                   'louvain_clusters.py [default: {}]'
+                                   .format(MATRIX_FILE))
+    build_parser.add_argument('--vertices', default=VERTEX_FILE,
+                              help='The global index of vertices '
+                                   '[default: {}]'.format(VERTEX_FILE))
+    build_parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                              help='Number of rows of the matrix read at '
+                                   'once [default: {}]'.format(SHARD_SIZE))
+
+    page_parser = subparsers.add_parser('page',
+                                        help='The evolved cluster of a page '
+                                             'at each date')
+    page_parser.add_argument('page', metavar='<page>')
+    page_parser.add_argument('--start-date',
+                             help='First date (YYYY-MM-DD)')
+    page_parser.add_argument('--end-date',
+                             help='Last date (YYYY-MM-DD)')
+    page_parser.add_argument('--members', action='store_true',
+                             help='Also list the other pages in the cluster')
+
+    cluster_parser = subparsers.add_parser('cluster',
+                                           help='The pages in an evolved '
+                                                'cluster at a date')
+    cluster_parser.add_argument('date', metavar='<date>')
+    cluster_parser.add_argument('cluster', metavar='<cluster>', type=int)
+
+    args = parser.parse_args()
+    return args
+
+
+def write_names(index_path, vertices):
+    encoded = [vname.encode('utf-8') for vname in vertices]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+
+    names_idx = np.zeros(len(encoded)+1, dtype=np.int64)
+    np.cumsum([len(encoded[vid]) for vid in order], out=names_idx[1:])
+    with open(os.path.join(index_path, NAMES_FILE), 'wb') as namesfile:
+        namesfile.write(b''.join(encoded[vid] for vid in order))
+    np.save(os.path.join(index_path, NAMES_IDX_FILE), names_idx)
+    np.save(os.path.join(index_path, NAMES_VIDS_FILE),
+            np.array(order, dtype=np.int32))
+
+
+def build_index(matrix_path, vertex_path, index_path, shard_size=SHARD_SIZE):
+    matrix, dates = load_matrix(matrix_path)
+    vertices = load_vertices(vertex_path)
+    nvertices, ndates = matrix.shape
+    logger.info('Indexing matrix with {} nodes and {} dates'
+                .format(nvertices, ndates))
+
+    os.makedirs(index_path, exist_ok=True)
+    write_names(index_path, vertices)
+    with open(os.path.join(index_path, DATES_FILE), 'w') as datesfile:
+        json.dump(list(dates), datesfile)
+
+    # a single pass over shards of rows of the matrix: the page, date and
+    # cluster of each cell, sorted by page and date
+    vids = [np.zeros(0, dtype=np.int32)]
+    date_ids = [np.zeros(0, dtype=np.int32)]
+    clusters = [np.zeros(0, dtype=np.int32)]
+    for start in range(0, nvertices, shard_size):
+        shard = np.asarray(matrix[start:start+shard_size])
+        rows, cols = np.nonzero(shard >= 0)
+        vids.append((start + rows).astype(np.int32))
+        date_ids.append(cols.astype(np.int32))
+        clusters.append(shard[rows, cols].astype(np.int32))
+    vids = np.concatenate(vids)
+    date_ids = np.concatenate(date_ids)
+    clusters = np.concatenate(clusters)
+
+    # page -> (date, cluster)
+    vertex_offsets = np.zeros(nvertices+1, dtype=np.int64)
+    np.cumsum(np.bincount(vids, minlength=nvertices), out=vertex_offsets[1:])
+    np.save(os.path.join(index_path, VERTEX_OFFSETS_FILE), vertex_offsets)
+    np.save(os.path.join(index_path, VERTEX_DATES_FILE), date_ids)
+    np.save(os.path.join(index_path, VERTEX_CLUSTERS_FILE), clusters)
+
+    # (date, cluster) -> members, with the cells sorted once by date and
+    # cluster. The sort is stable, so the members of each cluster stay
+    # sorted.
+    nclusters = int(clusters.max()) + 1 if len(clusters) else 1
+    keys = date_ids.astype(np.int64)*nclusters + clusters
+    order = np.argsort(keys, kind='stable')
+    np.save(os.path.join(index_path, MEMBERS_FILE), vids[order])
+
+    keys, counts = np.unique(keys[order], return_counts=True)
+    date_offsets = np.zeros(ndates+1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // nclusters, minlength=ndates),
+              out=date_offsets[1:])
+    cluster_offsets = np.zeros(len(keys)+1, dtype=np.int64)
+    np.cumsum(counts, out=cluster_offsets[1:])
+
+    np.save(os.path.join(index_path, DATE_OFFSETS_FILE), date_offsets)
+    np.save(os.path.join(index_path, DATE_CLUSTERS_FILE),
+            (keys % nclusters).astype(np.int32))
+    np.save(os.path.join(index_path, CLUSTER_OFFSETS_FILE), cluster_offsets)
+
+    logger.info('Index written to {}'.format(index_path))
+
+
+class ClusterIndex(object):
+    """Read-only access to an index written by build_index()."""
+
+    def __init__(self, index_path):
+        self.path = index_path
+
+        with open(os.path.join(index_path, DATES_FILE), 'r') as datesfile:
+            self.dates = json.load(datesfile)
+        self._date_index = dict((date, i)
+                                for i, date in enumerate(self.dates))
+
+        # numpy can not memory-map an empty file
+        names_path = os.path.join(index_path, NAMES_FILE)
+        if os.path.getsize(names_path) > 0:
+            self._names = np.memmap(names_path, dtype=np.uint8, mode='r')
+        else:
+            self._names = np.zeros(0, dtype=np.uint8)
+        self._names_idx = self._load(NAMES_IDX_FILE)
+        self._names_vids = self._load(NAMES_VIDS_FILE)
+        self._vertex_offsets = self._load(VERTEX_OFFSETS_FILE)
+        self._vertex_dates = self._load(VERTEX_DATES_FILE)
+        self._vertex_clusters = self._load(VERTEX_CLUSTERS_FILE)
+        self._date_offsets = self._load(DATE_OFFSETS_FILE)
+        self._date_clusters = self._load(DATE_CLUSTERS_FILE)
+        self._cluster_offsets = self._load(CLUSTER_OFFSETS_FILE)
+        self._members = self._load(MEMBERS_FILE)
+
+        # position of each global id in the sorted names
+        self._name_pos = None
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode='r')
+
+    def _sorted_name(self, pos):
+        start, end = self._names_idx[pos], self._names_idx[pos+1]
+        return self._names[start:end].tobytes()
+
+    def vcount(self):
+        return len(self._names_vids)
+
+    # global id of a page, with a binary search on the sorted names
+    def vid(self, page):
+        target = page.encode('utf-8')
+
+        lo, hi = 0, self.vcount()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sorted_name(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.vcount() and self._sorted_name(lo) == target:
+            return int(self._names_vids[lo])
+
+        raise KeyError(page)
+
+    def __contains__(self, page):
+        try:
+            self.vid(page)
+        except KeyError:
+            return False
+        return True
+
+    def names(self, vids):
+        if self._name_pos is None:
+            self._name_pos = np.empty(self.vcount(), dtype=np.int64)
+            self._name_pos[self._names_vids] = np.arange(self.vcount())
+
+        return [self._sorted_name(pos).decode('utf-8')
+                for pos in self._name_pos[np.asarray(vids, dtype=np.int64)]]
+
+    # indices of the dates between start and end (inclusive)
+    def date_slice(self, start=None, end=None):
+        first = 0 if start is None else bisect.bisect_left(self.dates, start)
+        last = (len(self.dates) if end is None
+                else bisect.bisect_right(self.dates, end))
+        return first, last
+
+    def page_clusters(self, page, start=None, end=None):
+        """The (date, evolved cluster) pairs of a page between start and end.
+        """
+        vid = self.vid(page)
+        lo, hi = self._vertex_offsets[vid], self._vertex_offsets[vid+1]
+        date_ids = np.asarray(self._vertex_dates[lo:hi])
+        clusters = np.asarray(self._vertex_clusters[lo:hi])
+
+        first, last = self.date_slice(start, end)
+        mask = (date_ids >= first) & (date_ids < last)
+
+        return [(self.dates[date_id], cluster)
+                for date_id, cluster in zip(date_ids[mask].tolist(),
+                                            clusters[mask].tolist())]
+
+    def members(self, date, cluster):
+        """The global ids (sorted) of the pages in a cluster at a date."""
+        col = self._date_index[date]
+        lo, hi = self._date_offsets[col], self._date_offsets[col+1]
+        clusters = self._date_clusters[lo:hi]
+
+        pos = int(np.searchsorted(clusters, cluster))
+        if pos == len(clusters) or clusters[pos] != cluster:
+            return np.zeros(0, dtype=np.int32)
+
+        start = self._cluster_offsets[lo+pos]
+        end = self._cluster_offsets[lo+pos+1]
+        return np.asarray(self._members[start:end])
+
+
+# Returns the exit status: 1 if the page, date or cluster of the query is not
+# in the index
+def main():
+    args = get_args()
+
+    if args.command == 'build':
+        logger.info('Start')
+        build_index(args.matrix, args.vertices, args.index,
+                    shard_size=args.shard_size)
+        logger.info('All done!')
+        return 0
+
+    start = time.time()
+    index = ClusterIndex(args.index)
+
+    if args.command == 'page' and args.page not in index:
+        logger.error('Unknown page: {}'.format(args.page))
+        return 1
+    if args.command == 'cluster' and args.date not in index.dates:
+        logger.error('Unknown date: {}'.format(args.date))
+        return 1
+
+    if args.command == 'page':
+        for date, cluster in index.page_clusters(args.page, args.start_date,
+                                                 args.end_date):
+            if args.members:
+                others = [vname
+                          for vname in index.names(index.members(date,
+                                                                 cluster))
+                          if vname != args.page]
+                print('\t'.join([date, str(cluster)] + others))
+            else:
+                print('{}\t{}'.format(date, cluster))
+
+    elif args.command == 'cluster':
+        members = index.members(args.date, args.cluster)
+        if len(members) == 0:
+            logger.error('Unknown cluster {} at {}'
+                         .format(args.cluster, args.date))
+            return 1
+        for vname in index.names(members):
+            print(vname)
+
+    logger.debug('Query answered in {:.1f}ms'
+                 .format(1000*(time.time() - start)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
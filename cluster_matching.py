@@ -0,0 +1,224 @@
+"""
+Match the clusters of two consecutive snapshots.
+
+The clusters of a snapshot are given as a membership vector over the
+vertices of the snapshot, identified by their global ids (sorted). The
+overlap of every pair of clusters is calculated at once as a sparse
+contingency table, so that only the pairs of clusters that share at least one
+vertex are ever considered.
+
+The clusters are matched one to one, minimizing the total Jaccard distance,
+with one of the methods in MATCHING:
+  * hungarian: linear_sum_assignment on the dense n x m distance matrix.
+    Time is cubic and memory quadratic in the number of clusters, and
+    clusters with no vertex in common can be matched with each other
+    (distance 1) when there is nothing better for them;
+  * sparse: the same minimum on the sparse overlap graph, solved as a
+    minimum weight full matching of the graph extended with one "unmatched"
+    vertex per cluster, so clusters without overlap are never matched;
+  * components: linear_sum_assignment on each connected component of the
+    overlap graph, which gives the same matched pairs as hungarian among the
+    overlapping clusters (up to ties) with the cost of the largest
+    component only;
+  * greedy: pairs are taken in order of decreasing similarity when both
+    clusters are still free, in O(k log k) for k overlapping pairs. Not
+    optimal, but close when most clusters have one large overlap.
+"""
+
+import numpy as np
+
+from scipy import optimize
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+def cluster_count(membership):
+    if len(membership) == 0:
+        return 0
+    return int(membership.max()) + 1
+
+
+# positions of the vertices that appear in both snapshots, vids1 and vids2
+# must be sorted and without duplicates
+def common_vertices(vids1, vids2):
+    if len(vids1) == 0 or len(vids2) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    pos = np.searchsorted(vids2, vids1)
+    pos[pos == len(vids2)] = 0
+    mask = vids2[pos] == vids1
+
+    return np.nonzero(mask)[0], pos[mask]
+
+
+# table[i, j] is the number of vertices in cluster i at t and in cluster j
+# at t+1
+def contingency_table(vids1, membership1, vids2, membership2):
+    idx1, idx2 = common_vertices(vids1, vids2)
+
+    shape = (cluster_count(membership1), cluster_count(membership2))
+    table = sparse.coo_matrix((np.ones(len(idx1), dtype=np.int64),
+                               (membership1[idx1], membership2[idx2])),
+                              shape=shape)
+    table.sum_duplicates()
+
+    return table
+
+
+# Jaccard similarity of all the pairs of clusters with a non-empty
+# intersection, the other pairs have similarity 0 (i.e. distance 1).
+def jaccard_similarity(table, sizes1, sizes2):
+    intersection = table.data.astype(float)
+    union = sizes1[table.row] + sizes2[table.col] - intersection
+
+    return sparse.coo_matrix((intersection/union, (table.row, table.col)),
+                             shape=table.shape)
+
+
+# the pairs (row, col) of a matching as the dicts returned by
+# match_clusters(), sorted by cluster at t
+def matching_dicts(rows, cols, distance):
+    order = np.argsort(rows, kind='mergesort')
+    rows, cols, distance = rows[order], cols[order], distance[order]
+
+    c1_to_c2 = dict(zip(rows.tolist(), cols.tolist()))
+    sim_c1c2 = dict(zip(rows.tolist(), distance.tolist()))
+
+    return c1_to_c2, sim_c1c2
+
+
+def match_hungarian(similarity):
+    # Jaccard distance:
+    # distance = 1 - (Jaccard similarity)
+    clmatrix = 1.0 - similarity.toarray()
+
+    res = optimize.linear_sum_assignment(clmatrix)
+
+    return res[0], res[1], clmatrix[res[0], res[1]]
+
+
+# Each cluster at t (rows) and at t+1 (columns) can be left unmatched by
+# matching it with its own dummy vertex, at cost 1. Overlapping pairs cost
+# 2 - similarity, plus a negligible cost for the pair of dummy vertices
+# that the matched pair leaves free, so that a pair is matched whenever its
+# similarity is positive. The extended graph always has a full matching.
+def match_sparse(similarity):
+    n, m = similarity.shape
+    npairs = similarity.nnz
+    epsilon = 1e-9
+
+    rows = np.concatenate((similarity.row, np.arange(n),
+                           n + np.arange(m), n + similarity.col))
+    cols = np.concatenate((similarity.col, m + np.arange(n),
+                           np.arange(m), m + similarity.row))
+    costs = np.concatenate((2.0 - similarity.data, np.ones(n + m),
+                            np.full(npairs, epsilon)))
+
+    graph = sparse.csr_matrix((costs, (rows, cols)), shape=(n+m, m+n))
+    rows, cols = csgraph.min_weight_full_bipartite_matching(graph)
+
+    matched = (rows < n) & (cols < m)
+    rows, cols = rows[matched], cols[matched]
+
+    # similarity of the matched pairs
+    keys = similarity.row.astype(np.int64)*m + similarity.col
+    order = np.argsort(keys)
+    pos = order[np.searchsorted(keys, rows.astype(np.int64)*m + cols,
+                                sorter=order)]
+
+    return rows, cols, 1.0 - similarity.data[pos]
+
+
+# The overlap graph has the clusters at t and at t+1 as vertices and an edge
+# for each overlapping pair. The assignment is solved on each of its
+# connected components, pairs with no overlap are dropped.
+def match_components(similarity):
+    n, m = similarity.shape
+    if similarity.nnz == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+
+    adjacency = sparse.coo_matrix(
+        (np.ones(similarity.nnz), (similarity.row, n + similarity.col)),
+        shape=(n+m, n+m))
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+
+    # components with a single pair are matched directly
+    pair_labels = labels[similarity.row]
+    npairs = np.bincount(pair_labels)
+    single = npairs[pair_labels] == 1
+
+    rows = [similarity.row[single]]
+    cols = [similarity.col[single]]
+    distance = [1.0 - similarity.data[single]]
+
+    multiple = np.nonzero(~single)[0]
+    order = multiple[np.argsort(pair_labels[multiple], kind='mergesort')]
+    bounds = np.nonzero(np.diff(pair_labels[order]))[0] + 1
+    for component in np.split(order, bounds):
+        if len(component) == 0:
+            continue
+
+        crows, row_idx = np.unique(similarity.row[component],
+                                   return_inverse=True)
+        ccols, col_idx = np.unique(similarity.col[component],
+                                   return_inverse=True)
+
+        clmatrix = np.ones((len(crows), len(ccols)))
+        clmatrix[row_idx, col_idx] = 1.0 - similarity.data[component]
+
+        res = optimize.linear_sum_assignment(clmatrix)
+        cldistance = clmatrix[res[0], res[1]]
+        overlap = cldistance < 1.0
+
+        rows.append(crows[res[0][overlap]])
+        cols.append(ccols[res[1][overlap]])
+        distance.append(cldistance[overlap])
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(distance)
+
+
+# Pairs in order of decreasing similarity (ties by cluster at t, then at
+# t+1), each one is taken if neither of its clusters is already matched.
+def match_greedy(similarity):
+    n, m = similarity.shape
+    order = np.lexsort((similarity.col, similarity.row, -similarity.data))
+
+    free1 = [True]*n
+    free2 = [True]*m
+    matched = []
+    for idx, c1, c2 in zip(order.tolist(), similarity.row[order].tolist(),
+                           similarity.col[order].tolist()):
+        if free1[c1] and free2[c2]:
+            free1[c1] = free2[c2] = False
+            matched.append(idx)
+
+    matched = np.array(matched, dtype=np.int64)
+    return (similarity.row[matched], similarity.col[matched],
+            1.0 - similarity.data[matched])
+
+
+MATCHING = {'hungarian': match_hungarian,
+            'sparse': match_sparse,
+            'components': match_components,
+            'greedy': match_greedy,
+            }
+
+
+# Match the clusters at t with the clusters at t+1. Returns the cluster at
+# t+1 matched with each matched cluster at t and the Jaccard distance of
+# each matched pair (indexed by the cluster at t).
+def match_clusters(vids1, membership1, vids2, membership2,
+                   method='hungarian'):
+    table = contingency_table(vids1, membership1, vids2, membership2)
+
+    n, m = table.shape
+    sizes1 = np.bincount(membership1, minlength=n)
+    sizes2 = np.bincount(membership2, minlength=m)
+
+    similarity = jaccard_similarity(table, sizes1, sizes2)
+
+    rows, cols, distance = MATCHING[method](similarity)
+
+    return matching_dicts(rows, cols, distance)
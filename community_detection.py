@@ -0,0 +1,186 @@
+"""
+Community detection backends shared by louvain_clusters.py and
+centrality_metrics.py.
+
+The backends are:
+  * multilevel: the Louvain method of igraph (Graph.community_multilevel).
+    igraph draws its random numbers from the random module, which is seeded
+    before the call;
+  * louvain: the Louvain method of the louvain package, iterations is the
+    maximum number of passes of its optimiser, which stops as soon as a pass
+    does not improve the partition (a negative value has no maximum)
+    [default: 1];
+  * leiden: the Leiden algorithm of the leidenalg package, iterations is the
+    number of iterations of the algorithm, a negative value iterates until
+    the partition is stable [default: 2].
+
+All of them optimise modularity (weighted if edge weights are given), with
+resolution != 1 the louvain and leiden backends optimise the configuration
+model with that resolution instead.
+The louvain and leiden backends can start from an initial membership.
+Their packages are imported with this module, so that the first partition
+is not slowed down by the import. A backend whose package is not installed
+is left out of AVAILABLE_BACKENDS and raises an error when it is used.
+"""
+
+import time
+import random
+
+try:
+    import louvain
+except ImportError:
+    louvain = None
+
+try:
+    import leidenalg
+except ImportError:
+    leidenalg = None
+
+
+BACKENDS = ('multilevel', 'louvain', 'leiden')
+
+# backends whose package is installed
+AVAILABLE_BACKENDS = tuple(backend for backend, package in
+                           (('multilevel', True), ('louvain', louvain),
+                            ('leiden', leidenalg))
+                           if package is not None)
+
+# backends that can start from an initial membership
+WARM_START_BACKENDS = ('louvain', 'leiden')
+
+# default number of iterations of each backend
+ITERATIONS = {'multilevel': None,
+              'louvain': 1,
+              'leiden': 2,
+              }
+
+
+def add_community_args(parser, default_backend):
+    parser.add_argument('--community-backend', default=default_backend,
+                        choices=BACKENDS,
+                        help='Community detection algorithm (see '
+                             'community_detection.py) '
+                             '[default: {}]'.format(default_backend))
+    parser.add_argument('--resolution', type=float, default=1.0,
+                        help='Resolution of the community detection, higher '
+                             'values give more and smaller communities '
+                             '[default: 1.0]')
+    parser.add_argument('--community-iterations', type=int,
+                        help='Number of iterations of the community '
+                             'detection, see community_detection.py '
+                             '[default: depends on the backend]')
+
+
+def check_community_args(parser, args):
+    if args.community_backend not in AVAILABLE_BACKENDS:
+        parser.error('the package of the {} community backend is not '
+                     'installed'.format(args.community_backend))
+
+
+def community_params(args):
+    return {'backend': args.community_backend,
+            'resolution': args.resolution,
+            'iterations': args.community_iterations,
+            }
+
+
+def _multilevel(G, resolution, iterations, seed, initial_membership,
+                weights):
+    if initial_membership is not None:
+        raise ValueError('the multilevel backend can not start from an '
+                         'initial membership')
+
+    if seed is not None:
+        random.seed(seed)
+
+    # older versions of igraph have no resolution parameter
+    kwargs = dict()
+    if resolution != 1.0:
+        kwargs['resolution'] = resolution
+
+    return G.community_multilevel(weights=weights, **kwargs).membership
+
+
+def _louvain(G, resolution, iterations, seed, initial_membership, weights):
+    if resolution == 1.0:
+        partition = louvain.ModularityVertexPartition(
+            G, initial_membership=initial_membership, weights=weights)
+    else:
+        partition = louvain.RBConfigurationVertexPartition(
+            G, initial_membership=initial_membership, weights=weights,
+            resolution_parameter=resolution)
+
+    # the same as louvain.find_partition() with a single pass
+    optimiser = louvain.Optimiser()
+    if seed is not None:
+        optimiser.set_rng_seed(seed)
+
+    passes = 0
+    while iterations < 0 or passes < iterations:
+        passes += 1
+        if optimiser.optimise_partition(partition) <= 0:
+            break
+
+    return partition.membership
+
+
+def _leiden(G, resolution, iterations, seed, initial_membership, weights):
+    kwargs = dict()
+    if resolution == 1.0:
+        partition_type = leidenalg.ModularityVertexPartition
+    else:
+        partition_type = leidenalg.RBConfigurationVertexPartition
+        kwargs['resolution_parameter'] = resolution
+
+    partition = leidenalg.find_partition(
+        G, partition_type, initial_membership=initial_membership,
+        weights=weights, n_iterations=iterations, seed=seed, **kwargs)
+
+    return partition.membership
+
+
+_BACKEND_FUNCTIONS = {'multilevel': _multilevel,
+                      'louvain': _louvain,
+                      'leiden': _leiden,
+                      }
+
+
+def find_partition(G, backend='louvain', resolution=1.0, iterations=None,
+                   seed=None, initial_membership=None, weights=None):
+    """Membership (list of community ids) of the vertices of the undirected
+    graph G, found with one of the BACKENDS. weights are the weights of the
+    edges (a list, or the name of an edge attribute).
+    """
+    if backend not in _BACKEND_FUNCTIONS:
+        raise ValueError('unknown community detection backend: {}'
+                         .format(backend))
+    if backend not in AVAILABLE_BACKENDS:
+        raise ImportError('the package of the {} community detection backend '
+                          'is not installed'.format(backend))
+
+    if iterations is None:
+        iterations = ITERATIONS[backend]
+
+    return _BACKEND_FUNCTIONS[backend](G, resolution, iterations, seed,
+                                       initial_membership, weights)
+
+
+def compare_backends(G, backends=BACKENDS, resolution=1.0, iterations=None,
+                     seed=None):
+    """Run each backend on G, returns (backend, seconds, modularity,
+    communities) for each one. The modularity is computed at the given
+    resolution, the objective of the backends.
+    """
+    report = []
+    for backend in backends:
+        start = time.perf_counter()
+        membership = find_partition(G, backend=backend,
+                                    resolution=resolution,
+                                    iterations=iterations, seed=seed)
+        elapsed = time.perf_counter() - start
+
+        report.append((backend, elapsed,
+                       G.modularity(membership, resolution=resolution),
+                       max(membership) + 1 if membership else 0))
+
+    return report
@@ -0,0 +1,81 @@
+"""
+Consensus of several partitions of the same graph.
+
+The community detection backends are randomized, so partitions of the same
+snapshot with different seeds differ, mostly for the vertices that lie
+between clusters. The consensus of K partitions is found on the
+co-assignment graph: the graph of the snapshot with each edge weighted by
+the fraction of the partitions that put its two vertices in the same
+cluster. Edges with a weight below a threshold are dropped and the weighted
+graph is partitioned again, so that vertices that are usually together end
+up in the same consensus cluster (Lancichinetti and Fortunato, "Consensus
+clustering in complex networks", 2012).
+
+Only the pairs of vertices joined by an edge are considered, never the full
+n x n co-assignment matrix, and the weights of all the edges are counted at
+once, one partition at a time: O(K E) time and O(E) memory.
+
+The stability of a vertex is the mean agreement of its edges with the
+consensus: an edge inside a consensus cluster agrees with the partitions
+that put its vertices together, an edge between two consensus clusters with
+the ones that kept them apart. A vertex has stability 1 when all the
+partitions agree with the consensus around it (vertices without edges have
+stability 1).
+"""
+
+import numpy as np
+import igraph as ig
+
+from community_detection import find_partition
+
+
+# co-assignment edges with a lower weight are dropped before partitioning
+THRESHOLD = 0.5
+
+
+def coassignment(edges, memberships):
+    """Fraction of the memberships in which the two ends of each edge (an
+    (n, 2) array of vertex ids) are in the same cluster.
+    """
+    counts = np.zeros(len(edges), dtype=np.int32)
+    for membership in memberships:
+        membership = np.asarray(membership)
+        counts += membership[edges[:, 0]] == membership[edges[:, 1]]
+
+    return counts / len(memberships)
+
+
+def node_stability(vcount, edges, weights, membership):
+    """Stability of each vertex: the mean agreement of its edges with the
+    consensus membership, given the co-assignment weights of the edges.
+    """
+    same = membership[edges[:, 0]] == membership[edges[:, 1]]
+    agreement = np.where(same, weights, 1.0 - weights)
+
+    total = (np.bincount(edges[:, 0], weights=agreement, minlength=vcount) +
+             np.bincount(edges[:, 1], weights=agreement, minlength=vcount))
+    degree = np.bincount(edges.ravel(), minlength=vcount)
+
+    stability = np.ones(vcount)
+    np.divide(total, degree, out=stability, where=degree > 0)
+
+    return stability
+
+
+def consensus_partition(vcount, edges, memberships, threshold=THRESHOLD,
+                        seed=None, **community):
+    """Consensus of the memberships of the graph with vcount vertices and the
+    given edges, partitioned with find_partition(**community). Returns the
+    consensus membership and the stability of each vertex.
+    """
+    edges = np.asarray(edges).reshape(-1, 2)
+    weights = coassignment(edges, memberships)
+
+    keep = weights >= threshold
+    G = ig.Graph(n=vcount, edges=edges[keep].tolist())
+    membership = np.array(find_partition(G, seed=seed,
+                                         weights=weights[keep].tolist(),
+                                         **community),
+                          dtype=np.int32)
+
+    return membership, node_stability(vcount, edges, weights, membership)
@@ -0,0 +1,239 @@
+"""
+Per-stage measures of a run of the scripts.
+
+Each stage of a script (e.g. loading the snapshots, partitioning each of
+them, writing the outputs) is run inside Instrumentation.stage(), which
+records its wall time, its CPU time (of this process and of the worker
+processes that ended during the stage), the peak RSS of this process and of
+its workers so far and the counts of the items it processed (snapshots,
+vertices, edges, clusters, files, ...). Stages can be nested and can refer
+to a snapshot, work done in worker processes is measured with Timed and
+added with Instrumentation.record().
+
+The measures are written as a run report, in JSON or (one row per stage) in
+CSV according to the extension of the report file. Stages can be run under
+cProfile, the profile of each one is written as a .prof file that can be
+read with the pstats module.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+import resource
+import contextlib
+
+
+PROFILE_DIR = os.path.join('data', 'profiles')
+
+MEASURES = ('wall_seconds', 'cpu_seconds', 'peak_rss_mb',
+            'children_peak_rss_mb')
+
+
+# ru_maxrss is in KB on Linux
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+# CPU time of this process and of the child processes that have ended
+def cpu_seconds():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def add_instrumentation_args(parser):
+    parser.add_argument('--report',
+                        help='Write the time, memory and item counts of each '
+                             'stage to this file, as JSON or as CSV '
+                             '(according to its extension)')
+    parser.add_argument('--profile',
+                        help='Comma-separated stages to run under cProfile '
+                             '(or "all"), the profiles are written to '
+                             '{}'.format(PROFILE_DIR))
+
+
+class Stage(object):
+    """Measures and item counts of a stage."""
+
+    def __init__(self, name, snapshot=None):
+        self.name = name
+        self.snapshot = snapshot
+        self.measures = dict()
+        self.counts = dict()
+
+    def count(self, **counts):
+        for item, value in counts.items():
+            self.counts[item] = self.counts.get(item, 0) + int(value)
+
+    def as_dict(self):
+        stage = {'stage': self.name, 'snapshot': self.snapshot}
+        stage.update(self.measures)
+        stage['counts'] = self.counts
+        return stage
+
+
+class Timed(object):
+    """Call func and measure it, for work done in worker processes.
+
+    Timed(func)(task) returns the result of func(task) and its measures, to
+    be passed to Instrumentation.record().
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, task):
+        start_wall, start_cpu = time.time(), time.process_time()
+        result = self.func(task)
+
+        return result, {'wall_seconds': time.time() - start_wall,
+                        'cpu_seconds': time.process_time() - start_cpu,
+                        'peak_rss_mb': peak_rss_mb(),
+                        }
+
+
+class Instrumentation(object):
+    """Stages of a run of a script.
+
+    report is the path of the run report (nothing is written if it is None),
+    profile the names of the stages to run under cProfile ('all' for every
+    stage). Each finished stage is logged to logger, if given.
+    """
+
+    def __init__(self, script, report=None, profile=(), logger=None,
+                 profile_dir=PROFILE_DIR):
+        self.script = script
+        self.report = report
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.logger = logger
+        self.stages = []
+
+        self._start = time.time()
+        self._start_cpu = cpu_seconds()
+        self._profiling = False
+
+    @classmethod
+    def from_args(cls, script, args, logger=None):
+        """Instrumentation with the options of add_instrumentation_args()."""
+        profile = ()
+        if args.profile is not None:
+            profile = args.profile.split(',')
+
+        return cls(script, report=args.report, profile=profile,
+                   logger=logger)
+
+    def _profiled(self, name):
+        # cProfile can not profile nested stages
+        return (not self._profiling and
+                ('all' in self.profile or name in self.profile))
+
+    def _profile_path(self, stage):
+        parts = [self.script, stage.name]
+        if stage.snapshot is not None:
+            parts.append(str(stage.snapshot))
+
+        return os.path.join(self.profile_dir,
+                            '{}.prof'.format('.'.join(parts)))
+
+    def _log(self, stage):
+        if self.logger is None:
+            return
+
+        snapshot = ''
+        if stage.snapshot is not None:
+            snapshot = ' ({})'.format(stage.snapshot)
+        counts = ', '.join('{} {}'.format(value, item)
+                           for item, value in sorted(stage.counts.items()))
+
+        self.logger.debug('stage {}{}: {:.3f}s wall, {:.3f}s cpu, peak RSS '
+                          '{:.1f}MB{}'
+                          .format(stage.name, snapshot,
+                                  stage.measures.get('wall_seconds', 0.0),
+                                  stage.measures.get('cpu_seconds', 0.0),
+                                  stage.measures.get('peak_rss_mb', 0.0),
+                                  '; ' + counts if counts else ''))
+
+    @contextlib.contextmanager
+    def stage(self, name, snapshot=None, **counts):
+        """Measure the body of the with statement as a stage, the Stage is
+        returned so that more items can be counted.
+        """
+        stage = Stage(name, snapshot)
+        stage.count(**counts)
+
+        profiler = None
+        if self._profiled(name):
+            profiler = cProfile.Profile()
+            self._profiling = True
+
+        start_wall, start_cpu = time.time(), cpu_seconds()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(self._profile_path(stage))
+
+            stage.measures = {
+                'wall_seconds': time.time() - start_wall,
+                'cpu_seconds': cpu_seconds() - start_cpu,
+                'peak_rss_mb': peak_rss_mb(),
+                'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+                }
+            self.stages.append(stage)
+            self._log(stage)
+
+    def record(self, name, snapshot=None, measures=None, **counts):
+        """Add a stage measured elsewhere, e.g. with Timed in a worker."""
+        stage = Stage(name, snapshot)
+        stage.measures = dict(measures or {})
+        stage.count(**counts)
+        self.stages.append(stage)
+        self._log(stage)
+
+        return stage
+
+    def as_dict(self):
+        return {'script': self.script,
+                'argv': sys.argv,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                         time.localtime(self._start)),
+                'wall_seconds': time.time() - self._start,
+                'cpu_seconds': cpu_seconds() - self._start_cpu,
+                'peak_rss_mb': peak_rss_mb(),
+                'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+                'stages': [stage.as_dict() for stage in self.stages],
+                }
+
+    def write(self, path=None):
+        """Write the run report to path (by default the report given to the
+        constructor), as CSV if it ends with .csv and as JSON otherwise.
+        """
+        path = path or self.report
+        if path is None:
+            return
+
+        if os.path.splitext(path)[1].lower() == '.csv':
+            items = sorted(set(item for stage in self.stages
+                               for item in stage.counts))
+
+            with open(path, 'w+') as outfile:
+                writer = csv.writer(outfile, delimiter='\t')
+                writer.writerow(('stage', 'snapshot') + MEASURES +
+                                tuple(items))
+                for stage in self.stages:
+                    writer.writerow(
+                        (stage.name, stage.snapshot or '') +
+                        tuple(stage.measures.get(measure, '')
+                              for measure in MEASURES) +
+                        tuple(stage.counts.get(item, '') for item in items))
+        else:
+            with open(path, 'w+') as outfile:
+                json.dump(self.as_dict(), outfile, indent=2)
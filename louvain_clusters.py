@@ -1,37 +1,155 @@
 #!/usr/bin/env python
 """
-usage: louvain_clusters.py [-h] <network>
+usage: louvain_clusters.py [-h] [--store STORE] [--start-date START_DATE]
+                           [--end-date END_DATE] [--jobs JOBS] [--seed SEED]
+                           [--output-format {files,matrix,both}]
+                           [--warm-start] [--compare-cold-start]
+                           [--streaming] [--incremental]
+                           [--matching {hungarian,sparse,components,greedy}]
+                           [--community-backend {multilevel,louvain,leiden}]
+                           [--resolution RESOLUTION]
+                           [--community-iterations COMMUNITY_ITERATIONS]
+                           [--compare-backends COMPARE_BACKENDS]
+                           [--consensus K]
+                           [--consensus-threshold CONSENSUS_THRESHOLD]
+                           [--report REPORT] [--profile PROFILE]
+                           [<network> [<network> ...]]
 
 Calculate Louvain clusters on a graph, given as an edge list
 
 positional arguments:
-  <network>   A file with the specification of the network as an edge list
+  <network>             A file with the specification of the network as an
+                        edge list
 
 optional arguments:
-  -h, --help  show this help message and exit
+  -h, --help            show this help message and exit
+  --store STORE         Read the snapshots from a snapshot store (see
+                        snapshot_store.py) instead of the edge lists
+  --start-date START_DATE
+                        First snapshot to read from the store (YYYY-MM-DD)
+  --end-date END_DATE   Last snapshot to read from the store (YYYY-MM-DD)
+  --jobs JOBS           Number of worker processes used to calculate the
+                        partitions [default: 1]
+  --seed SEED           Seed of the random number generator used by the
+                        community detection, the seed of each snapshot is
+                        derived from it and from the date of the snapshot
+                        [default: 0]
+  --output-format {files,matrix,both}
+                        Write the evolution of the clusters of each node as
+                        one file per node ('files'), as a single node x date
+                        matrix ('matrix', see membership_matrix.py) or both
+                        [default: files]
+  --warm-start          Start the partitioning of each snapshot from the
+                        partition of the previous one, time and modularity
+                        are written to data/warm_start.csv
+  --compare-cold-start  With --warm-start, also partition each snapshot from
+                        scratch and report time and modularity of both
+  --streaming           Process the snapshots one at a time in date order,
+                        writing the results of each snapshot to disk, so
+                        that memory is bounded by the largest snapshot
+                        (times --jobs)
+  --incremental         Append the given snapshots to the outputs of a
+                        previous run, instead of processing the whole series
+  --matching {hungarian,sparse,components,greedy}
+                        How the clusters of consecutive snapshots are
+                        matched (see cluster_matching.py), 'hungarian'
+                        needs a dense clusters x clusters matrix, the other
+                        methods scale with the number of overlapping pairs
+                        of clusters [default: hungarian]
+  --community-backend {multilevel,louvain,leiden}
+                        Community detection algorithm (see
+                        community_detection.py) [default: louvain]
+  --resolution RESOLUTION
+                        Resolution of the community detection, higher
+                        values give more and smaller communities
+                        [default: 1.0]
+  --community-iterations COMMUNITY_ITERATIONS
+                        Number of iterations of the community detection,
+                        see community_detection.py [default: depends on
+                        the backend]
+  --compare-backends COMPARE_BACKENDS
+                        Comma-separated community detection backends (or
+                        'all' the installed ones) to run on each snapshot,
+                        their time, modularity and number of clusters are
+                        written to data/community_backends.csv
+  --consensus K         Partition each snapshot K times with different
+                        seeds (in parallel with --jobs) and keep the
+                        consensus of the K partitions, the stability of
+                        each page is written to data/stability
+  --consensus-threshold CONSENSUS_THRESHOLD
+                        Links between pages that are in the same cluster in
+                        less than this fraction of the K partitions are
+                        ignored by the consensus [default: 0.5]
+  --report REPORT       Write the time, memory and item counts of each stage
+                        to this file, as JSON or as CSV (according to its
+                        extension)
+  --profile PROFILE     Comma-separated stages to run under cProfile (or
+                        "all"), the profiles are written to data/profiles
+
+Each run saves its state (global index of vertices, partition of the last
+snapshot, evolved clusters) in data/louvain_clusters.state.pkl. With
+--incremental the state is loaded, each new snapshot is partitioned, matched
+against the previous one and appended to the existing outputs. New pages are
+appended at the end of the global index of vertices, so after an incremental
+run the index is no longer sorted by name. Only the records of the new
+snapshots are appended: the JSON files are extended in place and the columns
+of the membership matrix are written one per snapshot (see
+membership_matrix.py). The snapshots to append must follow the last one
+month by month and must not be empty, they are all checked before anything
+is written.
+
+The stages of a run (see --report) are: load, global_index, partition (with
+a partition_snapshot stage for each snapshot), write_clusters, matching,
+write_matching, evolve, write_evolution, membership_matrix, write_matrix,
+write_node_files and save_state, with --compare-backends a compare_backends
+stage for each snapshot, with --consensus a consensus and a write_stability
+stage for each snapshot. With --streaming the snapshots go through the
+stages one at a time, with --incremental each one is an append_snapshot
+stage.
+
+The default community backend (louvain, one pass of the optimiser) gives the
+same partitions as before the backends were pluggable. --warm-start needs a
+backend that can start from a partition (louvain or leiden).
+
+With --consensus K, the K partitions of each snapshot use the seeds derived
+from --seed, --seed + 1, ..., --seed + K-1 (the first one is the partition
+of a run without --consensus) and their consensus replaces it in all the
+outputs (see consensus.py). The stability of the pages of each snapshot, the
+mean agreement of the K partitions with the consensus around each page, is
+written to data/stability/graph.<date>.stability.csv and its mean and median
+to data/consensus.csv.
 
 """
 
 import os
-import re
 import csv
 import json
+import zlib
+import time
 import argparse
 import logging
 import igraph as ig
-import louvain
-import copy
 import arrow
-from typing import Iterable, Iterator, Mapping, NamedTuple, Optional
+from typing import Iterable
 import itertools
 import numpy as np
 import pickle
+import tempfile
+import multiprocessing
 from collections import defaultdict
 
-# needs to import optimize explicitly
-# https://github.com/scipy/scipy/issues/4005
-import scipy
-from scipy import optimize
+from snapshot_store import SnapshotStore, snapshot_date, global_index
+from cluster_matching import (MATCHING, match_clusters, common_vertices,
+                              cluster_count)
+from membership_matrix import (MATRIX_FILE, NODES_DIR, save_matrix,
+                               create_matrix, append_column, dates_path,
+                               export_node_files, append_node_files)
+from instrumentation import Instrumentation, Timed, add_instrumentation_args
+from community_detection import (BACKENDS, AVAILABLE_BACKENDS,
+                                 WARM_START_BACKENDS, add_community_args,
+                                 check_community_args, community_params,
+                                 find_partition, compare_backends)
+from consensus import THRESHOLD, consensus_partition
 
 ########## logging
 # create logger with 'spam_application'
@@ -57,10 +175,16 @@ logger.addHandler(ch)
 ##########
 
 ##########
-Cluster = NamedTuple('Cluster', [
-    ('date', arrow.arrow.Arrow),
-    ('clusters', list),
-])
+VERTEX_FILE = os.path.join('data', 'vertex.json')
+STATE_FILE = os.path.join('data', 'louvain_clusters.state.pkl')
+WARM_START_FILE = os.path.join('data', 'warm_start.csv')
+BACKENDS_FILE = os.path.join('data', 'community_backends.csv')
+CONSENSUS_FILE = os.path.join('data', 'consensus.csv')
+STABILITY_DIR = os.path.join('data', 'stability')
+
+# clusters matched with a Jaccard distance below this threshold keep their
+# id in the stable evolution of the clusters
+STABLE_DISTANCE = 0.34
 ##########
 
 
@@ -68,19 +192,112 @@ def get_args():
     description=('Calculate Louvain clusters on a graph,'
                  ' given as an edge list')
     parser = argparse.ArgumentParser(description=description)
-    parser.add_argument('networks', metavar='<network>', nargs='+',
+    parser.add_argument('networks', metavar='<network>', nargs='*',
                         help='A file with the specification of the network '
                              'as an edge list')
+    parser.add_argument('--store',
+                        help='Read the snapshots from a snapshot store (see '
+                             'snapshot_store.py) instead of the edge lists')
+    parser.add_argument('--start-date',
+                        help='First snapshot to read from the store '
+                             '(YYYY-MM-DD)')
+    parser.add_argument('--end-date',
+                        help='Last snapshot to read from the store '
+                             '(YYYY-MM-DD)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of worker processes used to calculate '
+                             'the partitions [default: 1]')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random number generator used by '
+                             'the community detection, the seed of each '
+                             'snapshot is derived from it and from the date '
+                             'of the snapshot [default: 0]')
+    parser.add_argument('--output-format', default='files',
+                        choices=['files', 'matrix', 'both'],
+                        help="Write the evolution of the clusters of each "
+                             "node as one file per node ('files'), as a "
+                             "single node x date matrix ('matrix') or both "
+                             "[default: files]")
+    parser.add_argument('--warm-start', action='store_true',
+                        help="Start the partitioning of each snapshot from "
+                             "the partition of the previous one, time and "
+                             "modularity are written to "
+                             "data/warm_start.csv")
+    parser.add_argument('--compare-cold-start', action='store_true',
+                        help='With --warm-start, also partition each '
+                             'snapshot from scratch and report time and '
+                             'modularity of both')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Process the snapshots one at a time in date '
+                             'order, writing the results of each snapshot to '
+                             'disk, so that memory is bounded by the largest '
+                             'snapshot (times --jobs)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Append the given snapshots to the outputs of '
+                             'a previous run, instead of processing the '
+                             'whole series')
+    parser.add_argument('--matching', default='hungarian',
+                        choices=list(MATCHING),
+                        help="How the clusters of consecutive snapshots are "
+                             "matched (see cluster_matching.py), "
+                             "'hungarian' needs a dense clusters x clusters "
+                             "matrix, the other methods scale with the "
+                             "number of overlapping pairs of clusters "
+                             "[default: hungarian]")
+    add_community_args(parser, 'louvain')
+    parser.add_argument('--compare-backends',
+                        help="Comma-separated community detection backends "
+                             "(or 'all' the installed ones) to run on each "
+                             "snapshot, their time, modularity and number "
+                             "of clusters are written to "
+                             "data/community_backends.csv")
+    parser.add_argument('--consensus', type=int, metavar='K',
+                        help='Partition each snapshot K times with different '
+                             'seeds (in parallel with --jobs) and keep the '
+                             'consensus of the K partitions, the stability '
+                             'of each page is written to data/stability')
+    parser.add_argument('--consensus-threshold', type=float,
+                        default=THRESHOLD,
+                        help='Links between pages that are in the same '
+                             'cluster in less than this fraction of the K '
+                             'partitions are ignored by the consensus '
+                             '[default: {}]'.format(THRESHOLD))
+    add_instrumentation_args(parser)
 
     args = parser.parse_args()
-    return args
 
+    if not args.networks and args.store is None:
+        parser.error('either <network> or --store is required')
+
+    check_community_args(parser, args)
+    if args.warm_start and args.community_backend not in WARM_START_BACKENDS:
+        parser.error('--warm-start needs one of the community backends: {}'
+                     .format(', '.join(WARM_START_BACKENDS)))
+
+    if args.consensus is not None:
+        if args.consensus < 2:
+            parser.error('--consensus needs at least 2 partitions')
+        if args.warm_start:
+            parser.error('--consensus can not be used with --warm-start')
+
+    if args.compare_backends is not None:
+        if args.streaming or args.incremental:
+            parser.error('--compare-backends can not be used with '
+                         '--streaming or --incremental')
+        if args.compare_backends == 'all':
+            args.compare_backends = list(AVAILABLE_BACKENDS)
+        else:
+            args.compare_backends = args.compare_backends.split(',')
+        unknown = set(args.compare_backends) - set(BACKENDS)
+        if unknown:
+            parser.error('unknown community backends: {}'
+                         .format(', '.join(sorted(unknown))))
+        missing = set(args.compare_backends) - set(AVAILABLE_BACKENDS)
+        if missing:
+            parser.error('the packages of these community backends are not '
+                         'installed: {}'.format(', '.join(sorted(missing))))
 
-# Sanitize filenames
-# https://stackoverflow.com/questions/295135
-def get_valid_filename(s):
-    s = str(s).strip().replace(' ', '_')
-    return re.sub(r'(?u)[^-\w.]', '', s)
+    return args
 
 
 # Jaccard distance:
@@ -97,323 +314,1114 @@ def jaccard_distance(s1: Iterable[set],
     return (1.0 - (intersection_cardinality/float(union_cardinality)))
 
 
-def main():
-    args = get_args()
-    logger.info('Start')
+def read_graph(network):
+    with open(network, 'r') as infile:
+        reader = csv.reader(infile, delimiter='\t')
 
-    graphs = dict()
-    dates = list()
-    for network in args.networks:
-        logger.debug('Loading file {}...'.format(network))
-        with open(network, 'r') as infile:
+        # skip header
+        next(reader)
 
-            basefilename = os.path.basename(network)
-            graph_date = basefilename.split('.')[-2]
+        edgelist = [edge for edge in reader]
 
-            dates.append(graph_date)
-            reader = csv.reader(infile, delimiter='\t')
+    # collect the set of vertex names and then sort them into a list
+    vertices = set()
+    for edge in edgelist:
+        # iterates on the list and add each element
+        vertices.update(edge)
+    vertices = sorted(vertices)
 
-            # skip header
-            next(reader)
+    # new graph
+    G = ig.Graph()
 
-            edgelist = [edge for edge in reader]
+    # add vertices to the graph
+    G.add_vertices(vertices)
 
-        # collect the set of vertex names and then sort them into a list
-        vertices = set()
-        for edge in edgelist:
-            # iterates on the list and add each element
-            vertices.update(edge)
-        vertices = sorted(vertices)
+    # add edges to the graph
+    G.add_edges(edgelist)
 
-        # new graph
-        G = ig.Graph()
+    return G
 
-        # add vertices to the graph
-        G.add_vertices(vertices)
 
-        # add edges to the graph
-        G.add_edges(edgelist)
+# The seed of each snapshot depends only on its date, so that partitions do
+# not depend on the order (or the process) in which they are calculated.
+def snapshot_seed(graph_date, seed):
+    return (zlib.crc32(graph_date.encode('utf-8')) + seed) % 2**31
 
-        graphs[graph_date] = G
-        logger.debug('done!')
 
-    logger.info('Loaded all graphs')
+# community holds the options of the community detection (see
+# community_detection.community_params()), by default the louvain backend
+def partition_task(graph_date, G, seed, initial_membership=None,
+                   community=None):
+    return (graph_date,
+            G.vcount(),
+            np.array(G.get_edgelist(), dtype=np.int32).reshape(-1, 2),
+            snapshot_seed(graph_date, seed),
+            initial_membership,
+            community or dict())
 
-    logger.info('Preparing to drop empty graphs')
-    graphs_copy = copy.deepcopy(graphs)
-    for graph_date, G in graphs_copy.items():
-        if G.vcount() == 0:
-            logger.debug('Dropping empty graph {}'.format(graph_date))
-            del graphs[graph_date]
-    del graphs_copy
-    logger.info('Dropped empty graphs')
 
-    global_vset = set()
+# Worker for the partitioning of a snapshot. The graph is sent as an array
+# of edges (between local vertex ids) and only the membership vector is sent
+# back, to keep the communication between processes cheap.
+def partition_snapshot(task):
+    graph_date, vcount, edges, seed, initial_membership, community = task
+
+    if initial_membership is not None:
+        initial_membership = initial_membership.tolist()
+
+    G = ig.Graph(n=vcount, edges=edges.tolist())
+    membership = find_partition(G, seed=seed,
+                                initial_membership=initial_membership,
+                                **community)
+
+    return graph_date, np.array(membership, dtype=np.int32)
+
+
+# global ids of the vertices of a graph, in the order of the graph
+def local_vids(G, global_vtoid):
+    return np.array([global_vtoid[vname] for vname in G.vs['name']],
+                    dtype=np.int32)
+
+
+# Initial membership of a snapshot from the partition of the previous
+# snapshot (prev_vids must be sorted), vertices that were not in the previous
+# snapshot start as singletons.
+def warm_start_membership(vids, prev_vids, prev_membership):
+    idx, prev_idx = common_vertices(vids, prev_vids)
+
+    initial = np.full(len(vids), -1, dtype=np.int64)
+    initial[idx] = prev_membership[prev_idx]
+
+    new = initial < 0
+    initial[new] = cluster_count(prev_membership) + np.arange(new.sum())
+
+    # renumber the clusters, since some clusters of the previous snapshot
+    # might have no vertex in this one
+    return np.unique(initial, return_inverse=True)[1].reshape(-1)
+
+
+# Partition a snapshot starting from the partition of the previous one (if
+# any), prev is a pair (vids, membership) as returned by
+# snapshot_membership(). Returns the membership and a row of the warm start
+# report with time and modularity, also for a cold start if requested.
+def partition_warm_start(args, graph_date, G, global_vtoid, prev=None):
+    initial_membership = None
+    if prev is not None:
+        initial_membership = \
+            warm_start_membership(local_vids(G, global_vtoid), *prev)
+
+    task = partition_task(graph_date, G, args.seed, initial_membership,
+                          community=community_params(args))
+    start = time.perf_counter()
+    _, membership = partition_snapshot(task)
+    warm_time = time.perf_counter() - start
+
+    # the modularity at the resolution of the partitioning, i.e. the
+    # objective it optimised
+    report = [graph_date, warm_time,
+              G.modularity(membership.tolist(), resolution=args.resolution),
+              None, None]
+
+    if args.compare_cold_start:
+        task = partition_task(graph_date, G, args.seed,
+                              community=community_params(args))
+        start = time.perf_counter()
+        _, cold_membership = partition_snapshot(task)
+        report[3] = time.perf_counter() - start
+        report[4] = G.modularity(cold_membership.tolist(),
+                                 resolution=args.resolution)
+
+    logger.debug('Warm start for graph {}: {:.3f}s, modularity {:.4f}'
+                 .format(graph_date, report[1], report[2]))
+
+    return membership, report
+
+
+WARM_START_HEADER = ('date', 'warm_time', 'warm_modularity',
+                     'cold_time', 'cold_modularity')
+
+
+def write_warm_start_report(report, append=False):
+    with open(WARM_START_FILE, 'a' if append else 'w+') as reportfile:
+        writer = csv.writer(reportfile, delimiter='\t')
+        if not append:
+            writer.writerow(WARM_START_HEADER)
+        writer.writerows(report)
+
+    warm_time = sum(row[1] for row in report)
+    logger.info('Warm start: {:.3f}s in total'.format(warm_time))
+    cold = [row for row in report if row[3] is not None]
+    if cold:
+        logger.info('Cold start: {:.3f}s in total'
+                    .format(sum(row[3] for row in cold)))
+        logger.info('Mean modularity: {:.4f} (warm), {:.4f} (cold)'
+                    .format(np.mean([row[2] for row in cold]),
+                            np.mean([row[4] for row in cold])))
+
+
+# Partition the snapshots of graphs (a dict date -> graph) with the pool, or
+# in this process if it is None. Yields the date, the membership and the
+# stability of the vertices (None without --consensus) of each snapshot, in
+# the order in which they are done. With --consensus the K partitions of
+# every snapshot (with consecutive seeds) run in the pool at once, and the
+# consensus of a snapshot is found here as soon as its partitions are done.
+def partition_snapshots(args, graphs, pool, instr):
+    runs = args.consensus or 1
+    community = community_params(args)
+    tasks = (partition_task(graph_date, G, args.seed + run,
+                            community=community)
+             for graph_date, G in graphs.items()
+             for run in range(runs))
+
+    # each partition is measured in the process that calculates it
+    if pool is not None:
+        results = pool.imap_unordered(Timed(partition_snapshot), tasks)
+    else:
+        results = map(Timed(partition_snapshot), tasks)
+
+    partitions = defaultdict(list)
+    for (graph_date, membership), measures in results:
+        logger.debug('Calculated partitions for graph {}'
+                      .format(graph_date))
+        G = graphs[graph_date]
+        instr.record('partition_snapshot', snapshot=graph_date,
+                     measures=measures, vertices=G.vcount(),
+                     edges=G.ecount(), clusters=cluster_count(membership))
+
+        if args.consensus is None:
+            yield graph_date, membership, None
+            continue
+
+        partitions[graph_date].append(membership)
+        if len(partitions[graph_date]) < runs:
+            continue
+
+        with instr.stage('consensus', snapshot=graph_date, partitions=runs,
+                         edges=G.ecount()) as stage:
+            membership, stability = consensus_partition(
+                G.vcount(), np.array(G.get_edgelist(), dtype=np.int32),
+                partitions.pop(graph_date),
+                threshold=args.consensus_threshold,
+                seed=snapshot_seed(graph_date, args.seed), **community)
+            stage.count(clusters=cluster_count(membership))
+
+        yield graph_date, membership, stability
+
+
+# write the stability of the pages of a snapshot, sorted by global id, and
+# return the row of the snapshot in the consensus report
+def write_snapshot_stability(graph_date, vids, stability, global_vlist):
+    os.makedirs(STABILITY_DIR, exist_ok=True)
+    stability_path = os.path.join(STABILITY_DIR,
+                                  'graph.{0}.stability.csv'
+                                  .format(graph_date))
+
+    with open(stability_path, 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(('page', 'stability'))
+        writer.writerows((global_vlist[vid], '{:.4f}'.format(value))
+                         for vid, value in zip(vids.tolist(),
+                                               stability.tolist()))
+
+    return (graph_date, len(stability), float(np.mean(stability)),
+            float(np.median(stability)))
+
+
+CONSENSUS_HEADER = ('date', 'pages', 'mean_stability', 'median_stability')
+
+
+def write_consensus_report(report, append=False):
+    with open(CONSENSUS_FILE, 'a' if append else 'w+') as reportfile:
+        writer = csv.writer(reportfile, delimiter='\t')
+        if not append:
+            writer.writerow(CONSENSUS_HEADER)
+        writer.writerows(report)
+
+    if report:
+        logger.info('Consensus: mean stability {:.4f}'
+                    .format(np.mean([row[2] for row in report])))
+
+
+BACKENDS_HEADER = ('date', 'backend', 'seconds', 'modularity', 'clusters')
+
+
+# Run each of the backends of --compare-backends on each snapshot, with the
+# same resolution, iterations and seed used for the partitions
+def write_backends_report(args, graphs, instr):
+    report = list()
     for graph_date, G in graphs.items():
-         vertices = [v.attributes()['name'] for v in G.vs]
-         global_vset.update(vertices)
+        with instr.stage('compare_backends', snapshot=graph_date,
+                         vertices=G.vcount(), edges=G.ecount()):
+            rows = compare_backends(G, backends=args.compare_backends,
+                                    resolution=args.resolution,
+                                    iterations=args.community_iterations,
+                                    seed=snapshot_seed(graph_date, args.seed))
+        report.extend((graph_date,) + row for row in rows)
+
+    with open(BACKENDS_FILE, 'w+') as reportfile:
+        writer = csv.writer(reportfile, delimiter='\t')
+        writer.writerow(BACKENDS_HEADER)
+        writer.writerows(report)
+
+    for backend in args.compare_backends:
+        rows = [row for row in report if row[1] == backend]
+        logger.info('Backend {}: {:.3f}s in total, mean modularity {:.4f}'
+                    .format(backend, sum(row[2] for row in rows),
+                            np.mean([row[3] for row in rows])))
+
+
+def snapshot_dates(args):
+    if args.store is not None:
+        store = SnapshotStore(args.store)
+        return store.date_range(args.start_date, args.end_date)
+
+    return [snapshot_date(network) for network in args.networks]
+
+
+# load the snapshots one at a time, in the order of snapshot_dates()
+def iter_snapshots(args):
+    if args.store is not None:
+        store = SnapshotStore(args.store)
+        for graph_date in store.date_range(args.start_date, args.end_date):
+            logger.debug('Loading snapshot {} from store...'
+                         .format(graph_date))
+            yield graph_date, store.graph(graph_date)
+            logger.debug('done!')
+    else:
+        for network in args.networks:
+            logger.debug('Loading file {}...'.format(network))
+            yield snapshot_date(network), read_graph(network)
+            logger.debug('done!')
+
+
+def load_graphs(args):
+    graphs = dict()
+    dates = list()
+    for graph_date, G in iter_snapshots(args):
+        dates.append(graph_date)
+        graphs[graph_date] = G
 
-    logger.info('Building global index of vertices')
-    global_vlist = sorted(global_vset)
-    del global_vset
-    global_vtoid = dict((vname, vid) 
-                        for vid, vname in enumerate(global_vlist))
-    global_idtov = dict((vid, vname) 
+    return dates, graphs
+
+
+def build_global_index(args):
+    return global_index(networks=args.networks, store_path=args.store,
+                        start_date=args.start_date, end_date=args.end_date)
+
+
+def write_vertex_index(global_vlist):
+    global_idtov = dict((vid, vname)
                         for vid, vname in enumerate(global_vlist))
-    with open(os.path.join('data','vertex.json'), 'w+') as vertexfile:
+    with open(VERTEX_FILE, 'w+') as vertexfile:
         json.dump(global_idtov, vertexfile)
-    logger.info('Global index of vertices built')
 
 
-    logger.info('Calculating partitions for all snapshots')
-    partitions = dict()
-    for graph_date, G in graphs.items():
-        logger.debug('Calculating partitions for graph {}...'
-                      .format(graph_date))
-        part = louvain.find_partition(G, louvain.ModularityVertexPartition);
-        partitions[graph_date] = part
+# membership vector of a snapshot over the global ids of its vertices, both
+# sorted by global id
+def snapshot_membership(G, membership, global_vtoid):
+    vids = local_vids(G, global_vtoid)
+    order = np.argsort(vids, kind='mergesort')
+
+    return vids[order], membership[order]
+
+
+# write the clusters of a snapshot, both as lists of global ids (one line per
+# cluster) and as one file per cluster with the names of its vertices,
+# returns the number of files written
+def write_snapshot_clusters(graph_date, vids, membership, global_vlist):
+    sizes = np.bincount(membership)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    # a stable sort keeps the vertices of each cluster sorted by global id
+    order = np.argsort(membership, kind='mergesort')
+
+    clevoname = 'graph.{0}.clusters.csv'.format(graph_date)
+    clevoutfile_path = os.path.join('data', 'partitions-evolution',
+                                    clevoname)
+
+    with open(clevoutfile_path, 'w+') as clevoutfile:
+        for idx in range(len(sizes)):
+            nodes_ids = vids[order[bounds[idx]:bounds[idx+1]]].tolist()
+            clevoutfile.write(
+                '{}\n'.format(' '.join(str(nid) for nid in nodes_ids)))
+
+            clname = ('graph.{0}.cluster.{1:02}.csv'
+                      .format(graph_date, idx))
+            cloutfile_path = os.path.join('data', 'partitions', clname)
+
+            with open(cloutfile_path, 'w+') as cloutfile:
+                for nid in nodes_ids:
+                    cloutfile.write('{}\n'.format(global_vlist[nid]))
+
+    return len(sizes) + 1
+
+
+# Assign each cluster of a snapshot to an evolved cluster. A cluster matched
+# with a cluster of the previous snapshot inherits its evolved cluster (in
+# the stable evolution only if they are similar enough), otherwise it starts
+# a new one.
+def evolve_clusters(nclusters, cluster_no, cluster_no_stable,
+                    prev_evolved=None, prev_evolved_stable=None,
+                    c1_to_c2=None, sim_c1c2=None):
+    inv_cl_dict = dict()
+    if c1_to_c2 is not None:
+        inv_cl_dict = {v: k for k, v in c1_to_c2.items()}
+
+    evolved = dict()
+    evolved_stable = dict()
+    for clid in range(nclusters):
+        if clid in inv_cl_dict:
+            prev_clid = inv_cl_dict[clid]
+            evolved[clid] = prev_evolved[prev_clid]
+
+            if sim_c1c2[prev_clid] < STABLE_DISTANCE:
+                evolved_stable[clid] = prev_evolved_stable[prev_clid]
+            else:
+                evolved_stable[clid] = cluster_no_stable
+                cluster_no_stable += 1
+        else:
+            evolved[clid] = cluster_no
+            evolved_stable[clid] = cluster_no_stable
 
-    logger.info('Calculated partitions for all snapshots')
+            cluster_no += 1
+            cluster_no_stable += 1
 
-    all_clusters = list()
-    csv_header = ('date', 'n_partitions')
-    with open(os.path.join('data', 'partitions.csv'), 'w+') as outfile:
-        writer = csv.writer(outfile, delimiter='\t')
-        writer.writerow(csv_header)
+    return evolved, evolved_stable, cluster_no, cluster_no_stable
 
-        for graph_date in dates:
-            logger.debug('Writing clusters for snapshot {}'
-                          .format(graph_date))
 
-            parts = partitions.get(graph_date, None)
-            if parts is not None:
-                writer.writerow((graph_date, len(parts)))
-    
-                en_clusters = [cl for cl in enumerate(parts.subgraphs())]
-                all_clusters.append(Cluster(arrow.get(graph_date),
-                                            en_clusters)
-                                    )
+# size of each evolved cluster in a snapshot
+def evolved_sizes(membership, evolved):
+    cl_sizes = defaultdict(int)
+    for clid, size in enumerate(np.bincount(membership).tolist()):
+        cl_sizes[evolved[clid]] = size
 
-                clevoname = 'graph.{0}.clusters.csv'.format(graph_date)
-                clevoutfile_path = os.path.join('data', 'partitions-evolution',
-                                                clevoname)
+    return cl_sizes
 
-                with open(clevoutfile_path, 'w+') as clevoutfile:
-                    for idx, cluster in en_clusters:
 
-                        nodes = set([v.attributes()['name']
-                                     for v in cluster.vs])
+# evolved cluster of each vertex of a snapshot
+def evolved_membership(membership, evolved):
+    # evolved_ids[clid] is the evolved cluster of cluster clid
+    evolved_ids = np.array([evolved[clid] for clid in range(len(evolved))],
+                           dtype=np.int32)
 
+    return evolved_ids[membership]
 
-                        nodes_ids = sorted([global_vtoid[n] for n in nodes])
-                        clevoutfile.write(
-                            '{}\n'.format(' '.join(str(nid) 
-                                                   for nid in nodes_ids
-                                                   )
-                                          ))
 
-                        clname = ('graph.{0}.cluster.{1:02}.csv'
-                                  .format(graph_date, idx))
-                        cloutfile_path = os.path.join('data', 'partitions',
-                                                      clname)
+def cluster_sizes_path(i):
+    return os.path.join('data', 'cluster-sizes',
+                        'cluster_sizes.{:03}.csv'.format(i))
 
-                        with open(cloutfile_path, 'w+') as cloutfile:
-                            for node in nodes:
-                                cloutfile.write('{}\n'.format(node))
 
-            else:
-                writer.writerow((graph_date, 0))
+def check_consecutive(date_t1, date_t2):
+    assert arrow.get(date_t1).replace(months=+1) == arrow.get(date_t2)
 
-    logger.info('Written all clusters')
-    # Iterate over all pairs of consecutive items from a given
-    # list
-    # https://stackoverflow.com/q/21303224/2377454
-    cluster_pairs = [pair for pair 
-                     in zip(all_clusters, all_clusters[1:])]
 
-    logger.info('Compared clusters at t and t+1')
-    compare_clusters = dict()
-    similarity_clusters = dict()
-    for snap_t1, snap_t2 in cluster_pairs:
-        t1 = str(snap_t1.date.format('YYYY-MM-DD'))
-        t2 = str(snap_t2.date.format('YYYY-MM-DD'))
-
-        assert snap_t1.date.replace(months=+1) == snap_t2.date
-
-        # snap_t1.clusters and snap_t2.clusters are the clusters at
-        # time t and t+1
-
-        snap_t1_clusters_nodes = list()
-        for idx1, cl1 in snap_t1.clusters:
-            snap_t1_clusters_nodes.append((idx1,
-                                           [v.attributes()['name'] 
-                                           for v in cl1.vs]))
-        del idx1, cl1
-
-        snap_t2_clusters_nodes = list()
-        for idx2, cl2 in snap_t2.clusters:
-            snap_t2_clusters_nodes.append((idx2,
-                                           [v.attributes()['name'] 
-                                           for v in cl2.vs]))
-        del idx2, cl2
-
-        cluster_product = itertools.product(snap_t1_clusters_nodes,
-                                            snap_t2_clusters_nodes)
-
-        #  numpy.zeros(shape, dtype=float, order='C')
-        n = len(snap_t1_clusters_nodes)
-        m = len(snap_t2_clusters_nodes)
-        clmatrix = np.zeros((n,m), dtype=float)
-        for cl1, cl2 in cluster_product:
-            ridx = cl1[0]
-            cidx = cl2[0]
-            logger.debug('Comparing clusters at {} and {}: ({},{})'
-                          .format(t1,t2,ridx,cidx))
-
-            nodes_cl1 = set(cl1[1])
-            nodes_cl2 = set(cl2[1])
-
-            sim = jaccard_distance(nodes_cl1, nodes_cl2)
-
-            clmatrix[ridx][cidx] = sim
-
-        logger.debug('Compared clusters at {} and {}'.format(t1,t2))
-
-        res = scipy.optimize.linear_sum_assignment(clmatrix)
-        cluster_t1_indices = res[0].tolist()
-        cluster_t2_indices = res[1].tolist()
-        c1_to_c2 = dict(zip(cluster_t1_indices,cluster_t2_indices))
-
-        compare_clusters['{}_{}'.format(t1,t2)] = c1_to_c2
-
-        sim_c1c2 = dict()
-        for c1, c2 in c1_to_c2.items():
-            sim_c1c2[c1] = clmatrix[c1][c2]
-        
-        similarity_clusters['{}_{}'.format(t1,t2)] = sim_c1c2
+class JSONDictWriter(object):
+    """Write a JSON object one key at a time.
 
-    logger.info('Compared all clusters')
+    The output is the same as json.dump() of the whole dictionary, without
+    holding it in memory.
+    """
 
-    clevo_filename = 'clusters_evolution.json'
-    clevo_path = os.path.join('data', clevo_filename)
-    with open(clevo_path, 'w') as clevo_out:
-        json.dump(compare_clusters, clevo_out)
+    def __init__(self, path):
+        self._file = open(path, 'w+')
+        self._file.write('{')
+        self._empty = True
 
-    evolved_clusters = defaultdict(dict)
-    evolved_clusters_stable = defaultdict(dict)
+    def write(self, key, value):
+        if not self._empty:
+            self._file.write(', ')
+        self._file.write('{}: {}'.format(json.dumps(str(key)),
+                                         json.dumps(value)))
+        self._empty = False
 
-    cl_date_prev = None
-    cluster_no = 0
-    cluster_no_stable = 0
-    cluster_sizes = dict()
-    for date, clusters in all_clusters:
-        cl_date = date.format('YYYY-MM-DD')
-        cluster_sizes[cl_date] = defaultdict(int)
-        logger.info('Processing clusters for {}...'.format(cl_date))
-
-        cl_dict = None
-        if cl_date_prev is not None:
-            key = '{}_{}'.format(cl_date_prev, cl_date)
-            cl_dict = compare_clusters[key]
-            inv_cl_dict = {v: k for k, v in cl_dict.items()}
-
-            for cl in clusters:
-                clid = cl[0]
-                if clid in cl_dict.values():
-                    evolved_clusters[cl_date][clid] = \
-                        evolved_clusters[cl_date_prev][inv_cl_dict[clid]]
-
-                    if similarity_clusters[key][inv_cl_dict[clid]] < 0.34:
-                        evolved_clusters_stable[cl_date][clid] = \
-                            evolved_clusters_stable[cl_date_prev][inv_cl_dict[clid]]
-                    else:
-                        evolved_clusters_stable[cl_date][clid] = cluster_no_stable
-                        cluster_no_stable += 1
-                else:
-                    evolved_clusters[cl_date][clid] = cluster_no
-                    evolved_clusters_stable[cl_date][clid] = cluster_no_stable
+    def close(self):
+        self._file.write('}')
+        self._file.close()
+
+
+# Add a key to a JSON object written by JSONDictWriter (or json.dump()) in
+# place, without reading the rest of the file.
+def append_json_item(path, key, value):
+    with open(path, 'rb+') as json_file:
+        json_file.seek(0, os.SEEK_END)
+        pos = json_file.tell()
+        char = b''
+        while char != b'}':
+            pos -= 1
+            json_file.seek(pos)
+            char = json_file.read(1)
+        end = pos
+
+        char = b' '
+        while char.isspace():
+            pos -= 1
+            json_file.seek(pos)
+            char = json_file.read(1)
 
-                    cluster_no += 1
-                    cluster_no_stable += 1
+        json_file.seek(end)
+        json_file.truncate()
+        item = '{}: {}}}'.format(json.dumps(str(key)), json.dumps(value))
+        if char != b'{':
+            item = ', ' + item
+        json_file.write(item.encode('utf-8'))
 
-                cluster_sizes[cl_date][evolved_clusters[cl_date][clid]] = \
-                    cl[1].vcount()
 
+def save_state(state):
+    with open(STATE_FILE, 'wb') as statefile:
+        pickle.dump(state, statefile, protocol=pickle.HIGHEST_PROTOCOL)
 
+
+def load_state():
+    with open(STATE_FILE, 'rb') as statefile:
+        return pickle.load(statefile)
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    instr = Instrumentation.from_args('louvain_clusters', args,
+                                      logger=logger)
+
+    if args.incremental:
+        append_snapshots(args, instr)
+    elif args.streaming:
+        stream_snapshots(args, instr)
+    else:
+        process_all_snapshots(args, instr)
+
+    instr.write()
+    logger.info('All done!')
+
+
+def process_all_snapshots(args, instr):
+    with instr.stage('load') as stage:
+        dates, graphs = load_graphs(args)
+        stage.count(snapshots=len(graphs),
+                    vertices=sum(G.vcount() for G in graphs.values()),
+                    edges=sum(G.ecount() for G in graphs.values()))
+
+    logger.info('Loaded all graphs')
+
+    logger.info('Preparing to drop empty graphs')
+    for graph_date in list(graphs.keys()):
+        if graphs[graph_date].vcount() == 0:
+            logger.debug('Dropping empty graph {}'.format(graph_date))
+            del graphs[graph_date]
+    logger.info('Dropped empty graphs')
+
+    with instr.stage('global_index') as stage:
+        global_vset = set()
+        for graph_date, G in graphs.items():
+             global_vset.update(G.vs['name'])
+
+        logger.info('Building global index of vertices')
+        global_vlist = sorted(global_vset)
+        del global_vset
+        global_vtoid = dict((vname, vid)
+                            for vid, vname in enumerate(global_vlist))
+        write_vertex_index(global_vlist)
+        logger.info('Global index of vertices built')
+        stage.count(vertices=len(global_vlist), files=1)
+
+
+    logger.info('Calculating partitions for all snapshots')
+    memberships = dict()
+    with instr.stage('partition', snapshots=len(graphs)):
+        if args.warm_start:
+            # each snapshot starts from the partition of the previous one, so
+            # they have to be calculated in order
+            if args.jobs > 1:
+                logger.warning('Ignoring --jobs with --warm-start')
+
+            warm_report = list()
+            prev = None
+            for graph_date in dates:
+                if graph_date not in graphs:
+                    continue
+
+                G = graphs[graph_date]
+                with instr.stage('partition_snapshot', snapshot=graph_date,
+                                 vertices=G.vcount(),
+                                 edges=G.ecount()) as stage:
+                    membership, report = partition_warm_start(
+                        args, graph_date, G, global_vtoid, prev)
+                    stage.count(clusters=cluster_count(membership))
+
+                memberships[graph_date] = snapshot_membership(G, membership,
+                                                              global_vtoid)
+                warm_report.append(report)
+                prev = memberships[graph_date]
+
+            write_warm_start_report(warm_report)
         else:
-            for cl in clusters:
-                clid = cl[0]
-                evolved_clusters[cl_date][clid] = cluster_no
-                evolved_clusters_stable[cl_date][clid] = cluster_no_stable
+            pool = None
+            if args.jobs > 1:
+                pool = multiprocessing.Pool(args.jobs)
+
+            consensus_report = list()
+            for graph_date, membership, stability in \
+                    partition_snapshots(args, graphs, pool, instr):
+                G = graphs[graph_date]
+                memberships[graph_date] = snapshot_membership(G, membership,
+                                                              global_vtoid)
+
+                if stability is not None:
+                    # sorted by global id, as the membership
+                    vids, stability = snapshot_membership(G, stability,
+                                                          global_vtoid)
+                    with instr.stage('write_stability', snapshot=graph_date,
+                                     files=1):
+                        consensus_report.append(write_snapshot_stability(
+                            graph_date, vids, stability, global_vlist))
+
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+            if args.consensus is not None:
+                write_consensus_report(consensus_report)
 
-                cluster_no += 1
-                cluster_no_stable += 1
+    logger.info('Calculated partitions for all snapshots')
 
-                cluster_sizes[cl_date][evolved_clusters[cl_date][clid]] = \
-                    cl[1].vcount()
+    if args.compare_backends is not None:
+        logger.info('Comparing community detection backends')
+        write_backends_report(args, graphs, instr)
 
-        cl_date_prev = cl_date
+    # dates of the snapshots with a partition, in order
+    cl_dates = [graph_date for graph_date in dates
+                if graph_date in memberships]
+
+    with instr.stage('write_clusters') as stage:
+        csv_header = ('date', 'n_partitions')
+        with open(os.path.join('data', 'partitions.csv'), 'w+') as outfile:
+            writer = csv.writer(outfile, delimiter='\t')
+            writer.writerow(csv_header)
 
-    for i in range(cluster_no):
-        clsize_path = os.path.join('data',
-                                   'cluster-sizes',
-                                   'cluster_sizes.{:03}.csv'.format(i)) 
-        with open(clsize_path, 'w+') as clsizefile:
-            clsizewriter = csv.writer(clsizefile, delimiter='\t')
             for graph_date in dates:
-                if graph_date in cluster_sizes:
-                    cl_size = cluster_sizes[graph_date][i]
+                logger.debug('Writing clusters for snapshot {}'
+                              .format(graph_date))
+
+                if graph_date in memberships:
+                    vids, membership = memberships[graph_date]
+                    writer.writerow((graph_date, int(membership.max()) + 1))
+
+                    stage.count(files=write_snapshot_clusters(
+                        graph_date, vids, membership, global_vlist))
                 else:
-                    cl_size = 0
-                
-                clsizewriter.writerow((graph_date, cl_size))
+                    writer.writerow((graph_date, 0))
+        stage.count(files=1)
 
+    logger.info('Written all clusters')
+
+    logger.info('Compared clusters at t and t+1')
+    with instr.stage('matching', pairs=max(0, len(cl_dates)-1)):
+        compare_clusters = dict()
+        similarity_clusters = dict()
+        # Iterate over all pairs of consecutive items from a given
+        # list
+        # https://stackoverflow.com/q/21303224/2377454
+        for t1, t2 in zip(cl_dates, cl_dates[1:]):
+            check_consecutive(t1, t2)
+
+            # memberships[t1] and memberships[t2] are the clusters at
+            # time t and t+1
+            vids1, membership1 = memberships[t1]
+            vids2, membership2 = memberships[t2]
+
+            c1_to_c2, sim_c1c2 = match_clusters(vids1, membership1,
+                                                vids2, membership2,
+                                                method=args.matching)
+
+            logger.debug('Compared clusters at {} and {}'.format(t1,t2))
+
+            compare_clusters['{}_{}'.format(t1,t2)] = c1_to_c2
+            similarity_clusters['{}_{}'.format(t1,t2)] = sim_c1c2
+
+    logger.info('Compared all clusters')
+
+    with instr.stage('write_matching', files=1):
+        clevo_filename = 'clusters_evolution.json'
+        clevo_path = os.path.join('data', clevo_filename)
+        with open(clevo_path, 'w') as clevo_out:
+            json.dump(compare_clusters, clevo_out)
+
+    with instr.stage('evolve') as stage:
+        evolved_clusters = dict()
+        evolved_clusters_stable = dict()
+
+        cl_date_prev = None
+        cluster_no = 0
+        cluster_no_stable = 0
+        cluster_sizes = dict()
+        for cl_date in cl_dates:
+            logger.info('Processing clusters for {}...'.format(cl_date))
+            vids, membership = memberships[cl_date]
+            nclusters = int(membership.max()) + 1
+
+            if cl_date_prev is not None:
+                key = '{}_{}'.format(cl_date_prev, cl_date)
+                (evolved_clusters[cl_date],
+                 evolved_clusters_stable[cl_date],
+                 cluster_no,
+                 cluster_no_stable) = \
+                    evolve_clusters(nclusters, cluster_no, cluster_no_stable,
+                                    evolved_clusters[cl_date_prev],
+                                    evolved_clusters_stable[cl_date_prev],
+                                    compare_clusters[key],
+                                    similarity_clusters[key])
+            else:
+                (evolved_clusters[cl_date],
+                 evolved_clusters_stable[cl_date],
+                 cluster_no,
+                 cluster_no_stable) = \
+                    evolve_clusters(nclusters, cluster_no, cluster_no_stable)
+
+            cluster_sizes[cl_date] = evolved_sizes(membership,
+                                                   evolved_clusters[cl_date])
+
+            cl_date_prev = cl_date
+        stage.count(clusters=cluster_no)
+
+    with instr.stage('write_evolution', files=cluster_no+2):
+        for i in range(cluster_no):
+            with open(cluster_sizes_path(i), 'w+') as clsizefile:
+                clsizewriter = csv.writer(clsizefile, delimiter='\t')
+                for graph_date in dates:
+                    if graph_date in cluster_sizes:
+                        cl_size = cluster_sizes[graph_date][i]
+                    else:
+                        cl_size = 0
 
-    evcl_path = os.path.join('data','evolved_clusters.json')
-    with open(evcl_path, 'w+') as evcl_file:
-        json.dump(evolved_clusters, evcl_file)
+                    clsizewriter.writerow((graph_date, cl_size))
 
-    evclstable_path = os.path.join('data','evolved_clusters_stable.json')
-    with open(evclstable_path, 'w+') as evclstable_file:
-        json.dump(evolved_clusters_stable, evclstable_file)    
 
-    cl_date_prev = None
+        evcl_path = os.path.join('data','evolved_clusters.json')
+        with open(evcl_path, 'w+') as evcl_file:
+            json.dump(evolved_clusters, evcl_file)
+
+        evclstable_path = os.path.join('data','evolved_clusters_stable.json')
+        with open(evclstable_path, 'w+') as evclstable_file:
+            json.dump(evolved_clusters_stable, evclstable_file)
 
 
     logger.info('Processing vertexes in clusters')
-    vertex_clusters = defaultdict(dict)
-    for date, clusters in all_clusters:
-        cl_date = date.format('YYYY-MM-DD')
-        logger.info('Processing clusters for {}...'.format(cl_date))
+    # node x date matrix of the evolved cluster of each vertex, rows are
+    # indexed by the global id of the vertex and -1 means that the vertex is
+    # not in the snapshot
+    with instr.stage('membership_matrix', vertices=len(global_vlist),
+                     snapshots=len(dates)):
+        node_clusters = np.full((len(global_vlist), len(dates)), -1,
+                                dtype=np.int32)
+        for didx, graph_date in enumerate(dates):
+            if graph_date not in memberships:
+                continue
+            logger.info('Processing clusters for {}...'.format(graph_date))
+
+            vids, membership = memberships[graph_date]
+            node_clusters[vids, didx] = \
+                evolved_membership(membership, evolved_clusters[graph_date])
+
+    if args.output_format in ('matrix', 'both'):
+        logger.info('Writing membership matrix to {}'.format(MATRIX_FILE))
+        with instr.stage('write_matrix', files=2):
+            save_matrix(MATRIX_FILE, node_clusters, dates)
+
+    if args.output_format in ('files', 'both'):
+        logger.info('Writing node files to {}'.format(NODES_DIR))
+        with instr.stage('write_node_files', files=len(global_vlist)):
+            export_node_files(node_clusters, dates, global_vlist, NODES_DIR)
+
+    # save what is needed to append the next snapshot with --incremental
+    if cl_dates:
+        last_date = cl_dates[-1]
+        vids, membership = memberships[last_date]
+        with instr.stage('save_state', files=1):
+            save_state({'dates': dates,
+                        'vertices': global_vlist,
+                        'last_date': last_date,
+                        'vids': vids,
+                        'membership': membership,
+                        'evolved': evolved_clusters[last_date],
+                        'evolved_stable': evolved_clusters_stable[last_date],
+                        'cluster_no': cluster_no,
+                        'cluster_no_stable': cluster_no_stable,
+                        'cluster_sizes': dict(cluster_sizes[last_date]),
+                        })
+
+
+# Partition the snapshots in date order, loading at most --jobs snapshots at
+# a time. Yields the date, the global ids and the membership of each snapshot
+# (None for empty snapshots).
+def stream_partitions(args, global_vtoid, warm_report, instr):
+    jobs = args.jobs
+    if args.warm_start and jobs > 1:
+        logger.warning('Ignoring --jobs with --warm-start')
+        jobs = 1
+
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+
+    snapshots = iter_snapshots(args)
+    prev = None
+    while True:
+        with instr.stage('load') as stage:
+            chunk = list(itertools.islice(snapshots, jobs))
+            stage.count(snapshots=len(chunk),
+                        vertices=sum(G.vcount() for _, G in chunk),
+                        edges=sum(G.ecount() for _, G in chunk))
+        if not chunk:
+            break
+
+        if not args.warm_start:
+            graphs = dict((graph_date, G) for graph_date, G in chunk
+                          if G.vcount() > 0)
+            results = dict((graph_date, (membership, stability))
+                           for graph_date, membership, stability in
+                           partition_snapshots(args, graphs, pool, instr))
+            del graphs
+
+        for graph_date, G in chunk:
+            if G.vcount() == 0:
+                logger.debug('Skipping empty graph {}'.format(graph_date))
+                yield graph_date, None, None, None
+                continue
+
+            if args.warm_start:
+                with instr.stage('partition_snapshot', snapshot=graph_date,
+                                 vertices=G.vcount(),
+                                 edges=G.ecount()) as stage:
+                    membership, report = partition_warm_start(
+                        args, graph_date, G, global_vtoid, prev)
+                    stage.count(clusters=cluster_count(membership))
+                warm_report.append(report)
+                stability = None
+            else:
+                membership, stability = results[graph_date]
 
-        for clid, cl in clusters:
-            logger.debug('Processing cluster id {} for {}...'
-                         .format(clid, cl_date))
+            vids, membership = snapshot_membership(G, membership,
+                                                   global_vtoid)
+            if stability is not None:
+                _, stability = snapshot_membership(G, stability,
+                                                   global_vtoid)
+            prev = (vids, membership)
 
-            nodes = [v.attributes()['name'] for v in cl.vs]
+            yield graph_date, vids, membership, stability
 
-            for node in nodes:
-                vertex_clusters[node][cl_date] = evolved_clusters[cl_date][clid]
+        del chunk
 
+    if pool is not None:
+        pool.close()
+        pool.join()
 
-    for node in global_vlist:
-        node_outfilename = get_valid_filename(
-                            'node_evolution_{}.csv'.format(node))
-        node_outfilepath = os.path.join('data', 'nodes-evolution',
-                                        node_outfilename)
 
-        with open(node_outfilepath, 'w+') as node_outfile:
-            writer = csv.writer(node_outfile, delimiter='\t')
-            writer.writerow(('date', 'cluster_id'))
+# Same as process_all_snapshots(), but the snapshots are processed in date
+# order one at a time: at most two membership vectors are in memory at once
+# and the results of each snapshot are written to disk as soon as they are
+# available.
+def stream_snapshots(args, instr):
+    dates = snapshot_dates(args)
 
-        for graph_date in dates:
-            clid = vertex_clusters[node].get(graph_date, -1)
+    logger.info('Building global index of vertices')
+    with instr.stage('global_index') as stage:
+        global_vlist = build_global_index(args)
+        global_vtoid = dict((vname, vid)
+                            for vid, vname in enumerate(global_vlist))
+        write_vertex_index(global_vlist)
+        stage.count(vertices=len(global_vlist), files=1)
+    logger.info('Global index of vertices built')
 
-            with open(node_outfilepath, 'a+') as node_outfile:
-                writer = csv.writer(node_outfile, delimiter='\t')
-                writer.writerow((graph_date, clid))
+    # the membership matrix is filled one column at a time, if it is not
+    # one of the outputs it is only a temporary file
+    if args.output_format in ('matrix', 'both'):
+        matrix_path = MATRIX_FILE
+    else:
+        matrix_fd, matrix_path = tempfile.mkstemp(suffix='.npy', dir='data')
+        os.close(matrix_fd)
+    node_clusters = create_matrix(matrix_path, len(global_vlist), dates)
+
+    # rows of (date index, evolved cluster, size)
+    sizes_spill = tempfile.TemporaryFile(dir='data')
+
+    clevo_writer = JSONDictWriter(os.path.join('data',
+                                               'clusters_evolution.json'))
+    evcl_writer = JSONDictWriter(os.path.join('data',
+                                              'evolved_clusters.json'))
+    evclstable_writer = JSONDictWriter(
+        os.path.join('data', 'evolved_clusters_stable.json'))
+
+    prev = None
+    cluster_no = 0
+    cluster_no_stable = 0
+    warm_report = list()
+    consensus_report = list()
+    csv_header = ('date', 'n_partitions')
+    with open(os.path.join('data', 'partitions.csv'), 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(csv_header)
 
-    logger.info('All done!')
+        partitions = stream_partitions(args, global_vtoid, warm_report,
+                                       instr)
+        for didx, (graph_date, vids, membership, stability) in \
+                enumerate(partitions):
+            if vids is None:
+                writer.writerow((graph_date, 0))
+                continue
+
+            if stability is not None:
+                with instr.stage('write_stability', snapshot=graph_date,
+                                 files=1):
+                    consensus_report.append(write_snapshot_stability(
+                        graph_date, vids, stability, global_vlist))
+
+            logger.info('Processing clusters for {}...'.format(graph_date))
+            nclusters = int(membership.max()) + 1
+            writer.writerow((graph_date, nclusters))
+            with instr.stage('write_clusters', snapshot=graph_date) as stage:
+                stage.count(files=write_snapshot_clusters(
+                    graph_date, vids, membership, global_vlist))
+
+            if prev is not None:
+                t1, t2 = prev['date'], graph_date
+                check_consecutive(t1, t2)
+
+                with instr.stage('matching', snapshot=graph_date, pairs=1):
+                    c1_to_c2, sim_c1c2 = match_clusters(
+                        prev['vids'], prev['membership'], vids, membership,
+                        method=args.matching)
+                clevo_writer.write('{}_{}'.format(t1, t2), c1_to_c2)
+
+                evolved, evolved_stable, cluster_no, cluster_no_stable = \
+                    evolve_clusters(nclusters, cluster_no, cluster_no_stable,
+                                    prev['evolved'], prev['evolved_stable'],
+                                    c1_to_c2, sim_c1c2)
+            else:
+                evolved, evolved_stable, cluster_no, cluster_no_stable = \
+                    evolve_clusters(nclusters, cluster_no, cluster_no_stable)
+
+            evcl_writer.write(graph_date, evolved)
+            evclstable_writer.write(graph_date, evolved_stable)
+
+            cl_sizes = evolved_sizes(membership, evolved)
+            np.array([(didx, clid, size) for clid, size in cl_sizes.items()],
+                     dtype=np.int64).tofile(sizes_spill)
+
+            node_clusters[vids, didx] = evolved_membership(membership,
+                                                           evolved)
+
+            prev = {'date': graph_date,
+                    'vids': vids,
+                    'membership': membership,
+                    'evolved': evolved,
+                    'evolved_stable': evolved_stable,
+                    'cluster_sizes': cl_sizes,
+                    }
+
+    clevo_writer.close()
+    evcl_writer.close()
+    evclstable_writer.close()
+    logger.info('Compared all clusters')
+
+    if args.warm_start:
+        write_warm_start_report(warm_report)
+    if args.consensus is not None:
+        write_consensus_report(consensus_report)
+
+    with instr.stage('write_evolution', files=cluster_no):
+        sizes_spill.seek(0)
+        sizes = np.fromfile(sizes_spill, dtype=np.int64).reshape(-1, 3)
+        sizes_spill.close()
+        sizes = sizes[np.argsort(sizes[:,1], kind='mergesort')]
+        bounds = np.searchsorted(sizes[:,1], np.arange(cluster_no+1))
+        for i in range(cluster_no):
+            cl_sizes = np.zeros(len(dates), dtype=np.int64)
+            cl_rows = sizes[bounds[i]:bounds[i+1]]
+            cl_sizes[cl_rows[:,0]] = cl_rows[:,2]
+
+            with open(cluster_sizes_path(i), 'w+') as clsizefile:
+                clsizewriter = csv.writer(clsizefile, delimiter='\t')
+                clsizewriter.writerows(zip(dates, cl_sizes.tolist()))
+        del sizes
+
+    node_clusters.flush()
+    if args.output_format in ('files', 'both'):
+        logger.info('Writing node files to {}'.format(NODES_DIR))
+        with instr.stage('write_node_files', files=len(global_vlist)):
+            export_node_files(node_clusters, dates, global_vlist, NODES_DIR)
+    del node_clusters
+    if matrix_path != MATRIX_FILE:
+        os.remove(matrix_path)
+        os.remove(dates_path(matrix_path))
+
+    if prev is not None:
+        with instr.stage('save_state', files=1):
+            save_state({'dates': dates,
+                        'vertices': global_vlist,
+                        'last_date': prev['date'],
+                        'vids': prev['vids'],
+                        'membership': prev['membership'],
+                        'evolved': prev['evolved'],
+                        'evolved_stable': prev['evolved_stable'],
+                        'cluster_no': cluster_no,
+                        'cluster_no_stable': cluster_no_stable,
+                        'cluster_sizes': dict(prev['cluster_sizes']),
+                        })
+
+
+# Append new snapshots to the outputs of a previous run, one snapshot at a
+# time, using the state saved at the end of the previous run.
+def append_snapshots(args, instr):
+    state = load_state()
+    logger.info('Loaded state, last snapshot: {}'
+                .format(state['last_date']))
+
+    global_vlist = state['vertices']
+    global_vtoid = dict((vname, vid)
+                        for vid, vname in enumerate(global_vlist))
+
+    with instr.stage('load') as stage:
+        dates, graphs = load_graphs(args)
+        stage.count(snapshots=len(graphs),
+                    vertices=sum(G.vcount() for G in graphs.values()),
+                    edges=sum(G.ecount() for G in graphs.values()))
+
+    # only the partitions of --consensus run in parallel
+    pool = None
+    if args.consensus is not None and args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+
+    # check all the snapshots before appending any of them, the clusters
+    # can only evolve from one snapshot to the next one
+    prev_date = state['last_date']
+    for graph_date in dates:
+        if graph_date <= state['dates'][-1]:
+            raise ValueError('Snapshot {} is not newer than the last '
+                             'processed snapshot ({})'
+                             .format(graph_date, state['dates'][-1]))
+        if graphs[graph_date].vcount() == 0:
+            raise ValueError('Snapshot {} is empty, the clusters can not '
+                             'evolve across it'.format(graph_date))
+        if (arrow.get(prev_date).replace(months=+1) !=
+                arrow.get(graph_date)):
+            raise ValueError('Snapshot {} is not the month after the last '
+                             'partitioned snapshot ({})'
+                             .format(graph_date, prev_date))
+        prev_date = graph_date
+
+    for graph_date in dates:
+        G = graphs.pop(graph_date)
+        logger.info('Appending snapshot {}...'.format(graph_date))
+        with instr.stage('append_snapshot', snapshot=graph_date,
+                         vertices=G.vcount(), edges=G.ecount()):
+            append_snapshot(args, state, graph_date, G, global_vlist,
+                            global_vtoid, instr, pool)
+
+        save_state(state)
+        logger.info('Appended snapshot {}'.format(graph_date))
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def append_snapshot(args, state, graph_date, G, global_vlist, global_vtoid,
+                    instr, pool=None):
+    nvertices_prev = len(global_vlist)
+    cluster_no_prev = state['cluster_no']
+
+    # new pages get new ids at the end of the global index, so that the ids
+    # of the pages already in the outputs do not change
+    new_vertices = sorted(vname for vname in G.vs['name']
+                          if vname not in global_vtoid)
+    for vname in new_vertices:
+        global_vtoid[vname] = len(global_vlist)
+        global_vlist.append(vname)
+    if new_vertices:
+        write_vertex_index(global_vlist)
+    logger.info('{} new vertices'.format(len(new_vertices)))
+
+    partitions_path = os.path.join('data', 'partitions.csv')
+    if args.warm_start:
+        membership, report = \
+            partition_warm_start(args, graph_date, G, global_vtoid,
+                                 (state['vids'], state['membership']))
+        write_warm_start_report([report],
+                                append=os.path.exists(WARM_START_FILE))
+        stability = None
+    else:
+        _, membership, stability = list(
+            partition_snapshots(args, {graph_date: G}, pool, instr))[0]
+    vids, membership = snapshot_membership(G, membership, global_vtoid)
+    nclusters = int(membership.max()) + 1
+
+    if stability is not None:
+        _, stability = snapshot_membership(G, stability, global_vtoid)
+        write_consensus_report(
+            [write_snapshot_stability(graph_date, vids, stability,
+                                      global_vlist)],
+            append=os.path.exists(CONSENSUS_FILE))
+
+    with open(partitions_path, 'a') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow((graph_date, nclusters))
+    write_snapshot_clusters(graph_date, vids, membership, global_vlist)
+
+    t1, t2 = state['last_date'], graph_date
+    check_consecutive(t1, t2)
+    key = '{}_{}'.format(t1, t2)
+    c1_to_c2, sim_c1c2 = match_clusters(state['vids'],
+                                        state['membership'],
+                                        vids, membership,
+                                        method=args.matching)
+
+    evolved, evolved_stable, cluster_no, cluster_no_stable = \
+        evolve_clusters(nclusters,
+                        state['cluster_no'], state['cluster_no_stable'],
+                        state['evolved'], state['evolved_stable'],
+                        c1_to_c2, sim_c1c2)
+
+    for filename, date_key, value in (
+            ('clusters_evolution.json', key, c1_to_c2),
+            ('evolved_clusters.json', graph_date, evolved),
+            ('evolved_clusters_stable.json', graph_date, evolved_stable)):
+        append_json_item(os.path.join('data', filename), date_key, value)
+
+    column = np.full(len(global_vlist), -1, dtype=np.int32)
+    column[vids] = evolved_membership(membership, evolved)
+    cl_sizes = evolved_sizes(membership, evolved)
+
+    state.update({'last_date': graph_date,
+                  'vids': vids,
+                  'membership': membership,
+                  'evolved': evolved,
+                  'evolved_stable': evolved_stable,
+                  'cluster_no': cluster_no,
+                  'cluster_no_stable': cluster_no_stable,
+                  'cluster_sizes': dict(cl_sizes),
+                  })
+
+    # one more row for the existing evolved clusters, new evolved clusters
+    # get a file with all the previous dates
+    for i in range(state['cluster_no']):
+        with open(cluster_sizes_path(i), 'a') as clsizefile:
+            clsizewriter = csv.writer(clsizefile, delimiter='\t')
+            if i >= cluster_no_prev:
+                clsizewriter.writerows((prev_date, 0)
+                                       for prev_date in state['dates'])
+            clsizewriter.writerow((graph_date, cl_sizes.get(i, 0)))
+
+    if args.output_format in ('matrix', 'both'):
+        logger.info('Appending to membership matrix {}'.format(MATRIX_FILE))
+        append_column(MATRIX_FILE, column, state['dates'] + [graph_date])
+
+    if args.output_format in ('files', 'both'):
+        logger.info('Appending to node files in {}'.format(NODES_DIR))
+        append_node_files(column, graph_date, state['dates'],
+                          global_vlist, nvertices_prev, NODES_DIR)
+
+    state['dates'].append(graph_date)
+    state['vertices'] = global_vlist
 
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+usage: membership_matrix.py [-h] [--vertices VERTICES] [--output-dir OUTPUT_DIR]
+                            [--shard-size SHARD_SIZE]
+                            [<matrix>]
+
+Export the node x date cluster-membership matrix to one file per node
+
+positional arguments:
+  <matrix>              The membership matrix written by louvain_clusters.py
+                        [default: data/nodes-evolution.npy]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --vertices VERTICES   The global index of vertices [default: data/vertex.json]
+  --output-dir OUTPUT_DIR
+                        Directory where the node files are written
+                        [default: data/nodes-evolution]
+  --shard-size SHARD_SIZE
+                        Number of rows of the matrix read at once
+                        [default: 10000]
+
+The matrix is a int32 .npy file with one row per vertex (indexed by the
+global vertex id in vertex.json) and one column per snapshot, each cell holds
+the id of the evolved cluster of the vertex or -1 if the vertex is not in the
+snapshot. The dates of the columns are stored next to the matrix, in
+<matrix basename>.dates.json.
+
+The columns appended by louvain_clusters.py --incremental are stored one per
+file, in <matrix basename>.columns/<date>.npy, with one row for each vertex
+in the global index at that date, so that appending a snapshot does not
+rewrite the matrix. load_matrix() reads them together with the matrix (the
+dates file lists the dates of both), a full run writes a single matrix
+again.
+"""
+
+import os
+import re
+import csv
+import json
+import shutil
+import argparse
+import logging
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+MATRIX_FILE = os.path.join('data', 'nodes-evolution.npy')
+VERTEX_FILE = os.path.join('data', 'vertex.json')
+NODES_DIR = os.path.join('data', 'nodes-evolution')
+SHARD_SIZE = 10000
+
+
+def get_args():
+    description=('Export the node x date cluster-membership matrix to one '
+                 'file per node')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('matrix', metavar='<matrix>', nargs='?',
+                        default=MATRIX_FILE,
+                        help='The membership matrix written by '
+                             'louvain_clusters.py [default: {}]'
+                             .format(MATRIX_FILE))
+    parser.add_argument('--vertices', default=VERTEX_FILE,
+                        help='The global index of vertices [default: {}]'
+                             .format(VERTEX_FILE))
+    parser.add_argument('--output-dir', default=NODES_DIR,
+                        help='Directory where the node files are written '
+                             '[default: {}]'.format(NODES_DIR))
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                        help='Number of rows of the matrix read at once '
+                             '[default: {}]'.format(SHARD_SIZE))
+
+    args = parser.parse_args()
+    return args
+
+
+# Sanitize filenames
+# https://stackoverflow.com/questions/295135
+def get_valid_filename(s):
+    s = str(s).strip().replace(' ', '_')
+    return re.sub(r'(?u)[^-\w.]', '', s)
+
+
+def dates_path(matrix_path):
+    return '{}.dates.json'.format(os.path.splitext(matrix_path)[0])
+
+
+def save_dates(matrix_path, dates):
+    with open(dates_path(matrix_path), 'w+') as dates_file:
+        json.dump(list(dates), dates_file)
+
+
+def columns_dir(matrix_path):
+    return '{}.columns'.format(os.path.splitext(matrix_path)[0])
+
+
+def column_path(matrix_path, graph_date):
+    return os.path.join(columns_dir(matrix_path), '{}.npy'.format(graph_date))
+
+
+# the appended columns of a previous matrix in the same place are stale
+def remove_columns(matrix_path):
+    shutil.rmtree(columns_dir(matrix_path), ignore_errors=True)
+
+
+def save_matrix(matrix_path, matrix, dates):
+    remove_columns(matrix_path)
+    np.save(matrix_path, matrix)
+    save_dates(matrix_path, dates)
+
+
+# Append the column of a new snapshot (one row for each vertex in the global
+# index, vertices added after the previous columns included) without
+# rewriting the matrix. dates are the dates of all the columns, the new one
+# last.
+def append_column(matrix_path, column, dates):
+    os.makedirs(columns_dir(matrix_path), exist_ok=True)
+    np.save(column_path(matrix_path, dates[-1]),
+            np.asarray(column, dtype=np.int32))
+    save_dates(matrix_path, dates)
+
+
+# Create a matrix on disk with all the cells set to -1. The matrix is stored
+# column by column (Fortran order), so that it can be filled one snapshot at
+# a time.
+def create_matrix(matrix_path, nvertices, dates):
+    remove_columns(matrix_path)
+    matrix = open_memmap(matrix_path, mode='w+', dtype=np.int32,
+                         shape=(nvertices, len(dates)), fortran_order=True)
+    matrix[:] = -1
+    save_dates(matrix_path, dates)
+
+    return matrix
+
+
+class AppendedMatrix(object):
+    """A matrix followed by the columns appended to it, read as a single
+    (read-only) matrix: rows that are missing from the older columns (the
+    vertices added later) are -1.
+
+    Indexing reads only the requested rows of each column, e.g.
+    matrix[start:end] for a shard of rows or matrix[:, col] for a column.
+    """
+
+    def __init__(self, matrix, columns):
+        self.parts = [matrix] + [column[:, np.newaxis] for column in columns]
+        self.dtype = matrix.dtype
+        self.ndim = 2
+        self.shape = (max(part.shape[0] for part in self.parts),
+                      sum(part.shape[1] for part in self.parts))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        rows = np.arange(self.shape[0])[key[0]]
+        block = np.full((rows.size, self.shape[1]), -1, dtype=self.dtype)
+        flat_rows = rows.reshape(-1)
+
+        col = 0
+        for part in self.parts:
+            found = flat_rows < part.shape[0]
+            block[found, col:col+part.shape[1]] = part[flat_rows[found]]
+            col += part.shape[1]
+
+        block = block.reshape(rows.shape + (self.shape[1],))
+        if len(key) > 1:
+            block = block[(Ellipsis,) + key[1:]]
+        return block
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = self[:]
+        return matrix if dtype is None else matrix.astype(dtype)
+
+
+def load_matrix(matrix_path):
+    matrix = np.load(matrix_path, mmap_mode='r')
+    with open(dates_path(matrix_path), 'r') as dates_file:
+        dates = json.load(dates_file)
+
+    if len(dates) > matrix.shape[1]:
+        columns = [np.load(column_path(matrix_path, graph_date),
+                           mmap_mode='r')
+                   for graph_date in dates[matrix.shape[1]:]]
+        matrix = AppendedMatrix(matrix, columns)
+
+    return matrix, dates
+
+
+# vertex.json maps the (string) global id of each vertex to its name
+def load_vertices(vertex_path):
+    with open(vertex_path, 'r') as vertexfile:
+        idtov = json.load(vertexfile)
+
+    vertices = [None]*len(idtov)
+    for vid, vname in idtov.items():
+        vertices[int(vid)] = vname
+
+    return vertices
+
+
+# Write the node_evolution_<page>.csv files. The matrix is read shard_size
+# rows at a time and each file is opened once and written in one go.
+def export_node_files(matrix, dates, vertices, output_dir,
+                      shard_size=SHARD_SIZE):
+    for start in range(0, len(vertices), shard_size):
+        logger.debug('Exporting nodes {}-{}...'
+                     .format(start, start+shard_size-1))
+        shard = np.asarray(matrix[start:start+shard_size]).tolist()
+
+        for offset, row in enumerate(shard):
+            node = vertices[start+offset]
+            node_outfilename = get_valid_filename(
+                                'node_evolution_{}.csv'.format(node))
+            node_outfilepath = os.path.join(output_dir, node_outfilename)
+
+            with open(node_outfilepath, 'w+') as node_outfile:
+                writer = csv.writer(node_outfile, delimiter='\t')
+                writer.writerow(('date', 'cluster_id'))
+                writer.writerows(zip(dates, row))
+
+
+# Append the cluster of each node at graph_date to the node_evolution_<page>.csv
+# files. Nodes from first_new onwards are new, their files are created with
+# all the previous dates.
+def append_node_files(column, graph_date, prev_dates, vertices, first_new,
+                      output_dir):
+    for vid, clid in enumerate(column.tolist()):
+        node_outfilename = get_valid_filename(
+                            'node_evolution_{}.csv'.format(vertices[vid]))
+        node_outfilepath = os.path.join(output_dir, node_outfilename)
+
+        if vid >= first_new:
+            with open(node_outfilepath, 'w+') as node_outfile:
+                writer = csv.writer(node_outfile, delimiter='\t')
+                writer.writerow(('date', 'cluster_id'))
+                writer.writerows((date, -1) for date in prev_dates)
+                writer.writerow((graph_date, clid))
+        else:
+            with open(node_outfilepath, 'a') as node_outfile:
+                writer = csv.writer(node_outfile, delimiter='\t')
+                writer.writerow((graph_date, clid))
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    matrix, dates = load_matrix(args.matrix)
+    vertices = load_vertices(args.vertices)
+    logger.info('Loaded matrix with {} nodes and {} dates'
+                .format(matrix.shape[0], matrix.shape[1]))
+
+    export_node_files(matrix, dates, vertices, args.output_dir,
+                      shard_size=args.shard_size)
+
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+On-disk cache of the metrics computed by centrality_metrics.py.
+
+Entries are content addressed: the key of an entry is the hash of the graph
+(its edges and the names of its vertices), of the metric and of the
+parameters that affect it, so that a metric of a snapshot is reused whatever
+the name of the input file or of the output, and whether the snapshot is read
+from an edge list or from a snapshot store. Each entry is an uncompressed
+.npz file with the raw vectors of the metric (rankings are not cached). When
+the total size of the cache goes above its limit, the least recently used
+entries are removed.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+
+# default size limit of the cache, in bytes
+MAX_SIZE = 1024**3
+
+# parameters that affect the result of each metric
+METRIC_PARAMS = {'m': ('directed', 'community_backend', 'resolution',
+                       'community_iterations', 'seed'),
+                 'd': ('directed',),
+                 'r': ('directed',),
+                 'b': ('directed', 'betweenness_directed',
+                       'betweenness_cutoff', 'betweenness_samples'),
+                 'c': ('directed', 'closeness_mode', 'closeness_samples',
+                       'harmonic_closeness'),
+                 'k': ('directed', 'coreness_mode'),
+                 'l': ('base_node',),
+                 }
+
+# the approximate metrics also depend on the sample (seed) and on how it is
+# split in batches (jobs)
+SAMPLES_PARAM = {'b': 'betweenness_samples',
+                 'c': 'closeness_samples',
+                 }
+
+NAMES_ARRAY = '_names'
+
+
+def graph_digest(g):
+    digest = hashlib.sha256()
+    digest.update('{} {}\n'.format(g.vcount(), g.ecount()).encode('utf-8'))
+    digest.update(np.array(g.get_edgelist(), dtype=np.int64).tobytes())
+    if 'name' in g.vertex_attributes():
+        digest.update('\n'.join(str(name) for name in g.vs['name'])
+                      .encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def metric_key(digest, metric, params):
+    key_params = dict((name, params.get(name))
+                      for name in METRIC_PARAMS[metric])
+
+    samples_param = SAMPLES_PARAM.get(metric)
+    if samples_param is not None and params.get(samples_param) is not None:
+        key_params['seed'] = params.get('seed')
+        key_params['jobs'] = params.get('jobs')
+
+    if 'base_node' in key_params:
+        base_nodes = key_params['base_node']
+        if not isinstance(base_nodes, (list, tuple)):
+            base_nodes = [base_nodes]
+        key_params['base_node'] = [str(node) for node in base_nodes]
+
+    key = json.dumps([digest, metric, key_params], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class MetricCache(object):
+    """Cache of the vectors of the metrics, stored in a directory.
+
+    get() and put() take the key returned by metric_key(), the vectors are a
+    list of (name, values) pairs. The number of hits and misses is counted in
+    the hits and misses attributes.
+    """
+
+    def __init__(self, path, max_size=MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, '{}.npz'.format(key))
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            self.misses += 1
+            return None
+
+        with np.load(entry_path) as entry:
+            names = entry[NAMES_ARRAY].tolist()
+            vectors = [(name, entry['v{}'.format(i)])
+                       for i, name in enumerate(names)]
+
+        # mark the entry as recently used
+        os.utime(entry_path)
+        self.hits += 1
+
+        return vectors
+
+    def put(self, key, vectors):
+        arrays = dict(('v{}'.format(i), np.asarray(values))
+                      for i, (_, values) in enumerate(vectors))
+        arrays[NAMES_ARRAY] = np.array([name for name, _ in vectors])
+
+        # write to a temporary file first, so that a concurrent reader never
+        # sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            np.savez(tmp_file, **arrays)
+        os.replace(tmp_path, self._entry_path(key))
+
+        self.evict()
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.path)
+                   if entry.name.endswith('.npz'))
+
+    # remove the least recently used entries until the cache is within its
+    # size limit
+    def evict(self):
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                   for entry in os.scandir(self.path)
+                   if entry.name.endswith('.npz')]
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_size:
+                break
+
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,15 +1,37 @@
 #!/usr/bin/env python
 """
-usage: cluster_timeline.py [-h] <evolution_dictionary>
+usage: node_timeline.py [-h] [--matrix MATRIX] [--vertices VERTICES]
+                        [--windows WINDOWS] [--shard-size SHARD_SIZE]
+                        [--report REPORT] [--profile PROFILE]
+                        [<node_evolution> [<node_evolution> ...]]
 
-Calculate Louvain clusters on a graph, given as an edge list
+Create a timeline for each node
 
 positional arguments:
-  <network>   A file with the specification of the network as an edge list
+  <node_evolution>      A file with node evolution
 
 optional arguments:
-  -h, --help  show this help message and exit
-
+  -h, --help            show this help message and exit
+  --matrix MATRIX       Read the evolution of all the nodes from a membership
+                        matrix (see membership_matrix.py) instead of the node
+                        files
+  --vertices VERTICES   With --matrix, the global index of vertices
+                        [default: data/vertex.json]
+  --windows WINDOWS     Comma-separated lengths (number of snapshots) of the
+                        stable periods, one column is written for each
+                        [default: 6]
+  --shard-size SHARD_SIZE
+                        With --matrix, number of rows of the matrix processed
+                        at once [default: 10000]
+  --report REPORT       Write the time, memory and item counts of each stage
+                        (load, timeline, write) to this file, as JSON or as
+                        CSV (according to its extension)
+  --profile PROFILE     Comma-separated stages to run under cProfile (or
+                        "all"), the profiles are written to data/profiles
+
+With --matrix the statistics of all the nodes are computed with array
+operations, shard_size nodes at a time. The pages are written with the same
+names as the ones derived from the node files.
 """
 
 import os
@@ -18,7 +40,12 @@ import json
 import argparse
 import logging
 import collections
-from itertools import tee
+from itertools import tee, groupby
+import numpy as np
+
+from membership_matrix import (VERTEX_FILE, SHARD_SIZE, get_valid_filename,
+                               load_matrix, load_vertices)
+from instrumentation import Instrumentation, add_instrumentation_args
 
 ########## logging
 # create logger with 'spam_application'
@@ -43,14 +70,41 @@ logger.addHandler(fh)
 logger.addHandler(ch)
 ##########
 
+# default number of consecutive snapshots in the same cluster for a period
+# to be stable
+STABLE_WINDOW = 6
+
+EVO_PATH = os.path.join('data', 'nodes-evolution.timeline.csv')
+
 
 def get_args():
     description=('Create a timeline for each node')
     parser = argparse.ArgumentParser(description=description)
-    parser.add_argument('evonodes', metavar='<node_evolution>', nargs='+',
+    parser.add_argument('evonodes', metavar='<node_evolution>', nargs='*',
                         help='A file with node evolution')
+    parser.add_argument('--matrix',
+                        help='Read the evolution of all the nodes from a '
+                             'membership matrix (see membership_matrix.py) '
+                             'instead of the node files')
+    parser.add_argument('--vertices', default=VERTEX_FILE,
+                        help='With --matrix, the global index of vertices '
+                             '[default: {}]'.format(VERTEX_FILE))
+    parser.add_argument('--windows', default=str(STABLE_WINDOW),
+                        help='Comma-separated lengths (number of snapshots) '
+                             'of the stable periods, one column is written '
+                             'for each [default: {}]'.format(STABLE_WINDOW))
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                        help='With --matrix, number of rows of the matrix '
+                             'processed at once [default: {}]'
+                             .format(SHARD_SIZE))
+    add_instrumentation_args(parser)
 
     args = parser.parse_args()
+    args.windows = [int(window) for window in args.windows.split(',')]
+
+    if args.matrix is None and not args.evonodes:
+        parser.error('either <node_evolution> or --matrix is required')
+
     return args
 
 # https://docs.python.org/3/library/itertools.html
@@ -60,105 +114,163 @@ def pairwise(iterable):
     next(b, None)
     return zip(a, b)
 
-# https://docs.python.org/3/library/itertools.html
-def sextuples(iterable):
-    "s -> (s0,s1), (s1,s2), (s2, s3), ..."
-    it1, it2, it3, it4, it5, it6 = tee(iterable, 6)
+# page name as derived from the name of its node file
+def page_name(vname):
+    return (get_valid_filename('node_evolution_{}.csv'.format(vname))
+            .replace('node_evolution_','')
+            .replace('.csv','')
+            )
 
-    next(it2, None)
-    next(it3, None)
-    next(it4, None)
-    next(it5, None)
-    next(it6, None)
 
-    next(it3, None)
-    next(it4, None)
-    next(it5, None)
-    next(it6, None)
+# name of the column of the stable periods of each window, with the default
+# window alone the column keeps its original name
+def stable_columns(windows):
+    if windows == [STABLE_WINDOW]:
+        return ['stable_changes_of_cluster']
 
-    next(it4, None)
-    next(it5, None)
-    next(it6, None)
+    return ['stable_changes_of_cluster_{}'.format(window)
+            for window in windows]
 
-    next(it5, None)
-    next(it6, None)
 
-    next(it6, None)
+def header(windows):
+    return (['page', 'different_clusters', 'changes_of_cluster'] +
+            stable_columns(windows))
 
-    return zip(it1, it2, it3, it4, it5, it6)
 
+# number of stable periods (i.e. runs of at least window consecutive
+# snapshots in the same cluster) for each window, given the lengths of the
+# runs of a node
+def count_stable(run_lengths, windows):
+    return [sum(1 for length in run_lengths if length >= window)
+            for window in windows]
 
-def all_equal(lst):
-    return not lst or lst.count(lst[0]) == len(lst)
 
+# Statistics of a shard of the membership matrix, one row per node: the
+# number of different clusters (-1, i.e. not in the snapshot, counts as a
+# cluster, as in the node files), the number of changes of cluster between
+# consecutive snapshots and the number of stable periods for each window.
+# The runs of consecutive snapshots in the same cluster are found once and
+# reused for all the windows.
+def shard_timeline(shard, windows=(STABLE_WINDOW,)):
+    nrows, ndates = shard.shape
+    if ndates == 0:
+        zeros = np.zeros(nrows, dtype=np.int64)
+        return zeros, zeros, [zeros for _ in windows]
 
-def main():
-    args = get_args()
-    logger.info('Start')
+    ordered = np.sort(shard, axis=1)
+    ndiff_cl = (ordered[:, 1:] != ordered[:, :-1]).sum(axis=1) + 1
 
+    # start of each run, in the shard flattened row by row
+    starts = np.ones((nrows, ndates), dtype=bool)
+    starts[:, 1:] = shard[:, 1:] != shard[:, :-1]
+    run_starts = np.nonzero(starts.ravel())[0]
+    run_lengths = np.diff(np.append(run_starts, nrows*ndates))
+    run_rows = run_starts // ndates
 
-    nodes_evolution = dict()
-    for evonode in args.evonodes:
-        node = (os.path.basename(evonode)
-                       .replace('node_evolution_','')
-                       .replace('.csv','')
-                       )
-        node_data = {'different_clusters': 0,
-                     'changes_of_cluster': 0,
-                     'stable_changes_of_cluster': 0,
-                     }
-        nodes_evolution[node] = node_data
+    nchanges_cl = np.bincount(run_rows, minlength=nrows) - 1
 
-        with open(evonode, 'r') as evonode_file:
-            reader = csv.reader(evonode_file, delimiter='\t')
+    stable = [np.bincount(run_rows[run_lengths >= window], minlength=nrows)
+              for window in windows]
 
-            next(reader)
+    return ndiff_cl, nchanges_cl, stable
 
-            cl_nodes = collections.OrderedDict([r for r in reader])
 
-        dates = cl_nodes.keys()
+def matrix_timeline(args, instr):
+    with instr.stage('load') as stage:
+        matrix, dates = load_matrix(args.matrix)
+        vertices = load_vertices(args.vertices)
+        stage.count(nodes=matrix.shape[0], snapshots=matrix.shape[1])
+    logger.info('Loaded matrix with {} nodes and {} dates'
+                .format(matrix.shape[0], matrix.shape[1]))
 
-        count_diff_cl = collections.Counter(cl_nodes.values())
-        ndiff_cl = len(count_diff_cl)
+    # the statistics of each shard are written as soon as they are computed,
+    # so there is no separate write stage
+    with instr.stage('timeline', nodes=matrix.shape[0], files=1), \
+            open(EVO_PATH, 'w+') as evo_file:
+        writer = csv.writer(evo_file, delimiter=',')
+        writer.writerow(header(args.windows))
 
-        nchanges_cl = 0
-        for e1, e2 in pairwise(cl_nodes.values()):
-            if e1 != e2:
-                nchanges_cl += 1
+        for start in range(0, matrix.shape[0], args.shard_size):
+            logger.debug('Processing nodes {}-{}...'
+                         .format(start, start+args.shard_size-1))
+            shard = np.asarray(matrix[start:start+args.shard_size])
 
-        stable_period = False
-        count_stable = 0
-        for sels in sextuples(cl_nodes.values()):
-            if all_equal(sels):
-              if not stable_period:
-                count_stable += 1
-                stable_period = True
-            else:
-                stable_period = False
+            ndiff_cl, nchanges_cl, stable = shard_timeline(shard,
+                                                           args.windows)
+            writer.writerows(zip((page_name(vname) for vname in
+                                  vertices[start:start+len(shard)]),
+                                 ndiff_cl.tolist(),
+                                 nchanges_cl.tolist(),
+                                 *[count.tolist() for count in stable]))
 
-        nodes_evolution[node]['different_clusters'] = ndiff_cl
-        nodes_evolution[node]['changes_of_cluster'] = nchanges_cl
-        nodes_evolution[node]['stable_changes_of_cluster'] = count_stable
 
-    evo_path = os.path.join('data', 'nodes-evolution.timeline.csv')
-    with open(evo_path, 'w+') as evo_file:
-        writer = csv.writer(evo_file, delimiter=',')
-        writer.writerow(
-            ('page',
-             'different_clusters',
-             'changes_of_cluster',
-             'stable_changes_of_cluster',
-             )
-            )
-        for node in nodes_evolution:
-            writer.writerow(
-                (node,
-                 nodes_evolution[node]['different_clusters'],
-                 nodes_evolution[node]['changes_of_cluster'],
-                 nodes_evolution[node]['stable_changes_of_cluster'],
-                 )
-                )
+def main():
+    args = get_args()
+    logger.info('Start')
 
+    instr = Instrumentation.from_args('node_timeline', args, logger=logger)
+
+    if args.matrix is not None:
+        matrix_timeline(args, instr)
+        instr.write()
+        logger.info('Done!')
+        return
+
+
+    with instr.stage('timeline', nodes=len(args.evonodes)):
+        nodes_evolution = dict()
+        for evonode in args.evonodes:
+            node = (os.path.basename(evonode)
+                           .replace('node_evolution_','')
+                           .replace('.csv','')
+                           )
+            node_data = {'different_clusters': 0,
+                         'changes_of_cluster': 0,
+                         'stable_changes_of_cluster': [0]*len(args.windows),
+                         }
+            nodes_evolution[node] = node_data
+
+            with open(evonode, 'r') as evonode_file:
+                reader = csv.reader(evonode_file, delimiter='\t')
+
+                next(reader)
+
+                cl_nodes = collections.OrderedDict([r for r in reader])
+
+            dates = cl_nodes.keys()
+
+            count_diff_cl = collections.Counter(cl_nodes.values())
+            ndiff_cl = len(count_diff_cl)
+
+            nchanges_cl = 0
+            for e1, e2 in pairwise(cl_nodes.values()):
+                if e1 != e2:
+                    nchanges_cl += 1
+
+            # a stable period is a run of at least window consecutive snapshots
+            # in the same cluster, the runs are found once for all the windows
+            run_lengths = [len(list(run))
+                           for _, run in groupby(cl_nodes.values())]
+
+            nodes_evolution[node]['different_clusters'] = ndiff_cl
+            nodes_evolution[node]['changes_of_cluster'] = nchanges_cl
+            nodes_evolution[node]['stable_changes_of_cluster'] = count_stable(
+                run_lengths, args.windows)
+
+    with instr.stage('write', files=1):
+        with open(EVO_PATH, 'w+') as evo_file:
+            writer = csv.writer(evo_file, delimiter=',')
+            writer.writerow(header(args.windows))
+            for node in nodes_evolution:
+                writer.writerow(
+                    (node,
+                     nodes_evolution[node]['different_clusters'],
+                     nodes_evolution[node]['changes_of_cluster'],
+                     *nodes_evolution[node]['stable_changes_of_cluster'],
+                     )
+                    )
+
+    instr.write()
     logger.info('Done!')
 
 
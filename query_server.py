@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+"""
+usage: query_server.py [-h] [--host HOST] [--port PORT] [--store STORE]
+                       [--metrics-table METRICS_TABLE]
+                       [--cluster-index CLUSTER_INDEX]
+                       [--max-graphs MAX_GRAPHS] [--max-metrics MAX_METRICS]
+                       [metric options of centrality_metrics.py]
+
+Answer queries on the snapshots, their metrics and their clusters over HTTP
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --host HOST           Address the server listens on [default: 127.0.0.1]
+  --port PORT           Port the server listens on [default: 8765]
+  --store STORE         Snapshot store (see snapshot_store.py), metrics that
+                        are not in the metrics table are computed on its
+                        snapshots
+  --metrics-table METRICS_TABLE
+                        Table written by temporal_metrics.py
+  --cluster-index CLUSTER_INDEX
+                        Index written by cluster_index.py
+  --max-graphs MAX_GRAPHS
+                        Number of snapshot graphs kept in memory
+                        [default: 4]
+  --max-metrics MAX_METRICS
+                        Number of computed (date, metric) results kept in
+                        memory [default: 64]
+
+The options of the metrics (--directed, --closeness-mode, ...) are the same
+as in centrality_metrics.py and apply to the metrics computed by the server.
+
+Requests (GET, the answers are JSON objects):
+  /page?name=<page>[&columns=<c1>,<c2>][&start=<date>][&end=<date>]
+        values of the columns of the metrics table for a page at each date
+  /page?name=<page>&metric=<m>[&start=<date>][&end=<date>]
+        the same for a metric (one of 'mdrbckl') computed on the store
+  /top?date=<date>&column=<column>[&k=10]
+        the k pages with the highest value of a column at a date, from the
+        metrics table
+  /top?date=<date>&metric=<m>[&column=<column>][&k=10]
+        the same for a metric computed on the store
+  /clusters?name=<page>[&start=<date>][&end=<date>]
+        evolved cluster of a page at each date, from the cluster index
+  /members?date=<date>&cluster=<cluster>
+        pages in an evolved cluster at a date, from the cluster index
+  /stats
+        number of requests and latency of the server
+
+Requests are served concurrently, one thread per request. The latency of each
+request is logged and returned in the X-Elapsed-Ms header. Errors are
+answered with {"error": <message>} and status 400 (invalid request), 404
+(unknown page, date, metric column, ...) or 500 (any other error, logged with
+its traceback).
+"""
+
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+import collections
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from snapshot_store import SnapshotStore
+from centrality_metrics import (METRICS, metric_vectors, add_metric_args,
+                                check_metric_args)
+from temporal_metrics import (VERTEX_FILE, load_table, metric_params,
+                              snapshot_params)
+from membership_matrix import load_vertices
+from cluster_index import ClusterIndex
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+HOST = '127.0.0.1'
+PORT = 8765
+MAX_GRAPHS = 4
+MAX_METRICS = 64
+TOP_K = 10
+
+
+def get_args():
+    description=('Answer queries on the snapshots, their metrics and their '
+                 'clusters over HTTP')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--host', default=HOST,
+                        help='Address the server listens on '
+                             '[default: {}]'.format(HOST))
+    parser.add_argument('--port', type=int, default=PORT,
+                        help='Port the server listens on '
+                             '[default: {}]'.format(PORT))
+    parser.add_argument('--store',
+                        help='Snapshot store (see snapshot_store.py), '
+                             'metrics that are not in the metrics table are '
+                             'computed on its snapshots')
+    parser.add_argument('--metrics-table',
+                        help='Table written by temporal_metrics.py')
+    parser.add_argument('--cluster-index',
+                        help='Index written by cluster_index.py')
+    parser.add_argument('--max-graphs', type=int, default=MAX_GRAPHS,
+                        help='Number of snapshot graphs kept in memory '
+                             '[default: {}]'.format(MAX_GRAPHS))
+    parser.add_argument('--max-metrics', type=int, default=MAX_METRICS,
+                        help='Number of computed (date, metric) results kept '
+                             'in memory [default: {}]'.format(MAX_METRICS))
+    add_metric_args(parser)
+
+    args = parser.parse_args()
+    check_metric_args(parser, args)
+    return args
+
+
+class QueryError(Exception):
+    """A request that can not be answered, with its HTTP status."""
+
+    def __init__(self, message, status=400):
+        super(QueryError, self).__init__(message)
+        self.status = status
+
+
+class LRUCache(object):
+    """Thread-safe cache of at most maxsize values, the least recently used
+    values are dropped first.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._values = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # the value of key, computed with compute() if it is not in the cache.
+    # Values are computed outside of the lock, so that requests for
+    # different keys do not wait for each other.
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+
+        value = compute()
+
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+        return value
+
+
+class LatencyStats(object):
+    """Number of requests and their latency, for each path."""
+
+    def __init__(self):
+        self._latencies = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, path, elapsed):
+        with self._lock:
+            self._latencies[path].append(elapsed)
+
+    def summary(self):
+        with self._lock:
+            latencies = dict((path, np.array(values))
+                             for path, values in self._latencies.items())
+
+        return dict((path, {'requests': len(values),
+                            'mean_ms': float(values.mean()),
+                            'p50_ms': float(np.percentile(values, 50)),
+                            'p99_ms': float(np.percentile(values, 99)),
+                            'max_ms': float(values.max()),
+                            })
+                    for path, values in latencies.items())
+
+
+# NaN is not valid JSON
+def json_value(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class QueryEngine(object):
+    """The resources loaded by the server and the answers to the queries."""
+
+    def __init__(self, args):
+        self.store = None
+        if args.store is not None:
+            self.store = SnapshotStore(args.store)
+            logger.info('Loaded snapshot store with {} snapshots'
+                        .format(len(self.store.dates)))
+
+        self.table = None
+        if args.metrics_table is not None:
+            self.table, self.table_dates = load_table(args.metrics_table)
+            vertices = load_vertices(os.path.join(args.metrics_table,
+                                                  VERTEX_FILE))
+            self.table_vids = dict((vname, vid)
+                                   for vid, vname in enumerate(vertices))
+            self.table_vertices = vertices
+            logger.info('Loaded metrics table with columns {}'
+                        .format(', '.join(self.table)))
+
+        self.index = None
+        if args.cluster_index is not None:
+            self.index = ClusterIndex(args.cluster_index)
+            logger.info('Loaded cluster index with {} dates'
+                        .format(len(self.index.dates)))
+
+        self.params = metric_params(args)
+        self.graphs = LRUCache(args.max_graphs)
+        self.metrics = LRUCache(args.max_metrics)
+        self.stats = LatencyStats()
+
+    def _require(self, resource, option):
+        if resource is None:
+            raise QueryError('the server was started without {}'
+                             .format(option), status=404)
+
+    def graph(self, date):
+        self._require(self.store, '--store')
+
+        def load():
+            try:
+                return self.store.graph(date,
+                                        directed=self.params['directed'])
+            except KeyError:
+                raise QueryError('unknown date: {}'.format(date), status=404)
+
+        return self.graphs.get(date, load)
+
+    # the vectors of a metric computed on a snapshot, as a dict
+    # column -> values, and the local ids of the vertices of the snapshot
+    def snapshot_metric(self, date, metric):
+        if metric not in METRICS:
+            raise QueryError('unknown metric: {}'.format(metric))
+
+        def compute():
+            g = self.graph(date)
+            start = time.time()
+            vectors = metric_vectors(g, metric, snapshot_params(self.params,
+                                                                g))
+            logger.info("metric '{}' of {} computed in {:.3f}s"
+                        .format(metric, date, time.time() - start))
+
+            names = g.vs['name']
+            vids = dict((vname, vid) for vid, vname in enumerate(names))
+            return (dict((name, np.asarray(values, dtype=float))
+                         for name, values in vectors), names, vids)
+
+        return self.metrics.get((date, metric), compute)
+
+    def _dates(self, dates, query):
+        start, end = query.get('start'), query.get('end')
+        return [date for date in dates
+                if (start is None or date >= start) and
+                   (end is None or date <= end)]
+
+    def page(self, query):
+        name = required(query, 'name')
+
+        if 'metric' in query:
+            self._require(self.store, '--store')
+            result = dict()
+            for date in self._dates(self.store.dates, query):
+                vectors, _, vids = self.snapshot_metric(date, query['metric'])
+                if name in vids:
+                    result[date] = dict(
+                        (column, json_value(float(values[vids[name]])))
+                        for column, values in vectors.items())
+            return result
+
+        self._require(self.table, '--metrics-table')
+        if name not in self.table_vids:
+            raise QueryError('unknown page: {}'.format(name), status=404)
+        vid = self.table_vids[name]
+
+        columns = (query['columns'].split(',') if 'columns' in query
+                   else list(self.table))
+        for column in columns:
+            if column not in self.table:
+                raise QueryError('unknown column: {}'.format(column))
+
+        result = dict()
+        for col, date in enumerate(self.table_dates):
+            if date not in self._dates([date], query):
+                continue
+
+            values = dict((column, json_value(float(self.table[column][vid,
+                                                                       col])))
+                          for column in columns)
+            if any(value is not None for value in values.values()):
+                result[date] = values
+
+        return result
+
+    def top(self, query):
+        date = required(query, 'date')
+        k = int(query.get('k', TOP_K))
+        if k < 1:
+            raise QueryError('k must be at least 1: {}'.format(k))
+
+        if 'metric' in query:
+            vectors, names, _ = self.snapshot_metric(date, query['metric'])
+            column = query.get('column', next(iter(vectors)))
+            if column not in vectors:
+                raise QueryError('unknown column: {}'.format(column))
+            values = vectors[column]
+        else:
+            self._require(self.table, '--metrics-table')
+            column = required(query, 'column')
+            if column not in self.table:
+                raise QueryError('unknown column: {}'.format(column))
+            if date not in self.table_dates:
+                raise QueryError('unknown date: {}'.format(date), status=404)
+            values = np.asarray(self.table[column][:,
+                                self.table_dates.index(date)])
+            names = self.table_vertices
+
+        # the top k values without sorting the whole column
+        valid = np.nonzero(~np.isnan(values))[0]
+        if len(valid) > k:
+            top = np.argpartition(-values[valid], k-1)[:k]
+            valid = valid[top]
+        valid = valid[np.argsort(-values[valid], kind='stable')]
+
+        return [{'page': names[vid], column: float(values[vid])}
+                for vid in valid.tolist()]
+
+    def clusters(self, query):
+        self._require(self.index, '--cluster-index')
+        name = required(query, 'name')
+        if name not in self.index:
+            raise QueryError('unknown page: {}'.format(name), status=404)
+
+        return dict(self.index.page_clusters(name, query.get('start'),
+                                             query.get('end')))
+
+    def members(self, query):
+        self._require(self.index, '--cluster-index')
+        date = required(query, 'date')
+        if date not in self.index.dates:
+            raise QueryError('unknown date: {}'.format(date), status=404)
+
+        cluster = int(required(query, 'cluster'))
+        return self.index.names(self.index.members(date, cluster))
+
+
+def required(query, name):
+    if name not in query:
+        raise QueryError('missing parameter: {}'.format(name))
+    return query[name]
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    # set by main()
+    engine = None
+
+    def do_GET(self):
+        start = time.time()
+
+        url = urlparse(self.path)
+        query = dict((key, values[-1])
+                     for key, values in parse_qs(url.query).items())
+
+        routes = {'/page': self.engine.page,
+                  '/top': self.engine.top,
+                  '/clusters': self.engine.clusters,
+                  '/members': self.engine.members,
+                  '/stats': lambda query: self.engine.stats.summary(),
+                  }
+
+        status = 200
+        try:
+            if url.path not in routes:
+                raise QueryError('unknown request: {}'.format(url.path),
+                                 status=404)
+            result = routes[url.path](query)
+        except QueryError as err:
+            status, result = err.status, {'error': str(err)}
+        except ValueError as err:
+            status, result = 400, {'error': str(err)}
+        except Exception as err:
+            logger.exception('Error answering {}'.format(self.path))
+            status, result = 500, {'error': 'internal error: {}'
+                                            .format(repr(err))}
+
+        body = json.dumps(result).encode('utf-8')
+        elapsed = 1000*(time.time() - start)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Elapsed-Ms', '{:.3f}'.format(elapsed))
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.engine.stats.add(url.path, elapsed)
+        logger.info('{} {} {:.3f}ms'.format(status, self.path, elapsed))
+
+    # requests are logged by do_GET()
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    QueryHandler.engine = QueryEngine(args)
+
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    logger.info('Listening on http://{}:{}/'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Rank the vertices according to the value of a metric.
+
+Higher values get better (i.e. lower) ranks, starting from 1. The values are
+either a vector with one value per vertex or a matrix with one column per
+snapshot (e.g. a node x date matrix of temporal_metrics.py), in which case
+each column is ranked on its own. NaN values (e.g. vertices that are not in a
+snapshot) are not ranked and get rank 0.
+
+Ties are handled according to method:
+  * 'min': competition ranking, tied vertices get the best of their ranks
+    (1, 2, 2, 4);
+  * 'dense': tied vertices get the same rank, without gaps (1, 2, 2, 3);
+  * 'fractional': tied vertices get the mean of their ranks (1, 2.5, 2.5, 4),
+    unranked vertices get NaN.
+
+Values of floating-point metrics are considered tied if they differ by less
+than atol + rtol * |value| from the next value in the order. Ties are chained,
+so with a tolerance a group of tied values can span more than the tolerance.
+"""
+
+import numpy as np
+
+
+METHODS = ('min', 'dense', 'fractional')
+
+
+def rank_dtype(method):
+    if method == 'fractional':
+        return np.float64
+    return np.int32
+
+
+# Rank the columns of the matrix x, that has no NaN values
+def _rank_columns(x, method, rtol, atol):
+    n = x.shape[0]
+
+    order = np.argsort(-x, axis=0, kind='stable')
+    ordered = np.take_along_axis(x, order, axis=0)
+
+    # first position of each group of tied values
+    start = np.ones(x.shape, dtype=bool)
+    if n > 1:
+        diff = ordered[:-1] - ordered[1:]
+        start[1:] = diff > atol + rtol * np.abs(ordered[1:])
+
+    positions = np.broadcast_to(np.arange(1, n+1)[:, np.newaxis], x.shape)
+
+    if method == 'dense':
+        ordered_ranks = np.cumsum(start, axis=0)
+    else:
+        ordered_ranks = np.maximum.accumulate(np.where(start, positions, 0),
+                                              axis=0)
+
+        if method == 'fractional':
+            # last position of each group of tied values
+            end = np.ones(x.shape, dtype=bool)
+            end[:-1] = start[1:]
+            last = np.minimum.accumulate(
+                np.where(end, positions, n)[::-1], axis=0)[::-1]
+            ordered_ranks = (ordered_ranks + last) / 2.0
+
+    ranks = np.empty(x.shape, dtype=rank_dtype(method))
+    np.put_along_axis(ranks, order, ordered_ranks, axis=0)
+
+    return ranks
+
+
+def _unranked(method):
+    if method == 'fractional':
+        return np.nan
+    return 0
+
+
+# Indices of the top k values of col (without NaN values) and of the values
+# tied with the k-th one, found without sorting the whole column
+def _top_candidates(col, k, rtol, atol):
+    valid = np.nonzero(~np.isnan(col))[0]
+    if len(valid) <= k:
+        return valid
+
+    kth = np.partition(col[valid], len(valid)-k)[len(valid)-k]
+    threshold = kth - (atol + rtol * abs(kth))
+
+    return valid[col[valid] >= threshold]
+
+
+def rank(values, method='min', top_k=None, rtol=0.0, atol=0.0):
+    """Rank the rows of values (a vector or a matrix), column by column.
+
+    With top_k only the vertices with the top_k highest values (and the ones
+    tied with the last of them) are ranked, the other ones are left unranked.
+    Returns an int32 array with the shape of values (float64 with
+    'fractional').
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown ranking method: {}'.format(method))
+
+    values = np.asarray(values, dtype=np.float64)
+    x = values.reshape(values.shape[0], int(np.prod(values.shape[1:])))
+
+    nan = np.isnan(x)
+    if top_k is None and not nan.any():
+        return _rank_columns(x, method, rtol, atol).reshape(values.shape)
+
+    ranks = np.full(x.shape, _unranked(method), dtype=rank_dtype(method))
+    for j in range(x.shape[1]):
+        col = x[:, j]
+        if top_k is None:
+            selected = np.nonzero(~nan[:, j])[0]
+        else:
+            selected = _top_candidates(col, top_k, rtol, atol)
+
+        ranks[selected, j] = _rank_columns(x[selected, j:j+1], method,
+                                           rtol, atol)[:, 0]
+
+    return ranks.reshape(values.shape)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+"""
+usage: snapshot_store.py [-h] [--store STORE] [--clean] [--collapse-direction]
+                         [--max-edges MAX_EDGES]
+                         <network> [<network> ...]
+
+Ingest a series of edge lists into a binary, memory-mappable snapshot store
+
+positional arguments:
+  <network>      A file with the specification of the network as an edge list
+
+optional arguments:
+  -h, --help     show this help message and exit
+  --store STORE  Directory where the snapshot store is written
+                 [default: data/snapshots]
+  --clean        Remove self-loops and duplicate edges from each snapshot
+  --collapse-direction
+                 With --clean, also consider an edge and its reverse as
+                 duplicates
+  --max-edges MAX_EDGES
+                 Snapshots with more edges than this are cleaned in
+                 partitions on disk [default: 50000000]
+
+The store is a directory with:
+  * vertices.bin, vertices.idx.npy: the global vertex table, i.e. the
+    UTF-8 encoded vertex names (sorted) concatenated together and the
+    offsets of each name in the blob;
+  * src.npy, dst.npy: the int32 global ids of the endpoints of the edges
+    of all the snapshots, one snapshot after the other;
+  * offsets.npy: for each snapshot, the offset of its first edge in
+    src.npy/dst.npy (the last element is the total number of edges);
+  * dates.json: the date of each snapshot;
+  * cleaning.json: with --clean, the number of self-loops and duplicate
+    edges dropped from each snapshot.
+
+With --clean the edges of each snapshot are sorted by (source, target) and,
+with --collapse-direction, the smaller id of each edge is the source.
+"""
+
+import os
+import csv
+import json
+import argparse
+import itertools
+import tempfile
+import logging
+import igraph as ig
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+DEFAULT_STORE = os.path.join('data', 'snapshots')
+
+VERTICES_FILE = 'vertices.bin'
+VERTICES_IDX_FILE = 'vertices.idx.npy'
+SRC_FILE = 'src.npy'
+DST_FILE = 'dst.npy'
+OFFSETS_FILE = 'offsets.npy'
+DATES_FILE = 'dates.json'
+CLEANING_FILE = 'cleaning.json'
+
+# number of edges translated to ids at a time
+CHUNK_SIZE = 1000000
+
+# largest snapshot (number of edges) cleaned in memory
+MAX_EDGES = 50000000
+
+
+def get_args():
+    description=('Ingest a series of edge lists into a binary, '
+                 'memory-mappable snapshot store')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('networks', metavar='<network>', nargs='+',
+                        help='A file with the specification of the network '
+                             'as an edge list')
+    parser.add_argument('--store', default=DEFAULT_STORE,
+                        help='Directory where the snapshot store is written '
+                             '[default: {}]'.format(DEFAULT_STORE))
+    parser.add_argument('--clean', action='store_true',
+                        help='Remove self-loops and duplicate edges from '
+                             'each snapshot')
+    parser.add_argument('--collapse-direction', action='store_true',
+                        help='With --clean, also consider an edge and its '
+                             'reverse as duplicates')
+    parser.add_argument('--max-edges', type=int, default=MAX_EDGES,
+                        help='Snapshots with more edges than this are '
+                             'cleaned in partitions on disk '
+                             '[default: {}]'.format(MAX_EDGES))
+
+    args = parser.parse_args()
+    return args
+
+
+# the date of a snapshot is encoded in its filename, e.g.
+# enwiki.wikilink_graph.2010-03-01.csv
+def snapshot_date(network):
+    basefilename = os.path.basename(network)
+    return basefilename.split('.')[-2]
+
+
+# iterate over the (source, target) pairs of an edge list, skipping the
+# header
+def read_edges(network):
+    with open(network, 'r') as infile:
+        reader = csv.reader(infile, delimiter='\t')
+
+        # skip header
+        next(reader, None)
+
+        for edge in reader:
+            yield edge[0], edge[1]
+
+
+# translate an edge list to global ids, chunk_size edges at a time
+def read_id_chunks(network, vtoid, chunk_size=CHUNK_SIZE):
+    edges = read_edges(network)
+    while True:
+        ids = np.fromiter((vtoid[vname]
+                           for edge in itertools.islice(edges, chunk_size)
+                           for vname in edge),
+                          dtype=np.int32)
+        if len(ids) == 0:
+            break
+
+        yield ids[0::2], ids[1::2]
+
+
+# Pack each edge in a int64 key, (src << 32) | dst, dropping self-loops. With
+# collapse an edge and its reverse have the same key, the smaller id first.
+def edge_keys(src, dst, collapse=False, stats=None):
+    loops = src == dst
+    if stats is not None:
+        stats['self_loops'] += int(loops.sum())
+    src, dst = src[~loops], dst[~loops]
+
+    if collapse:
+        src, dst = np.minimum(src, dst), np.maximum(src, dst)
+
+    return (src.astype(np.int64) << 32) | dst.astype(np.int64)
+
+
+def unique_edges(keys, stats=None):
+    unique = np.unique(keys)
+    if stats is not None:
+        stats['duplicates'] += len(keys) - len(unique)
+
+    return ((unique >> 32).astype(np.int32),
+            (unique & 0xffffffff).astype(np.int32))
+
+
+# Remove self-loops and duplicate edges from the chunks of a snapshot, with
+# nedges edges over nvertices vertices. Snapshots with up to max_edges edges
+# are cleaned in memory; larger ones are partitioned on disk (in tmp_dir) by
+# the range of the first id of the keys, so that each partition fits in
+# memory and can be deduplicated on its own. Yields the edges sorted by key,
+# the number of dropped edges is counted in stats.
+def clean_edges(chunks, nedges, nvertices, collapse=False,
+                max_edges=MAX_EDGES, tmp_dir=None, stats=None):
+    if stats is None:
+        stats = dict()
+    stats['self_loops'] = 0
+    stats['duplicates'] = 0
+
+    npartitions = int(-(-nedges // max_edges))
+    if npartitions <= 1:
+        keys = [edge_keys(chunk_src, chunk_dst, collapse, stats)
+                for chunk_src, chunk_dst in chunks]
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        yield unique_edges(keys, stats)
+        return
+
+    logger.debug('Cleaning {} edges in {} partitions on disk'
+                 .format(nedges, npartitions))
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as partdir:
+        paths = [os.path.join(partdir, 'part{}.bin'.format(p))
+                 for p in range(npartitions)]
+
+        partfiles = [open(path, 'wb') for path in paths]
+        try:
+            for chunk_src, chunk_dst in chunks:
+                keys = edge_keys(chunk_src, chunk_dst, collapse, stats)
+                parts = (keys >> 32) * npartitions // max(nvertices, 1)
+                for p, partfile in enumerate(partfiles):
+                    keys[parts == p].tofile(partfile)
+        finally:
+            for partfile in partfiles:
+                partfile.close()
+
+        for path in paths:
+            yield unique_edges(np.fromfile(path, dtype=np.int64), stats)
+
+
+# truncate a 1-dimensional .npy file to its first size elements
+def shrink_array(path, size):
+    old = np.load(path, mmap_mode='r')
+
+    tmp_path = '{}.tmp'.format(path)
+    new = open_memmap(tmp_path, mode='w+', dtype=old.dtype, shape=(size,))
+    for start in range(0, size, CHUNK_SIZE):
+        end = min(start+CHUNK_SIZE, size)
+        new[start:end] = old[start:end]
+    new.flush()
+    del new, old
+
+    os.replace(tmp_path, path)
+
+
+def ingest(networks, store_path, clean=False, collapse=False,
+           max_edges=MAX_EDGES):
+    networks = sorted(networks, key=snapshot_date)
+    dates = [snapshot_date(network) for network in networks]
+
+    os.makedirs(store_path, exist_ok=True)
+
+    # first pass: collect the global set of vertex names and count the
+    # edges of each snapshot, so that the edge arrays can be preallocated
+    logger.info('Collecting vertices from {} snapshots'.format(len(networks)))
+    vertices = set()
+    offsets = np.zeros(len(networks)+1, dtype=np.int64)
+    for i, network in enumerate(networks):
+        logger.debug('Scanning file {}...'.format(network))
+        nedges = 0
+        for edge in read_edges(network):
+            vertices.update(edge)
+            nedges += 1
+        offsets[i+1] = offsets[i] + nedges
+
+    vertices = sorted(vertices)
+    vtoid = dict((vname, vid) for vid, vname in enumerate(vertices))
+    logger.info('Found {} vertices and {} edges'.format(len(vertices),
+                                                        offsets[-1]))
+
+    encoded = [vname.encode('utf-8') for vname in vertices]
+    names_idx = np.zeros(len(encoded)+1, dtype=np.int64)
+    np.cumsum([len(vname) for vname in encoded], out=names_idx[1:])
+    with open(os.path.join(store_path, VERTICES_FILE), 'wb') as vfile:
+        vfile.write(b''.join(encoded))
+    np.save(os.path.join(store_path, VERTICES_IDX_FILE), names_idx)
+    del encoded, vertices
+
+    # second pass: translate each edge list to global ids, cleaning it if
+    # requested. Cleaning only drops edges, so the arrays allocated for the
+    # edges of the first pass are large enough, they are shrunk at the end.
+    src = open_memmap(os.path.join(store_path, SRC_FILE), mode='w+',
+                      dtype=np.int32, shape=(int(offsets[-1]),))
+    dst = open_memmap(os.path.join(store_path, DST_FILE), mode='w+',
+                      dtype=np.int32, shape=(int(offsets[-1]),))
+    raw_offsets = offsets
+    offsets = np.zeros_like(raw_offsets)
+    report = dict()
+    for i, network in enumerate(networks):
+        logger.debug('Ingesting file {}...'.format(network))
+        chunks = read_id_chunks(network, vtoid)
+        if clean:
+            stats = dict()
+            chunks = clean_edges(chunks, raw_offsets[i+1]-raw_offsets[i],
+                                 len(vtoid), collapse=collapse,
+                                 max_edges=max_edges, tmp_dir=store_path,
+                                 stats=stats)
+
+        pos = offsets[i]
+        for chunk_src, chunk_dst in chunks:
+            src[pos:pos+len(chunk_src)] = chunk_src
+            dst[pos:pos+len(chunk_dst)] = chunk_dst
+            pos += len(chunk_src)
+        offsets[i+1] = pos
+
+        if clean:
+            logger.info('Snapshot {}: dropped {} self-loops and {} duplicate '
+                        'edges'.format(dates[i], stats['self_loops'],
+                                       stats['duplicates']))
+            report[dates[i]] = stats
+    src.flush()
+    dst.flush()
+    del src, dst
+
+    if offsets[-1] < raw_offsets[-1]:
+        shrink_array(os.path.join(store_path, SRC_FILE), int(offsets[-1]))
+        shrink_array(os.path.join(store_path, DST_FILE), int(offsets[-1]))
+
+    if clean:
+        with open(os.path.join(store_path, CLEANING_FILE), 'w') as cleanfile:
+            json.dump(report, cleanfile)
+
+    np.save(os.path.join(store_path, OFFSETS_FILE), offsets)
+    with open(os.path.join(store_path, DATES_FILE), 'w') as datesfile:
+        json.dump(dates, datesfile)
+
+    logger.info('Snapshot store written to {}'.format(store_path))
+
+
+class SnapshotStore(object):
+    """Read-only access to a snapshot store written by ingest().
+
+    All the arrays are memory-mapped, so opening a store and extracting a
+    snapshot does not read the whole series from disk.
+    """
+
+    def __init__(self, store_path):
+        self.path = store_path
+
+        with open(os.path.join(store_path, DATES_FILE), 'r') as datesfile:
+            self.dates = json.load(datesfile)
+        self._date_index = dict((date, i)
+                                for i, date in enumerate(self.dates))
+
+        # numpy can not memory-map an empty file
+        vertices_path = os.path.join(store_path, VERTICES_FILE)
+        if os.path.getsize(vertices_path) > 0:
+            self._names = np.memmap(vertices_path, dtype=np.uint8, mode='r')
+        else:
+            self._names = np.zeros(0, dtype=np.uint8)
+        self._names_idx = self._load(VERTICES_IDX_FILE)
+        self._src = self._load(SRC_FILE)
+        self._dst = self._load(DST_FILE)
+        self._offsets = self._load(OFFSETS_FILE)
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode='r')
+
+    def vcount(self):
+        return len(self._names_idx) - 1
+
+    def name(self, vid):
+        start, end = self._names_idx[vid], self._names_idx[vid+1]
+        return self._names[start:end].tobytes().decode('utf-8')
+
+    def names(self, vids):
+        return [self.name(vid) for vid in vids]
+
+    # vertex names are sorted and UTF-8 preserves the ordering of code
+    # points, so the id of a name can be found with a binary search on the
+    # memory-mapped table
+    def vid(self, vname):
+        target = vname.encode('utf-8')
+
+        lo, hi = 0, self.vcount()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = self._names_idx[mid], self._names_idx[mid+1]
+            if self._names[start:end].tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.vcount() and self.name(lo) == vname:
+            return lo
+
+        raise KeyError(vname)
+
+    def date_range(self, start=None, end=None):
+        return [date for date in self.dates
+                if (start is None or date >= start) and
+                   (end is None or date <= end)]
+
+    def edges(self, date):
+        i = self._date_index[date]
+        start, end = self._offsets[i], self._offsets[i+1]
+        return self._src[start:end], self._dst[start:end]
+
+    def ecount(self, date):
+        i = self._date_index[date]
+        return int(self._offsets[i+1] - self._offsets[i])
+
+    # vertices of a snapshot (as global ids, sorted) and its edges
+    # translated to local ids, i.e. positions in the array of vertices
+    def snapshot(self, date):
+        src, dst = self.edges(date)
+
+        vids = np.unique(np.concatenate((src, dst)))
+        local_edges = np.empty((len(src), 2), dtype=np.int32)
+        local_edges[:,0] = np.searchsorted(vids, src)
+        local_edges[:,1] = np.searchsorted(vids, dst)
+
+        return vids, local_edges
+
+    # build the igraph graph of a snapshot, vertices are sorted by name as
+    # when the graph is built from the edge list
+    def graph(self, date, directed=False):
+        vids, local_edges = self.snapshot(date)
+
+        G = ig.Graph(n=len(vids), edges=local_edges.tolist(),
+                     directed=directed)
+        G.vs['name'] = self.names(vids)
+
+        return G
+
+
+# sorted list of the names of the vertices in all the snapshots, either the
+# edge lists in networks or the snapshots of the store between start_date and
+# end_date, without loading the graphs
+def global_index(networks=None, store_path=None, start_date=None,
+                 end_date=None):
+    if store_path is not None:
+        store = SnapshotStore(store_path)
+        in_range = np.zeros(store.vcount(), dtype=bool)
+        for graph_date in store.date_range(start_date, end_date):
+            src, dst = store.edges(graph_date)
+            in_range[src] = True
+            in_range[dst] = True
+
+        # the vertex table of the store is sorted by name
+        return store.names(np.nonzero(in_range)[0])
+
+    global_vset = set()
+    for network in networks:
+        for edge in read_edges(network):
+            global_vset.update(edge)
+
+    return sorted(global_vset)
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    ingest(args.networks, args.store, clean=args.clean,
+           collapse=args.collapse_direction, max_edges=args.max_edges)
+
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""
+usage: temporal_metrics.py [-h] [--store STORE] [--start-date START_DATE]
+                           [--end-date END_DATE] [--output-dir OUTPUT_DIR]
+                           [--jobs JOBS] [--directed] [--metrics]
+                           [metric options of centrality_metrics.py]
+                           [<network> [<network> ...]]
+
+Compute the centrality metrics of a series of snapshots into a single
+node x date table
+
+positional arguments:
+  <network>             A file with the specification of the network as an
+                        edge list
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --store STORE         Read the snapshots from a snapshot store (see
+                        snapshot_store.py) instead of the edge lists
+  --start-date START_DATE
+                        First snapshot to read from the store (YYYY-MM-DD)
+  --end-date END_DATE   Last snapshot to read from the store (YYYY-MM-DD)
+  --output-dir OUTPUT_DIR
+                        Directory where the table is written
+                        [default: data/temporal-metrics]
+  --jobs JOBS           Number of snapshots processed concurrently
+                        [default: 1]
+
+The options of the metrics (--directed, --metrics, --closeness-mode, ...) are
+the same as in centrality_metrics.py. With more than one --base-node, the
+base nodes must be given by name, since each of them has its own column.
+
+The table is stored column by column, the output directory holds:
+  * <column>.npy: one float64 matrix for each column of the output of
+    centrality_metrics.py (e.g. degree, degree_rank, betweenness, ...), with
+    one row per vertex (indexed by the global vertex id) and one column per
+    snapshot. Vertices that are not in a snapshot have value NaN;
+  * columns.json: the names of the columns, in the order of
+    centrality_metrics.py;
+  * dates.json: the date of each snapshot;
+  * vertex.json: the global index of vertices, in the same format as the
+    one written by louvain_clusters.py.
+"""
+
+import os
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+import igraph as ig
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from snapshot_store import (SnapshotStore, snapshot_date, read_edges,
+                            global_index)
+from approx_centrality import sample_size
+from centrality_metrics import (METRICS, compute_metric, add_metric_args,
+                                check_metric_args, parse_base_node,
+                                positive_int)
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+TABLE_DIR = os.path.join('data', 'temporal-metrics')
+COLUMNS_FILE = 'columns.json'
+DATES_FILE = 'dates.json'
+VERTEX_FILE = 'vertex.json'
+
+
+def get_args():
+    description=('Compute the centrality metrics of a series of snapshots '
+                 'into a single node x date table')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('networks', metavar='<network>', nargs='*',
+                        help='A file with the specification of the network '
+                             'as an edge list')
+    parser.add_argument('--store',
+                        help='Read the snapshots from a snapshot store (see '
+                             'snapshot_store.py) instead of the edge lists')
+    parser.add_argument('--start-date',
+                        help='First snapshot to read from the store '
+                             '(YYYY-MM-DD)')
+    parser.add_argument('--end-date',
+                        help='Last snapshot to read from the store '
+                             '(YYYY-MM-DD)')
+    parser.add_argument('--output-dir', default=TABLE_DIR,
+                        help='Directory where the table is written '
+                             '[default: {}]'.format(TABLE_DIR))
+    parser.add_argument('--jobs', type=positive_int, default=1,
+                        help='Number of snapshots processed concurrently '
+                             '[default: 1]')
+    add_metric_args(parser)
+
+    args = parser.parse_args()
+    check_metric_args(parser, args)
+
+    if args.store is None and not args.networks:
+        parser.error('either <network> or --store is required')
+
+    # the distance columns are named after the base nodes, the vertex with a
+    # given id is a different page in each snapshot
+    if 'l' in args.metrics and len(args.base_node) > 1 and \
+            any(parse_base_node(node)[0] == 'id' for node in args.base_node):
+        parser.error('with more than one --base-node, the base nodes of a '
+                     'series of snapshots must be given by name')
+
+    return args
+
+
+# (date, network) of each snapshot, in date order. With a store, the network
+# is the date of the snapshot.
+def snapshot_list(args):
+    if args.store is not None:
+        store = SnapshotStore(args.store)
+        return [(graph_date, graph_date)
+                for graph_date in store.date_range(args.start_date,
+                                                   args.end_date)]
+
+    return sorted(((snapshot_date(network), network)
+                   for network in args.networks))
+
+
+def read_snapshot(network, directed, store=None):
+    if store is not None:
+        return SnapshotStore(store).graph(network, directed=directed)
+
+    return ig.Graph.TupleList(read_edges(network), directed=directed)
+
+
+# parameters of the metrics given on the command line (see
+# centrality_metrics.add_metric_args())
+def metric_params(args):
+    # approximate betweenness would start its own pool inside the workers
+    params = {'directed': args.directed,
+              'betweenness_directed': args.betweenness_directed,
+              'closeness_mode': args.closeness_mode,
+              'coreness_mode': args.coreness_mode,
+              'base_node': args.base_node,
+              'betweenness_samples': args.betweenness_samples,
+              'betweenness_error': args.betweenness_error,
+              'betweenness_cutoff': args.betweenness_cutoff,
+              'jobs': 1,
+              'seed': args.seed,
+              'rank_method': args.rank_method,
+              'rank_top_k': args.rank_top_k,
+              'rank_tolerance': args.rank_tolerance,
+              'closeness_samples': args.closeness_samples,
+              'harmonic_closeness': args.harmonic_closeness,
+              'community_backend': args.community_backend,
+              'resolution': args.resolution,
+              'community_iterations': args.community_iterations,
+              }
+
+    return params
+
+
+# The parameters for a snapshot: the number of samples needed for the
+# error on betweenness depends on its size
+def snapshot_params(params, g):
+    params = dict(params)
+    if params['betweenness_error'] is not None:
+        params['betweenness_samples'] = sample_size(
+            g.vcount(), params['betweenness_error'])
+
+    return params
+
+
+# Load a snapshot and compute all the selected metrics on it. Returns the
+# names of the vertices and the columns of the metrics.
+def snapshot_metrics(task):
+    graph_date, network, store, selected, params = task
+
+    start = time.time()
+    g = read_snapshot(network, params['directed'], store=store)
+
+    params = snapshot_params(params, g)
+
+    columns = []
+    for metric in selected:
+        columns.extend(compute_metric(g, metric, params))
+
+    return graph_date, g.vs['name'], columns, time.time() - start
+
+
+def column_path(table_dir, name):
+    return os.path.join(table_dir, '{}.npy'.format(name))
+
+
+# Create the matrices of the columns on disk, with all the cells set to NaN.
+# As in membership_matrix.create_matrix() the matrices are stored in Fortran
+# order, so that they can be filled one snapshot at a time.
+def create_table(table_dir, names, nvertices, dates):
+    os.makedirs(table_dir, exist_ok=True)
+
+    table = dict()
+    for name in names:
+        table[name] = open_memmap(column_path(table_dir, name), mode='w+',
+                                  dtype=np.float64,
+                                  shape=(nvertices, len(dates)),
+                                  fortran_order=True)
+        table[name][:] = np.nan
+
+    with open(os.path.join(table_dir, COLUMNS_FILE), 'w+') as columnsfile:
+        json.dump(list(names), columnsfile)
+    with open(os.path.join(table_dir, DATES_FILE), 'w+') as datesfile:
+        json.dump(list(dates), datesfile)
+
+    return table
+
+
+def write_vertex_index(table_dir, global_vlist):
+    with open(os.path.join(table_dir, VERTEX_FILE), 'w+') as vertexfile:
+        json.dump(dict(enumerate(global_vlist)), vertexfile)
+
+
+# Open a table written by main(), returns the memory-mapped matrix of each
+# column and the dates of the snapshots
+def load_table(table_dir):
+    with open(os.path.join(table_dir, COLUMNS_FILE), 'r') as columnsfile:
+        names = json.load(columnsfile)
+    with open(os.path.join(table_dir, DATES_FILE), 'r') as datesfile:
+        dates = json.load(datesfile)
+
+    table = dict((name, np.load(column_path(table_dir, name), mmap_mode='r'))
+                 for name in names)
+
+    return table, dates
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    snapshots = snapshot_list(args)
+    dates = [graph_date for graph_date, _ in snapshots]
+    date_index = dict((graph_date, i) for i, graph_date in enumerate(dates))
+    logger.info('Computing metrics {} on {} snapshots'
+                .format(args.metrics, len(snapshots)))
+
+    global_vlist = global_index(networks=args.networks,
+                                store_path=args.store,
+                                start_date=args.start_date,
+                                end_date=args.end_date)
+    global_vtoid = dict((vname, vid) for vid, vname in enumerate(global_vlist))
+    logger.info('Found {} vertices'.format(len(global_vlist)))
+
+    params = metric_params(args)
+
+    # metrics are always written in the order of METRICS
+    selected = [metric for metric in METRICS if metric in args.metrics]
+    tasks = [(graph_date, network, args.store, selected, params)
+             for graph_date, network in snapshots]
+
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap_unordered(snapshot_metrics, tasks)
+    else:
+        results = map(snapshot_metrics, tasks)
+
+    table = None
+    for graph_date, names, columns, elapsed in results:
+        logger.info('Snapshot {}: {} nodes, computed in {:.3f}s'
+                    .format(graph_date, len(names), elapsed))
+
+        if table is None:
+            table = create_table(args.output_dir,
+                                 [name for name, _ in columns],
+                                 len(global_vlist), dates)
+
+        rows = np.fromiter((global_vtoid[vname] for vname in names),
+                           dtype=np.int64, count=len(names))
+        col = date_index[graph_date]
+        for name, values in columns:
+            table[name][rows, col] = values
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if table is not None:
+        for matrix in table.values():
+            matrix.flush()
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_vertex_index(args.output_dir, global_vlist)
+
+    logger.info('Table written to {}'.format(args.output_dir))
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+
+import igraph as ig
+import numpy as np
+import pytest
+
+from approx_centrality import (MIN_BATCHES, approximate_betweenness,
+                               approximate_closeness, sample_size,
+                               split_batches)
+from centrality_metrics import add_metric_args, check_metric_args, \
+    metric_vectors
+
+
+def metric_args(argv):
+    parser = argparse.ArgumentParser()
+    add_metric_args(parser)
+    args = parser.parse_args(argv)
+    check_metric_args(parser, args)
+    return args
+
+
+def test_all_sources_is_exact():
+    g = ig.Graph.Famous('Zachary')
+    estimate, error = approximate_betweenness(g, g.vcount(), directed=False)
+
+    assert np.allclose(estimate, g.betweenness(directed=False))
+    assert np.allclose(error, 0.0)
+
+
+@pytest.mark.parametrize('cutoff', [0, 1, 2, 3])
+@pytest.mark.parametrize('directed', [False, True])
+def test_all_sources_with_cutoff_is_exact(cutoff, directed):
+    g = ig.Graph.Famous('Zachary')
+    if directed:
+        # the edges of the karate club, a third of them in both directions
+        edges = g.get_edgelist()
+        g = ig.Graph(n=g.vcount(), directed=True,
+                     edges=edges + [(v, u) for u, v in edges[::3]])
+    estimate, error = approximate_betweenness(g, g.vcount(),
+                                              directed=directed,
+                                              cutoff=cutoff)
+
+    assert np.allclose(estimate, g.betweenness(directed=directed,
+                                               cutoff=cutoff))
+    assert np.allclose(error, 0.0)
+
+
+@pytest.mark.parametrize('sampling', [['--betweenness-samples', '50'],
+                                      ['--betweenness-error', '0.1']])
+def test_cutoff_with_sampling(sampling):
+    args = metric_args(sampling + ['--betweenness-cutoff', '3'])
+    assert args.betweenness_cutoff == 3
+
+
+def test_cutoff_with_samples():
+    g = ig.Graph.Famous('Zachary')
+    params = {'directed': False, 'betweenness_directed': True,
+              'betweenness_samples': 10, 'betweenness_cutoff': 3,
+              'jobs': 1, 'seed': 0}
+
+    vectors = metric_vectors(g, 'b', params)
+    estimate, error = approximate_betweenness(g, 10, directed=False,
+                                              cutoff=3)
+    assert np.allclose(dict(vectors)['betweenness'], estimate)
+
+
+@pytest.mark.parametrize('vcount', [0, 1])
+def test_degenerate_snapshots(vcount):
+    g = ig.Graph(n=vcount)
+    samples = sample_size(vcount, 0.1)
+
+    for approximate in (approximate_betweenness, approximate_closeness):
+        estimate, error = approximate(g, samples)
+        assert len(estimate) == len(error) == vcount
+
+
+def test_split_batches():
+    assert split_batches(np.arange(0), 4) == []
+    batches = split_batches(np.arange(20), 1)
+    assert len(batches) == MIN_BATCHES
+    assert sorted(np.concatenate(batches).tolist()) == list(range(20))
+
+
+def lattice():
+    return ig.Graph.Lattice([15, 15], circular=False)
+
+
+# the standard errors are the size of the actual errors of the estimates:
+# their root mean squares over the vertices are within a factor of 3
+def check_within_error(estimate, error, exact):
+    assert np.all(error >= 0)
+    ratio = (np.sqrt(np.mean((estimate - exact)**2)) /
+             np.sqrt(np.mean(error**2)))
+    assert 1/3 < ratio < 3
+
+
+def test_sampled_betweenness_within_error():
+    g = lattice()
+    estimate, error = approximate_betweenness(g, 60, directed=False, seed=1)
+
+    check_within_error(estimate, error, np.array(g.betweenness()))
+
+
+def test_jobs_give_the_same_estimate():
+    g = lattice()
+    serial = approximate_betweenness(g, 40, directed=False, seed=2)
+    parallel = approximate_betweenness(g, 40, directed=False, jobs=2, seed=2)
+
+    assert np.allclose(serial[0], parallel[0])
+    assert np.allclose(serial[1], parallel[1])
+
+
+@pytest.mark.parametrize('harmonic', [False, True])
+def test_sampled_closeness_within_error(harmonic):
+    g = lattice()
+    estimate, error = approximate_closeness(g, 60, harmonic=harmonic, seed=1)
+
+    if harmonic:
+        exact = np.array(g.harmonic_centrality())
+    else:
+        exact = np.array(g.closeness())
+    check_within_error(estimate, error, exact)
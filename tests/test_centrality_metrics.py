@@ -0,0 +1,44 @@
+import igraph as ig
+
+from centrality_metrics import base_node_id, metric_vectors
+
+
+def named_graph():
+    # vertex 0 is named '1' and vertex 1 is named '0'
+    g = ig.Graph(n=3, edges=[(0, 1), (1, 2)])
+    g.vs['name'] = ['1', '0', 'page']
+    return g
+
+
+def test_integers_are_ids():
+    g = named_graph()
+    assert base_node_id(g, 0) == 0
+    assert base_node_id(g, '0') == 0
+    assert base_node_id(g, 'id:1') == 1
+    assert base_node_id(g, 5) is None
+
+
+def test_names():
+    g = named_graph()
+    assert base_node_id(g, 'name:0') == 1
+    assert base_node_id(g, 'page') == 2
+    assert base_node_id(g, 'name:missing') is None
+    assert base_node_id(ig.Graph(n=2), 'page') is None
+
+
+def test_distance_columns():
+    g = named_graph()
+    params = {'directed': False,
+              'base_node': ['id:0', 'name:page', 'name:missing', 7]}
+
+    columns = metric_vectors(g, 'l', params)
+    assert [name for name, _ in columns] == [
+        'distance_from_1', 'distance_from_page', 'distance_from_missing',
+        'distance_from_7']
+    assert columns[0][1].tolist() == [0, 1, 2]
+    assert columns[2][1].tolist() == [-1, -1, -1]
+
+    # the same node given by id or by name has the same column
+    for node in ['0', 'id:0', 'name:1']:
+        params['base_node'] = [node, 'page']
+        assert metric_vectors(g, 'l', params)[0][0] == 'distance_from_1'
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+import pytest
+
+from membership_matrix import save_matrix
+from cluster_index import ClusterIndex, build_index
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'cluster_index.py')
+
+DATES = ['2010-01-01', '2010-02-01', '2010-03-01']
+VERTICES = ['Alpha', 'Beta', 'Gamma', 'Delta']
+MATRIX = np.array([[0, 0, 1],
+                   [0, -1, 1],
+                   [1, 1, 1],
+                   [-1, 0, 0]], dtype=np.int32)
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    matrix_path = str(tmp_path / 'matrix.npy')
+    vertex_path = str(tmp_path / 'vertex.json')
+    save_matrix(matrix_path, MATRIX, DATES)
+    with open(vertex_path, 'w') as vertexfile:
+        json.dump(dict((str(vid), vname)
+                       for vid, vname in enumerate(VERTICES)), vertexfile)
+
+    index_path = str(tmp_path / 'index')
+    build_index(matrix_path, vertex_path, index_path, shard_size=3)
+    return index_path
+
+
+def query(index_path, *argv):
+    return subprocess.run([sys.executable, SCRIPT, '--index', index_path] +
+                          list(argv), stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def test_index_matches_matrix(index_path):
+    index = ClusterIndex(index_path)
+
+    for vid, vname in enumerate(VERTICES):
+        expected = [(date, cluster)
+                    for date, cluster in zip(DATES, MATRIX[vid].tolist())
+                    if cluster >= 0]
+        assert index.page_clusters(vname) == expected
+
+    for col, date in enumerate(DATES):
+        for cluster in np.unique(MATRIX[:, col]).tolist():
+            if cluster >= 0:
+                assert (index.members(date, cluster).tolist() ==
+                        np.nonzero(MATRIX[:, col] == cluster)[0].tolist())
+
+
+# the index does not depend on the size of the shards of rows, dates without
+# any page are indexed too
+@pytest.mark.parametrize('shard_size', [1, 2, 10])
+def test_shard_size(tmp_path, index_path, shard_size):
+    matrix = np.concatenate((MATRIX, np.full((len(VERTICES), 1), -1,
+                                             dtype=np.int32)), axis=1)
+    matrix_path = str(tmp_path / 'matrix-empty.npy')
+    save_matrix(matrix_path, matrix, DATES + ['2010-04-01'])
+
+    other_path = str(tmp_path / 'index-{}'.format(shard_size))
+    build_index(matrix_path, str(tmp_path / 'vertex.json'), other_path,
+                shard_size=shard_size)
+    index, other = ClusterIndex(index_path), ClusterIndex(other_path)
+
+    for vname in VERTICES:
+        assert other.page_clusters(vname) == index.page_clusters(vname)
+    for col, date in enumerate(DATES):
+        for cluster in range(3):
+            assert (other.members(date, cluster).tolist() ==
+                    index.members(date, cluster).tolist())
+    assert other.members('2010-04-01', 0).tolist() == []
+
+
+def test_hit(index_path):
+    result = query(index_path, 'page', 'Delta')
+    assert result.returncode == 0
+    assert result.stdout.split('\n')[:2] == ['2010-02-01\t0',
+                                             '2010-03-01\t0']
+
+
+@pytest.mark.parametrize('argv', [['page', 'Missing'],
+                                  ['cluster', '2011-01-01', '0'],
+                                  ['cluster', '2010-01-01', '7']])
+def test_miss_exits_non_zero(index_path, argv):
+    result = query(index_path, *argv)
+    assert result.returncode == 1
+    assert result.stdout == ''
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from cluster_matching import (MATCHING, match_clusters, contingency_table,
+                              jaccard_similarity)
+
+
+TRIALS = 300
+
+
+# the clusters of two random snapshots, with pages that come and go
+def random_snapshots(rng):
+    nvertices = int(rng.integers(1, 60))
+    vids1 = np.nonzero(rng.random(nvertices) < 0.8)[0]
+    vids2 = np.nonzero(rng.random(nvertices) < 0.8)[0]
+    if len(vids1) == 0 or len(vids2) == 0:
+        vids1 = vids2 = np.arange(nvertices)
+
+    membership1 = rng.integers(0, int(rng.integers(1, 12)), size=len(vids1))
+    membership2 = rng.integers(0, int(rng.integers(1, 12)), size=len(vids2))
+    # clusters are numbered from 0 without gaps
+    membership1 = np.unique(membership1, return_inverse=True)[1]
+    membership2 = np.unique(membership2, return_inverse=True)[1]
+
+    return vids1, membership1, vids2, membership2
+
+
+def similarity_matrix(vids1, membership1, vids2, membership2):
+    table = contingency_table(vids1, membership1, vids2, membership2)
+    sizes1 = np.bincount(membership1, minlength=table.shape[0])
+    sizes2 = np.bincount(membership2, minlength=table.shape[1])
+    return jaccard_similarity(table, sizes1, sizes2).toarray()
+
+
+
+# the pages of each cluster at t and at t+1, as sets of global ids
+def cluster_sets(vids, membership):
+    return [set(vids[membership == cluster].tolist())
+            for cluster in range(membership.max() + 1)]
+
+
+def test_contingency_table():
+    rng = np.random.default_rng(0)
+    for _ in range(TRIALS):
+        vids1, membership1, vids2, membership2 = random_snapshots(rng)
+        clusters1 = cluster_sets(vids1, membership1)
+        clusters2 = cluster_sets(vids2, membership2)
+
+        table = contingency_table(vids1, membership1,
+                                  vids2, membership2).toarray()
+        similarity = similarity_matrix(vids1, membership1,
+                                       vids2, membership2)
+        for c1, pages1 in enumerate(clusters1):
+            for c2, pages2 in enumerate(clusters2):
+                common = len(pages1 & pages2)
+                assert table[c1, c2] == common
+                assert similarity[c1, c2] == \
+                    pytest.approx(common / len(pages1 | pages2))
+
+
+# total Jaccard similarity of a matching
+def total_similarity(similarity, c1_to_c2):
+    return sum(similarity[c1, c2] for c1, c2 in c1_to_c2.items())
+
+
+def check_matching(similarity, c1_to_c2, sim_c1c2):
+    # one to one
+    assert len(set(c1_to_c2.values())) == len(c1_to_c2)
+    for c1, c2 in c1_to_c2.items():
+        assert sim_c1c2[c1] == pytest.approx(1.0 - similarity[c1, c2])
+
+
+@pytest.mark.parametrize('method', ['sparse', 'components'])
+def test_optimal_matching(method):
+    rng = np.random.default_rng(0)
+    for _ in range(TRIALS):
+        snapshots = random_snapshots(rng)
+        similarity = similarity_matrix(*snapshots)
+
+        optimum = total_similarity(similarity,
+                                   match_clusters(*snapshots)[0])
+        c1_to_c2, sim_c1c2 = match_clusters(*snapshots, method=method)
+
+        check_matching(similarity, c1_to_c2, sim_c1c2)
+        assert total_similarity(similarity, c1_to_c2) == \
+            pytest.approx(optimum)
+        # pairs of clusters without overlap are never matched
+        assert all(similarity[c1, c2] > 0 for c1, c2 in c1_to_c2.items())
+
+
+def test_greedy_matching():
+    rng = np.random.default_rng(1)
+    for _ in range(TRIALS):
+        snapshots = random_snapshots(rng)
+        similarity = similarity_matrix(*snapshots)
+
+        optimum = total_similarity(similarity,
+                                   match_clusters(*snapshots)[0])
+        c1_to_c2, sim_c1c2 = match_clusters(*snapshots, method='greedy')
+
+        check_matching(similarity, c1_to_c2, sim_c1c2)
+        assert total_similarity(similarity, c1_to_c2) <= optimum + 1e-9
+        assert all(similarity[c1, c2] > 0 for c1, c2 in c1_to_c2.items())
+
+
+@pytest.mark.parametrize('method', sorted(MATCHING))
+def test_identical_snapshots(method):
+    vids = np.arange(10)
+    membership = np.array([0, 0, 1, 1, 1, 2, 2, 3, 3, 3])
+
+    c1_to_c2, sim_c1c2 = match_clusters(vids, membership, vids, membership,
+                                        method=method)
+    assert c1_to_c2 == {0: 0, 1: 1, 2: 2, 3: 3}
+    assert all(distance == pytest.approx(0.0)
+               for distance in sim_c1c2.values())
@@ -0,0 +1,68 @@
+import igraph as ig
+import pytest
+
+from community_detection import (AVAILABLE_BACKENDS, WARM_START_BACKENDS,
+                                 find_partition, compare_backends)
+
+
+@pytest.fixture
+def karate():
+    return ig.Graph.Famous('Zachary')
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_backends(karate, backend):
+    membership = find_partition(karate, backend=backend, seed=1)
+
+    assert len(membership) == karate.vcount()
+    assert sorted(set(membership)) == list(range(max(membership) + 1))
+    assert karate.modularity(membership) > 0.35
+    assert find_partition(karate, backend=backend, seed=1) == membership
+
+
+@pytest.mark.parametrize('backend', WARM_START_BACKENDS)
+def test_warm_start(karate, backend):
+    if backend not in AVAILABLE_BACKENDS:
+        pytest.skip('{} is not installed'.format(backend))
+
+    initial = find_partition(karate, backend=backend, seed=1)
+    membership = find_partition(karate, backend=backend, seed=2,
+                                initial_membership=initial)
+    assert karate.modularity(membership) >= karate.modularity(initial)
+
+
+def test_multilevel_has_no_warm_start(karate):
+    with pytest.raises(ValueError):
+        find_partition(karate, backend='multilevel',
+                       initial_membership=[0]*karate.vcount())
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_weights(backend):
+    # two pairs joined by heavy edges, linked to each other by light ones
+    g = ig.Graph(n=4, edges=[(0, 1), (2, 3), (0, 2), (1, 3)])
+    membership = find_partition(g, backend=backend, seed=0,
+                                weights=[10.0, 10.0, 0.1, 0.1])
+
+    assert membership[0] == membership[1]
+    assert membership[2] == membership[3]
+    assert membership[0] != membership[2]
+
+
+def test_compare_backends(karate):
+    report = compare_backends(karate, backends=AVAILABLE_BACKENDS, seed=0)
+
+    assert [row[0] for row in report] == list(AVAILABLE_BACKENDS)
+    for _, seconds, modularity, communities in report:
+        assert seconds >= 0 and modularity > 0.35 and communities > 1
+
+
+def test_compare_backends_resolution(karate):
+    report = compare_backends(karate, backends=AVAILABLE_BACKENDS,
+                              resolution=2.0, seed=0)
+
+    for backend, _, modularity, _ in report:
+        membership = find_partition(karate, backend=backend, resolution=2.0,
+                                    seed=0)
+        assert modularity == pytest.approx(
+            karate.modularity(membership, resolution=2.0))
@@ -0,0 +1,62 @@
+import numpy as np
+import igraph as ig
+import pytest
+
+from consensus import coassignment, node_stability, consensus_partition
+
+
+# two cliques of 5 vertices joined by a single edge
+def two_cliques():
+    G = ig.Graph.Full(5) + ig.Graph.Full(5)
+    G.add_edge(4, 5)
+    return G.vcount(), np.array(G.get_edgelist())
+
+
+def test_coassignment():
+    edges = np.array([[0, 1], [1, 2], [2, 3]])
+    # cluster ids only matter within each membership
+    memberships = [[0, 0, 1, 1], [0, 0, 0, 1], [1, 1, 0, 0]]
+
+    assert coassignment(edges, memberships).tolist() == \
+        pytest.approx([1.0, 1/3, 2/3])
+
+
+def test_node_stability():
+    edges = np.array([[0, 1], [1, 2]])
+    weights = np.array([1.0, 0.25])
+    membership = np.array([0, 0, 1, 2])
+
+    # vertex 1 agrees with the consensus on both of its edges on average
+    # (1 + 0.75) / 2, vertex 3 has no edges
+    assert node_stability(4, edges, weights, membership).tolist() == \
+        pytest.approx([1.0, 0.875, 0.75, 1.0])
+
+
+def test_consensus_of_agreeing_partitions():
+    vcount, edges = two_cliques()
+    membership = [0]*5 + [1]*5
+
+    consensus, stability = consensus_partition(vcount, edges,
+                                               [membership]*3, seed=0,
+                                               backend='multilevel')
+
+    assert len(set(consensus[:5])) == 1 and len(set(consensus[5:])) == 1
+    assert consensus[0] != consensus[5]
+    assert stability.tolist() == pytest.approx([1.0]*vcount)
+
+
+def test_consensus_drops_rare_links():
+    vcount, edges = two_cliques()
+    # the bridge vertices are together in one partition out of three
+    memberships = [[0]*5 + [1]*5, [0]*5 + [1]*5,
+                   [0]*4 + [1]*2 + [2]*4]
+
+    consensus, stability = consensus_partition(vcount, edges, memberships,
+                                               seed=0, backend='multilevel')
+
+    assert consensus[4] == consensus[0] and consensus[5] == consensus[9]
+    assert consensus[4] != consensus[5]
+    # the links of the bridge vertices agree with two partitions out of
+    # three, the ones of the other vertices mostly with all of them
+    assert stability[4] == pytest.approx(2/3)
+    assert stability[4] < stability[0] < 1.0
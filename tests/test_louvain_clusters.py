@@ -0,0 +1,174 @@
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+import subprocess
+
+import numpy as np
+import igraph as ig
+import pytest
+
+from membership_matrix import MATRIX_FILE, load_matrix, load_vertices
+from louvain_clusters import (JSONDictWriter, append_json_item,
+                              partition_warm_start)
+
+
+ITEMS = [('2010-01-01_2010-02-01', [[0, 1], [1, 0]]),
+         ('2010-02-01', {'0': 0, '1': 2}),
+         ('2010-03-01', [])]
+
+
+def test_append_json_item(tmp_path):
+    path = str(tmp_path / 'items.json')
+    writer = JSONDictWriter(path)
+    writer.close()
+
+    for key, value in ITEMS:
+        append_json_item(path, key, value)
+
+    with open(path, 'r') as json_file:
+        content = json_file.read()
+    assert content == json.dumps(dict(ITEMS))
+
+
+def test_append_json_item_after_json_dump(tmp_path):
+    path = str(tmp_path / 'items.json')
+    with open(path, 'w') as json_file:
+        json.dump(dict(ITEMS[:1]), json_file)
+        json_file.write('\n')
+
+    for key, value in ITEMS[1:]:
+        append_json_item(path, key, value)
+
+    with open(path, 'r') as json_file:
+        assert json.load(json_file) == dict(ITEMS)
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'louvain_clusters.py')
+
+OUTPUT_DIRS = ['partitions', 'partitions-evolution', 'cluster-sizes',
+               'nodes-evolution']
+EVOLUTION_FILES = ['clusters_evolution.json', 'evolved_clusters.json',
+                   'evolved_clusters_stable.json']
+
+
+# a random series of monthly graphs with 5 communities, growing each month
+def write_networks(path, months, seed=1):
+    rng = random.Random(seed)
+    networks = []
+    for month in range(1, months+1):
+        network = os.path.join(
+            path, 'enwiki.wikilink_graph.2010-{:02}-01.csv'.format(month))
+        npages = 30 + 2*month
+        with open(network, 'w') as outfile:
+            writer = csv.writer(outfile, delimiter='\t')
+            writer.writerow(('page_title_from', 'page_title_to'))
+            for _ in range(npages*4):
+                c1 = rng.randrange(5)
+                c2 = c1 if rng.random() < 0.85 else rng.randrange(5)
+                writer.writerow(('P{}_{}'.format(c1, rng.randrange(npages)),
+                                 'P{}_{}'.format(c2, rng.randrange(npages))))
+        networks.append(network)
+
+    return networks
+
+
+def run_clusters(workdir, *argv):
+    for dirname in OUTPUT_DIRS:
+        os.makedirs(os.path.join(workdir, 'data', dirname), exist_ok=True)
+    return subprocess.run([sys.executable, SCRIPT] + list(argv), cwd=workdir,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def read_outputs(workdir):
+    outputs = dict()
+    for filename in EVOLUTION_FILES + ['partitions.csv']:
+        with open(os.path.join(workdir, 'data', filename), 'r') as infile:
+            outputs[filename] = infile.read()
+    return outputs
+
+
+def test_incremental_rejects_empty_snapshot(tmp_path):
+    networks = write_networks(str(tmp_path), 3)
+    with open(networks[-1], 'w') as outfile:
+        outfile.write('page_title_from\tpage_title_to\n')
+
+    workdir = str(tmp_path / 'run')
+    assert run_clusters(workdir, *networks[:2]).returncode == 0
+    before = read_outputs(workdir)
+
+    result = run_clusters(workdir, '--incremental', networks[2])
+    assert result.returncode != 0
+    assert 'is empty' in result.stderr
+    assert read_outputs(workdir) == before
+
+
+# the outputs of a run, with the rows of the membership matrix by page name
+def read_all_outputs(workdir):
+    outputs = read_outputs(workdir)
+    for dirname in ['cluster-sizes', 'nodes-evolution']:
+        path = os.path.join(workdir, 'data', dirname)
+        for filename in sorted(os.listdir(path)):
+            with open(os.path.join(path, filename), 'r') as infile:
+                outputs[os.path.join(dirname, filename)] = infile.read()
+
+    matrix, dates = load_matrix(os.path.join(workdir, MATRIX_FILE))
+    vertices = load_vertices(os.path.join(workdir, 'data', 'vertex.json'))
+    matrix = np.asarray(matrix)
+    outputs['matrix'] = (dates, dict((vname, matrix[vid].tolist())
+                                     for vid, vname in enumerate(vertices)))
+
+    return outputs
+
+
+# the outputs of one or more runs in the same directory
+def run_outputs(workdir, *runs):
+    for argv in runs:
+        result = run_clusters(workdir, '--output-format', 'both', *argv)
+        assert result.returncode == 0, result.stderr
+    return read_all_outputs(workdir)
+
+
+def test_jobs_give_the_same_outputs(tmp_path):
+    networks = write_networks(str(tmp_path), 5)
+
+    assert run_outputs(str(tmp_path / 'jobs'), ['--jobs', '2'] + networks) == \
+        run_outputs(str(tmp_path / 'default'), networks)
+
+
+def test_incremental_gives_the_same_outputs(tmp_path):
+    networks = write_networks(str(tmp_path), 5)
+
+    assert run_outputs(str(tmp_path / 'incremental'), networks[:2],
+                       ['--incremental'] + networks[2:4],
+                       ['--incremental'] + networks[4:]) == \
+        run_outputs(str(tmp_path / 'default'), networks)
+
+
+def test_streaming_gives_the_same_outputs(tmp_path):
+    networks = write_networks(str(tmp_path), 5)
+
+    assert run_outputs(str(tmp_path / 'streaming'),
+                       ['--streaming'] + networks) == \
+        run_outputs(str(tmp_path / 'default'), networks)
+
+
+def test_warm_start_modularity_uses_the_resolution():
+    G = ig.Graph.Famous('Zachary')
+    G.vs['name'] = [str(vid) for vid in range(G.vcount())]
+    global_vtoid = dict((vname, vid) for vid, vname in enumerate(G.vs['name']))
+    args = argparse.Namespace(seed=0, community_backend='louvain',
+                              resolution=2.0, community_iterations=None,
+                              compare_cold_start=True)
+
+    membership, report = partition_warm_start(args, '2010-01-01', G,
+                                              global_vtoid)
+
+    assert report[2] == pytest.approx(
+        G.modularity(membership.tolist(), resolution=2.0))
+    assert report[2] != pytest.approx(G.modularity(membership.tolist()))
+    assert report[4] is not None
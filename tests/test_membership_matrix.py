@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from membership_matrix import (save_matrix, load_matrix, append_column,
+                               columns_dir)
+
+
+DATES = ['2010-01-01', '2010-02-01', '2010-03-01', '2010-04-01']
+MATRIX = np.array([[0, 0],
+                   [0, -1],
+                   [1, 1]], dtype=np.int32)
+# the columns appended later have one row for each vertex known at their date
+COLUMNS = [np.array([1, 0, 0, 2], dtype=np.int32),
+           np.array([-1, 0, 1, 2, 2], dtype=np.int32)]
+
+
+def expected_matrix():
+    expected = np.full((5, 4), -1, dtype=np.int32)
+    expected[:3, :2] = MATRIX
+    expected[:4, 2] = COLUMNS[0]
+    expected[:, 3] = COLUMNS[1]
+    return expected
+
+
+def appended_matrix(tmp_path):
+    matrix_path = str(tmp_path / 'matrix.npy')
+    save_matrix(matrix_path, MATRIX, DATES[:2])
+    for col, column in enumerate(COLUMNS):
+        append_column(matrix_path, column, DATES[:3+col])
+    return matrix_path
+
+
+def test_append_column(tmp_path):
+    matrix, dates = load_matrix(appended_matrix(tmp_path))
+    expected = expected_matrix()
+
+    assert dates == DATES
+    assert matrix.shape == expected.shape
+    assert np.array_equal(np.asarray(matrix), expected)
+
+
+def test_appended_matrix_indexing(tmp_path):
+    matrix, _ = load_matrix(appended_matrix(tmp_path))
+    expected = expected_matrix()
+
+    for start in range(5):
+        assert np.array_equal(matrix[start:start+2], expected[start:start+2])
+    for col in range(4):
+        assert np.array_equal(matrix[:, col], expected[:, col])
+    assert np.array_equal(matrix[3], expected[3])
+    assert matrix[4, 0] == -1
+
+
+def test_save_matrix_removes_columns(tmp_path):
+    matrix_path = appended_matrix(tmp_path)
+    save_matrix(matrix_path, MATRIX, DATES[:2])
+
+    matrix, dates = load_matrix(matrix_path)
+    assert not os.path.exists(columns_dir(matrix_path))
+    assert dates == DATES[:2]
+    assert np.array_equal(np.asarray(matrix), MATRIX)
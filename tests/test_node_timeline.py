@@ -0,0 +1,45 @@
+import collections
+from itertools import groupby
+
+import numpy as np
+
+from node_timeline import (STABLE_WINDOW, shard_timeline, count_stable,
+                           pairwise)
+
+
+WINDOWS = [1, 2, 3, STABLE_WINDOW]
+
+
+# statistics of one node computed as from its node file
+def node_reference(row, windows):
+    clusters = row.tolist()
+    ndiff_cl = len(collections.Counter(clusters))
+    nchanges_cl = sum(1 for e1, e2 in pairwise(clusters) if e1 != e2)
+    run_lengths = [len(list(run)) for _, run in groupby(clusters)]
+
+    return ndiff_cl, nchanges_cl, count_stable(run_lengths, windows)
+
+
+def test_shard_matches_node_reference():
+    rng = np.random.default_rng(0)
+    for ndates in (1, 2, 7, 20):
+        # few clusters, so that runs are long enough for the windows
+        shard = rng.integers(-1, 3, size=(50, ndates)).astype(np.int32)
+        shard[::5] = shard[::5, :1]
+
+        ndiff_cl, nchanges_cl, stable = shard_timeline(shard, WINDOWS)
+
+        for row in range(len(shard)):
+            expected = node_reference(shard[row], WINDOWS)
+            assert ndiff_cl[row] == expected[0]
+            assert nchanges_cl[row] == expected[1]
+            assert [count[row] for count in stable] == expected[2]
+
+
+def test_empty_shard():
+    ndiff_cl, nchanges_cl, stable = shard_timeline(
+        np.zeros((3, 0), dtype=np.int32), WINDOWS)
+
+    assert ndiff_cl.tolist() == [0, 0, 0]
+    assert nchanges_cl.tolist() == [0, 0, 0]
+    assert all(count.tolist() == [0, 0, 0] for count in stable)
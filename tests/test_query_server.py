@@ -0,0 +1,131 @@
+import json
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from snapshot_store import ingest
+from centrality_metrics import add_metric_args
+from query_server import (MAX_GRAPHS, MAX_METRICS, LRUCache, QueryEngine,
+                          QueryHandler)
+
+
+def computed(calls, value):
+    def compute():
+        calls.append(value)
+        return value
+    return compute
+
+
+def test_hit_and_miss():
+    cache = LRUCache(2)
+    calls = []
+
+    assert cache.get('a', computed(calls, 1)) == 1
+    assert cache.get('a', computed(calls, 2)) == 1
+    assert calls == [1]
+
+
+def test_least_recently_used_is_dropped():
+    cache = LRUCache(2)
+    calls = []
+
+    cache.get('a', computed(calls, 'a'))
+    cache.get('b', computed(calls, 'b'))
+    # 'a' is used again, so 'b' is the least recently used one
+    cache.get('a', computed(calls, 'a'))
+    cache.get('c', computed(calls, 'c'))
+
+    cache.get('a', computed(calls, 'a'))
+    cache.get('b', computed(calls, 'b'))
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_concurrent_gets():
+    cache = LRUCache(4)
+    results = []
+
+    def worker(key):
+        for _ in range(200):
+            results.append(cache.get(key % 6, lambda: key % 6))
+
+    threads = [threading.Thread(target=worker, args=(key,))
+               for key in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 12*200
+    assert set(results) == set(range(6))
+    assert len(cache._values) <= 4
+
+
+# a server on a free port, answering from a store with one snapshot
+@pytest.fixture
+def server(tmp_path):
+    network = str(tmp_path / 'enwiki.wikilink_graph.2010-01-01.csv')
+    with open(network, 'w') as outfile:
+        outfile.write('page_title_from\tpage_title_to\n')
+        outfile.write('A\tB\nB\tC\nC\tA\nC\tD\n')
+    store_path = str(tmp_path / 'store')
+    ingest([network], store_path)
+
+    parser = argparse.ArgumentParser()
+    add_metric_args(parser)
+    args = parser.parse_args([])
+    args.store = store_path
+    args.metrics_table = None
+    args.cluster_index = None
+    args.max_graphs = MAX_GRAPHS
+    args.max_metrics = MAX_METRICS
+
+    handler = type('Handler', (QueryHandler,), {'engine': QueryEngine(args)})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def get(server, path):
+    url = 'http://127.0.0.1:{}{}'.format(server.server_address[1], path)
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return err.code, json.loads(err.read())
+
+
+def test_top(server):
+    status, result = get(server, '/top?date=2010-01-01&metric=d&k=1')
+    assert status == 200
+    assert result == [{'page': 'C', 'degree': 3.0}]
+
+
+def test_unknown_date(server):
+    status, result = get(server, '/top?date=2011-01-01&metric=d')
+    assert status == 404
+    assert 'unknown date' in result['error']
+
+
+@pytest.mark.parametrize('k', ['0', '-1'])
+def test_k_below_one(server, k):
+    status, result = get(server, '/top?date=2010-01-01&metric=d&k=' + k)
+    assert status == 400
+    assert 'error' in result
+
+
+def test_internal_error(server):
+    def fail(query):
+        raise RuntimeError('broken')
+    server.RequestHandlerClass.engine.top = fail
+
+    status, result = get(server, '/top?date=2010-01-01&metric=d')
+    assert status == 500
+    assert 'broken' in result['error']
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from rankings import rank
+
+
+VALUES = np.array([3.0, 5.0, 5.0, 1.0, np.nan, 2.0])
+
+
+# rank of each value as the number of better values plus one, and the
+# corresponding dense and fractional ranks
+def reference_ranks(col, method):
+    ranks = []
+    for value in col:
+        if np.isnan(value):
+            ranks.append(np.nan if method == 'fractional' else 0)
+            continue
+
+        valid = col[~np.isnan(col)]
+        better = (valid > value).sum()
+        if method == 'min':
+            ranks.append(better + 1)
+        elif method == 'dense':
+            ranks.append(len(np.unique(valid[valid > value])) + 1)
+        else:
+            ranks.append(better + ((valid == value).sum() + 1) / 2.0)
+
+    return np.array(ranks)
+
+
+def test_tie_methods():
+    assert rank(VALUES, 'min').tolist() == [3, 1, 1, 5, 0, 4]
+    assert rank(VALUES, 'dense').tolist() == [2, 1, 1, 4, 0, 3]
+    assert np.allclose(rank(VALUES, 'fractional'),
+                       [3, 1.5, 1.5, 5, np.nan, 4], equal_nan=True)
+
+
+@pytest.mark.parametrize('method', ['min', 'dense', 'fractional'])
+def test_matrix_columns(method):
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 5, size=(40, 6)).astype(float)
+    values[rng.random(values.shape) < 0.2] = np.nan
+
+    ranks = rank(values, method)
+    assert ranks.shape == values.shape
+    for j in range(values.shape[1]):
+        assert np.allclose(ranks[:, j], reference_ranks(values[:, j], method),
+                           equal_nan=True)
+
+
+def test_top_k():
+    ranks = rank(VALUES, 'min', top_k=2)
+    assert ranks.tolist() == [0, 1, 1, 0, 0, 0]
+
+    # the values tied with the k-th one are ranked too
+    ranks = rank(VALUES, 'min', top_k=1)
+    assert ranks.tolist() == [0, 1, 1, 0, 0, 0]
+
+    ranks = rank(VALUES, 'min', top_k=3)
+    assert ranks.tolist() == [3, 1, 1, 0, 0, 0]
+
+
+def test_tolerance():
+    values = np.array([1.0, 1.0 + 1e-12, 0.5])
+    assert rank(values, 'min').tolist() == [2, 1, 3]
+    assert rank(values, 'min', atol=1e-9).tolist() == [1, 1, 3]
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        rank(VALUES, 'max')
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from snapshot_store import SnapshotStore, ingest, global_index, read_edges
+
+
+# edge lists of three snapshots, names are not ASCII and the last snapshot
+# is empty
+SNAPSHOTS = {'2010-01-01': [('Zürich', 'Ärzte'), ('Ärzte', 'Bern'),
+                            ('Bern', 'Zürich')],
+             '2010-02-01': [('Bern', 'Genève'), ('Genève', 'Bern'),
+                            ('Bern', 'Bern'), ('Basel', 'Ärzte')],
+             '2010-03-01': [],
+             }
+
+
+@pytest.fixture
+def networks(tmp_path):
+    networks = []
+    for graph_date, edges in SNAPSHOTS.items():
+        network = str(tmp_path / 'enwiki.wikilink_graph.{}.csv'
+                      .format(graph_date))
+        with open(network, 'w', encoding='utf-8') as outfile:
+            outfile.write('page_title_from\tpage_title_to\n')
+            for edge in edges:
+                outfile.write('{}\t{}\n'.format(*edge))
+        networks.append(network)
+
+    return networks
+
+
+def test_snapshots(tmp_path, networks):
+    store_path = str(tmp_path / 'store')
+    ingest(networks, store_path)
+    store = SnapshotStore(store_path)
+
+    assert store.dates == sorted(SNAPSHOTS)
+    for graph_date, edges in SNAPSHOTS.items():
+        G = store.graph(graph_date, directed=True)
+        assert store.ecount(graph_date) == len(edges)
+        assert G.vs['name'] == sorted(set(v for edge in edges for v in edge))
+        assert [(G.vs[e.source]['name'], G.vs[e.target]['name'])
+                for e in G.es] == edges
+
+
+def test_vertex_table(tmp_path, networks):
+    store_path = str(tmp_path / 'store')
+    ingest(networks, store_path)
+    store = SnapshotStore(store_path)
+
+    vertices = global_index(networks=networks)
+    assert store.names(range(store.vcount())) == vertices
+    for vid, vname in enumerate(vertices):
+        assert store.vid(vname) == vid
+    with pytest.raises(KeyError):
+        store.vid('Lausanne')
+
+    assert global_index(store_path=store_path) == vertices
+    assert global_index(store_path=store_path, start_date='2010-02-01') == \
+        sorted(set(v for network in networks[1:]
+                   for edge in read_edges(network) for v in edge))
+
+
+
+def test_clean(tmp_path, networks):
+    store_path = str(tmp_path / 'store')
+    ingest(networks, store_path, clean=True, collapse=True)
+    store = SnapshotStore(store_path)
+
+    G = store.graph('2010-02-01')
+    assert sorted(tuple(sorted(G.vs[v]['name'] for v in e.tuple))
+                  for e in G.es) == [('Basel', 'Ärzte'), ('Bern', 'Genève')]
+    assert os.path.exists(os.path.join(store_path, 'cleaning.json'))
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+import pytest
+
+from centrality_metrics import add_metric_args, compute_metric
+from temporal_metrics import (load_table, metric_params, read_snapshot,
+                              snapshot_params)
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'temporal_metrics.py')
+
+METRICS = 'dbk'
+
+# three snapshots of a path that grows and loses its first page
+SNAPSHOTS = {'2010-01-01': [('A', 'B'), ('B', 'C')],
+             '2010-02-01': [('A', 'B'), ('B', 'C'), ('C', 'D')],
+             '2010-03-01': [('B', 'C'), ('C', 'D'), ('D', 'E'), ('B', 'D')],
+             }
+
+
+@pytest.fixture
+def networks(tmp_path):
+    networks = dict()
+    for graph_date, edges in SNAPSHOTS.items():
+        network = str(tmp_path / 'enwiki.wikilink_graph.{}.csv'
+                      .format(graph_date))
+        with open(network, 'w') as outfile:
+            outfile.write('page_title_from\tpage_title_to\n')
+            for edge in edges:
+                outfile.write('{}\t{}\n'.format(*edge))
+        networks[graph_date] = network
+
+    return networks
+
+
+def run_metrics(tmp_path, networks, *argv):
+    output_dir = str(tmp_path / 'table')
+    result = subprocess.run([sys.executable, SCRIPT, '--output-dir',
+                             output_dir, '--metrics', METRICS] +
+                            sorted(networks.values()) + list(argv),
+                            cwd=str(tmp_path), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+
+    table, dates = load_table(output_dir)
+    with open(os.path.join(output_dir, 'vertex.json'), 'r') as vertexfile:
+        vertices = dict((vname, int(vid))
+                        for vid, vname in json.load(vertexfile).items())
+    return table, dates, vertices
+
+
+def test_table_matches_snapshots(tmp_path, networks):
+    table, dates, vertices = run_metrics(tmp_path, networks)
+    assert dates == sorted(SNAPSHOTS)
+    assert sorted(vertices) == ['A', 'B', 'C', 'D', 'E']
+
+    parser = argparse.ArgumentParser()
+    add_metric_args(parser)
+    params = metric_params(parser.parse_args([]))
+
+    for col, graph_date in enumerate(dates):
+        g = read_snapshot(networks[graph_date], params['directed'])
+        rows = [vertices[vname] for vname in g.vs['name']]
+        missing = sorted(set(vertices.values()) - set(rows))
+
+        for metric in METRICS:
+            for name, values in compute_metric(g, metric,
+                                               snapshot_params(params, g)):
+                assert np.allclose(table[name][rows, col], values)
+                assert np.isnan(table[name][missing, col]).all()
+
+
+def test_jobs_give_the_same_table(tmp_path, networks):
+    serial, _, _ = run_metrics(tmp_path, networks)
+    serial = dict((name, np.array(matrix)) for name, matrix in serial.items())
+
+    parallel, _, _ = run_metrics(tmp_path, networks, '--jobs', '2')
+    for name, matrix in parallel.items():
+        assert np.array_equal(matrix, serial[name], equal_nan=True)
+
+
+def test_distance_columns_by_name(tmp_path, networks):
+    table, dates, vertices = run_metrics(tmp_path, networks, '--metrics', 'l',
+                                         '--base-node', 'B', 'name:D')
+    assert sorted(table) == ['distance_from_B', 'distance_from_D']
+    assert table['distance_from_D'][vertices['E'], 2] == 1
+    assert np.isnan(table['distance_from_D'][vertices['E'], 0])
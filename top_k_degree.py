@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+usage: top_k_degree.py [-h] [-k TOP_K] [--output OUTPUT] [--jobs JOBS]
+                       <network> [<network> ...]
+
+Find the pages with the highest in-degree and out-degree in each snapshot
+
+positional arguments:
+  <network>          A file with the specification of the network as an edge
+                     list
+
+optional arguments:
+  -h, --help         show this help message and exit
+  -k TOP_K           Number of pages of each snapshot [default: 10]
+  --output OUTPUT    Output file [default: data/top_k_degree.csv]
+  --jobs JOBS        Number of files processed concurrently [default: 1]
+
+Each edge list is read once, counting the in-degree and the out-degree of
+every page at the same time. The output has one row for each date and rank,
+with the page with that rank by in-degree and by out-degree and their
+degrees. Pages with the same degree are ranked in order of appearance in the
+edge list.
+"""
+
+import os
+import csv
+import heapq
+import argparse
+import logging
+import multiprocessing
+
+from snapshot_store import snapshot_date, read_edges
+
+
+########## logging
+# create logger with 'spam_application'
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.DEBUG)
+
+# create file handler which logs even debug messages
+fh = logging.FileHandler(__file__.replace('.py','.log'))
+fh.setLevel(logging.DEBUG)
+
+# create console handler with a higher log level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+fh.setFormatter(formatter)
+ch.setFormatter(formatter)
+
+# add the handlers to the logger
+logger.addHandler(fh)
+logger.addHandler(ch)
+##########
+
+OUTPUT_FILE = os.path.join('data', 'top_k_degree.csv')
+TOP_K = 10
+
+HEADER = ('date', 'rank', 'indegree_page', 'indegree',
+          'outdegree_page', 'outdegree')
+
+
+def get_args():
+    description=('Find the pages with the highest in-degree and out-degree '
+                 'in each snapshot')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('networks', metavar='<network>', nargs='+',
+                        help='A file with the specification of the network '
+                             'as an edge list')
+    parser.add_argument('-k', dest='top_k', type=int, default=TOP_K,
+                        help='Number of pages of each snapshot '
+                             '[default: {}]'.format(TOP_K))
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help='Output file [default: {}]'.format(OUTPUT_FILE))
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of files processed concurrently '
+                             '[default: 1]')
+
+    args = parser.parse_args()
+    return args
+
+
+# the k pages with the highest count, as (page, count) pairs
+def top_k(names, counts, k):
+    top = heapq.nlargest(k, range(len(counts)),
+                         key=lambda vid: (counts[vid], -vid))
+    return [(names[vid], counts[vid]) for vid in top]
+
+
+# Count the in-degree and the out-degree of the pages of an edge list in a
+# single pass. Page names are interned to consecutive ids in order of
+# appearance, the degrees are lists indexed by id.
+def degree_top_k(task):
+    network, k = task
+
+    ids = dict()
+    names = list()
+    indegree = list()
+    outdegree = list()
+
+    for edge in read_edges(network):
+        for vname in edge:
+            if vname not in ids:
+                ids[vname] = len(names)
+                names.append(vname)
+                indegree.append(0)
+                outdegree.append(0)
+
+        outdegree[ids[edge[0]]] += 1
+        indegree[ids[edge[1]]] += 1
+
+    return (snapshot_date(network),
+            top_k(names, indegree, k),
+            top_k(names, outdegree, k))
+
+
+def main():
+    args = get_args()
+    logger.info('Start')
+
+    networks = sorted(args.networks, key=snapshot_date)
+    tasks = [(network, args.top_k) for network in networks]
+
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap(degree_top_k, tasks)
+    else:
+        results = map(degree_top_k, tasks)
+
+    with open(args.output, 'w+') as outfile:
+        writer = csv.writer(outfile, delimiter='\t')
+        writer.writerow(HEADER)
+
+        for graph_date, top_in, top_out in results:
+            logger.debug('Snapshot {} done'.format(graph_date))
+
+            for rank in range(max(len(top_in), len(top_out))):
+                in_page, in_degree = (top_in[rank] if rank < len(top_in)
+                                      else ('', ''))
+                out_page, out_degree = (top_out[rank] if rank < len(top_out)
+                                        else ('', ''))
+                writer.writerow((graph_date, rank+1, in_page, in_degree,
+                                 out_page, out_degree))
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    logger.info('Top {} pages of {} snapshots written to {}'
+                .format(args.top_k, len(networks), args.output))
+    logger.info('All done!')
+
+
+if __name__ == '__main__':
+    main()